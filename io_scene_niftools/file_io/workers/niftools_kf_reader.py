@@ -0,0 +1,70 @@
+"""Reads and scales KF files in the worker processes of KfImport.
+
+The workers are spawned with Blender's Python, in which bpy cannot be imported, so this module is imported from its
+own folder rather than as part of the add-on package, and only depends on nifgen.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import time
+
+import nifgen.formats.nif as NifFormat
+from nifgen.spells.nif import NifToaster
+from nifgen.spells.nif.fix import SpellScale
+
+
+def read_kf(kf_file, scale):
+    """
+    Read a KF file and apply the scale correction to it.
+
+    :param kf_file: path of the KF file
+    :param scale: the scale correction
+    :return: the version of the file, its data or None if the version could not be read, and the seconds taken to
+        read and to scale it
+    """
+    start = time.perf_counter()
+    with open(kf_file, "rb") as kf_stream:
+        modification, (version, user_version, bs_version) = NifFormat.NifFile.inspect_version_only(kf_stream)
+        if version < 0:
+            return version, None, 0.0, 0.0
+        kf_data = NifFormat.NifFile.from_stream(kf_stream)
+    read_time = time.perf_counter() - start
+    toaster = NifToaster()
+    toaster.scale = scale
+    SpellScale(data=kf_data, toaster=toaster).recurse()
+    return version, kf_data, read_time, time.perf_counter() - start - read_time
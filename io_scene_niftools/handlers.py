@@ -39,6 +39,7 @@
 
 
 import bpy
+from bpy.app.handlers import persistent
 
 # How often the viewport billboard update runs, in seconds. Returned from the
 # timer to schedule the next call, so it doubles as the re-arm interval.
@@ -83,9 +84,9 @@ def particle_billboard_frame_change(_scene, _depsgraph=None):
 def bone_visibility_frame_change(_scene, _depsgraph=None):
     """Hide the objects attached to a bone that an imported visibility controller hides.
 
-    The bones under animation and the objects parented to them are both looked up again
-    on every frame, so a skeleton and the meshes attached to it can be imported in any
-    order, in any session, and still animate together.
+    The bones under animation and the objects parented to them are cached, and looked up
+    again only after bone_visibility_depsgraph_update saw a change to them, so a skeleton
+    and the meshes attached to it can be imported in any order and still animate together.
     """
 
     from .modules.nif_import.animation.object import update_bone_visibility
@@ -96,6 +97,29 @@ def bone_visibility_frame_change(_scene, _depsgraph=None):
         pass
 
 
+def bone_visibility_depsgraph_update(_scene, depsgraph):
+    """Drop the cached bone visibility map when actions, armatures or bone parenting change."""
+
+    from .modules.nif_import.animation.object import bone_visibility_changed, invalidate_bone_visibility
+    try:
+        if bone_visibility_changed(depsgraph):
+            invalidate_bone_visibility()
+    except (ReferenceError, RuntimeError):
+        invalidate_bone_visibility()
+
+
+@persistent
+def bone_visibility_reset(*_args):
+    """Drop the cached bone visibility map after undo, redo or loading a file, which replace the datablocks."""
+
+    from .modules.nif_import.animation.object import invalidate_bone_visibility
+    invalidate_bone_visibility()
+
+
+# The handlers after which the cached bone visibility map has to be looked up again
+BONE_VISIBILITY_RESET_HANDLERS = ("undo_post", "redo_post", "load_post")
+
+
 def register():
     """Attach handlers, if they are not attached already."""
 
@@ -108,6 +132,12 @@ def register():
         bpy.app.handlers.frame_change_post.append(particle_billboard_frame_change)
     if bone_visibility_frame_change not in bpy.app.handlers.frame_change_post:
         bpy.app.handlers.frame_change_post.append(bone_visibility_frame_change)
+    if bone_visibility_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(bone_visibility_depsgraph_update)
+    for handler_name in BONE_VISIBILITY_RESET_HANDLERS:
+        b_handlers = getattr(bpy.app.handlers, handler_name)
+        if bone_visibility_reset not in b_handlers:
+            b_handlers.append(bone_visibility_reset)
 
 
 def unregister():
@@ -121,3 +151,9 @@ def unregister():
         bpy.app.handlers.frame_change_post.remove(particle_billboard_frame_change)
     if bone_visibility_frame_change in bpy.app.handlers.frame_change_post:
         bpy.app.handlers.frame_change_post.remove(bone_visibility_frame_change)
+    if bone_visibility_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(bone_visibility_depsgraph_update)
+    for handler_name in BONE_VISIBILITY_RESET_HANDLERS:
+        b_handlers = getattr(bpy.app.handlers, handler_name)
+        if bone_visibility_reset in b_handlers:
+            b_handlers.remove(bone_visibility_reset)
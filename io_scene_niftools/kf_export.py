@@ -44,6 +44,7 @@ import bpy
 from bpy.types import Scene
 
 from .modules.nif_export.animation import Animation
+from .modules.nif_export.animation.common import FCURVE_INDICES
 from .modules.nif_export.block_registry import block_store
 from .modules.nif_export.object import DICT_NAMES
 from .modules.nif_export.scene import Scene
@@ -81,6 +82,7 @@ class KfExport(NifCommon):
         block_store.block_to_obj = {}  # Clear data from last export attempt
         block_store.obj_to_block = {}
         DICT_NAMES.clear()
+        FCURVE_INDICES.clear()  # the actions may have been edited since
 
         # Get output directory, filename, and file extension from UI
         # the file IO scripts will use this later
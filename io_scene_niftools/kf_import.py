@@ -37,16 +37,34 @@
 #
 # ***** END LICENSE BLOCK *****
 
+import importlib
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
 
-from .file_io.nif import NifFile as KFFile
 from .modules.nif_import import animation
 from .modules.nif_import.animation.transform import TransformAnimation
+from .modules.nif_import.object.block_registry import block_store
 from .nif_common import NifCommon
 from .utils import math
 from .utils.logging import NifLog, NifError
 from .utils.singleton import NifOp
 
+# The module that reads and scales KF files in worker processes, and the folder it is imported from.
+# Spawned processes inherit sys.path, so they find it there without importing the add-on package.
+KF_READER_MODULE = "niftools_kf_reader"
+KF_READER_FOLDER = os.path.join(os.path.dirname(__file__), "file_io", "workers")
+
+
+def get_kf_reader():
+    """Import the module that reads and scales KF files, from a folder that worker processes can import it from."""
+    if KF_READER_FOLDER not in sys.path:
+        sys.path.append(KF_READER_FOLDER)
+    return importlib.import_module(KF_READER_MODULE)
+
 
 class KfImport(NifCommon):
 
@@ -59,11 +77,27 @@ class KfImport(NifCommon):
     def execute(self):
         """Main KF import function."""
 
+        read_pool = None
         try:
             animation.clear()
+            block_store.clear_targets()
             dirname = os.path.dirname(NifOp.props.filepath)
             kf_files = [os.path.join(dirname, file.name) for file in NifOp.props.files if
                         file.name.lower().endswith(".kf")]
+            scale = NifOp.props.scale_correction
+
+            # reading and scaling do not touch Blender, so several files are read by worker processes while the
+            # armature is prepared and the files read before are imported, and are collected in the order selected
+            start = time.perf_counter()
+            kf_reader = get_kf_reader()
+            if len(kf_files) > 1:
+                # spawned rather than forked, as forking Blender would copy its whole state and threads
+                read_pool = ProcessPoolExecutor(max_workers=min(len(kf_files), os.cpu_count() or 1),
+                                                mp_context=get_context("spawn"))
+                kf_reads = read_pool.map(kf_reader.read_kf, kf_files, repeat(scale))
+            else:
+                kf_reads = map(kf_reader.read_kf, kf_files, repeat(scale))
+
             # if an armature is present, prepare the bones for all actions
             b_armature = math.get_armature()
             if b_armature:
@@ -72,23 +106,53 @@ class KfImport(NifCommon):
                 # get nif space bind pose of armature here for all anims
                 self.transform_anim.get_bind_data(b_armature)
 
-            kf_data = [KFFile.load_nif(kf_file) for kf_file in kf_files]
-            for kfdata in kf_data:
-                self.apply_scale(kfdata, NifOp.props.scale_correction)
-
-            # Blender has one scene FPS, so estimate it from all selected KF files before
-            # inserting any keys rather than changing it between files.
-            self.transform_anim.set_frames_per_second(
-                [root for kfdata in kf_data for root in kfdata.roots])
-
-            for kfdata in kf_data:
-                for kf_root in kfdata.roots:
+            NifLog.info(f"Scale Correction set to {scale}.")
+            for index, kf_data in enumerate(self.collect_kf_data(kf_files, kf_reads, kf_reader, scale)):
+                if index == 0:
+                    # Blender has one scene FPS, so estimate it once rather than changing it between files. Keys
+                    # are imported while later files are still read, so it is estimated from the first file, as
+                    # the files of one batch share their frame rate.
+                    self.transform_anim.set_frames_per_second(kf_data.roots)
+                for kf_root in kf_data.roots:
                     self.transform_anim.import_kf_root(kf_root, b_armature)
+            NifLog.info(f"Read and imported {len(kf_files)} KF files in {time.perf_counter() - start:.3f}s")
 
             self.transform_anim.finalize()
 
         except NifError:
             return {'CANCELLED'}
+        finally:
+            if read_pool:
+                # do not keep reading the remaining files after an error
+                read_pool.shutdown(cancel_futures=True)
 
         NifLog.info("Finished successfully")
         return {'FINISHED'}
+
+    @staticmethod
+    def collect_kf_data(kf_files, kf_reads, kf_reader, scale):
+        """
+        Yield the data of every KF file in order as soon as it is read, logging how long reading and scaling took.
+
+        If a worker process fails, the rest of the files are read in this process instead, where an error in a
+        file is raised again with its own traceback.
+        """
+        kf_reads = iter(kf_reads)
+        for kf_file in kf_files:
+            if kf_reads:
+                try:
+                    kf_read = next(kf_reads)
+                except Exception as error:
+                    NifLog.warn(f"Could not read {kf_file} in a worker process, reading it and the remaining files "
+                                f"here: {error}")
+                    kf_reads = None
+            if not kf_reads:
+                kf_read = kf_reader.read_kf(kf_file, scale)
+            version, kf_data, read_time, scale_time = kf_read
+            NifLog.info(f"Importing {kf_file}")
+            if version == -1:
+                raise NifError("Unsupported NIF version.")
+            elif version < 0:
+                raise NifError("Not a NIF file.")
+            NifLog.info(f"KF file version: {version:x}, read in {read_time:.3f}s, scaled in {scale_time:.3f}s")
+            yield kf_data
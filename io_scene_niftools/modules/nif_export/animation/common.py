@@ -38,11 +38,14 @@
 # ***** END LICENSE BLOCK *****
 
 
+import re
 from abc import ABC
 
 import bpy
+import numpy as np
 
 from ....utils import consts
+from ....utils.bspline import BSPLINE_DEGREE, bspline_parameters, bspline_weights, evaluate_bspline
 
 from ....modules.nif_export.block_registry import block_store
 from ....utils.logging import NifLog, NifError
@@ -60,12 +63,87 @@ V_CONTROLLED_BLOCK_CONTROLLER = 0x14030000
 # The blend interpolator a manager controlled controller reads through, per interpolator type
 BLEND_INTERPOLATORS = {
     "NiTransformInterpolator": "NiBlendTransformInterpolator",
+    "NiBSplineCompTransformInterpolator": "NiBlendTransformInterpolator",
     "NiBoolInterpolator": "NiBlendBoolInterpolator",
     "NiFloatInterpolator": "NiBlendFloatInterpolator",
     "NiPoint3Interpolator": "NiBlendPoint3Interpolator",
     "NiPathInterpolator": "NiBlendPoint3Interpolator",
 }
 
+# Compressed B-spline control points are shorts scaled to the range of their channel
+SHORT_MAX = 32767
+# Handle of a B-spline channel without control points, which keeps the interpolator's own value
+BSPLINE_NO_DATA = 0xFFFF
+
+# A property of a named collection member, such as pose.bones["Bip01"].location or
+# key_blocks["Smile"].value, with the quotes and backslashes of the name escaped
+MEMBER_PATH = re.compile(r'^([^"]*?)\["((?:[^"\\]|\\.)*)"\]\.(.+)$')
+
+# The collections whose members are animated, as named in the data paths
+POSE_BONES = "pose.bones"
+BONES = "bones"
+KEY_BLOCKS = "key_blocks"
+
+# FCurveIndex of every action slot exported so far, see get_fcurve_index
+FCURVE_INDICES = {}
+
+
+def split_data_path(data_path):
+    """Split an fcurve data path into the collection, the name of the member it animates and its channel.
+
+    The collection and member are None for a property of the animated datablock itself,
+    such as the location of an object.
+    """
+    match = MEMBER_PATH.match(data_path)
+    if not match:
+        return None, None, data_path
+    return match.group(1), re.sub(r'\\(.)', r'\1', match.group(2)), match.group(3)
+
+
+class FCurveIndex:
+    """The fcurves of an action slot, parsed once and indexed by (collection, member, channel, array index).
+
+    Exporters used to filter all curves of an action by data path for every bone, shape
+    key or material socket, which is quadratic on large rigs. Each data path is split
+    once instead, see split_data_path.
+    """
+
+    def __init__(self, fcurves):
+        self.fcurves = fcurves
+        # {(collection, member, channel): {array index: fcurve}}
+        self.channels = {}
+        # {data path: [fcurve]}, in action order
+        self.paths = {}
+        for fcu in fcurves:
+            self.paths.setdefault(fcu.data_path, []).append(fcu)
+            b_fcurves = self.channels.setdefault(split_data_path(fcu.data_path), {})
+            if fcu.array_index in b_fcurves:
+                # only the first curve is exported, as before
+                NifLog.warn(f"Ignoring a second fcurve for {fcu.data_path}[{fcu.array_index}]")
+                continue
+            b_fcurves[fcu.array_index] = fcu
+
+    def get(self, collection, member, channel, array_index=0):
+        """The fcurve of one array element of a channel, or None."""
+        return self.channels.get((collection, member, channel), {}).get(array_index)
+
+    def get_channel(self, collection, member, channel):
+        """All fcurves of a channel, in array order."""
+        b_fcurves = self.channels.get((collection, member, channel), {})
+        return [b_fcurves[array_index] for array_index in sorted(b_fcurves)]
+
+    def iter_members(self, collection, channel):
+        """Yield (member, fcurves) for every member of a collection whose channel is animated."""
+        for (b_collection, b_member, b_channel), b_fcurves in self.channels.items():
+            if b_collection == collection and b_channel == channel:
+                yield b_member, [b_fcurves[array_index] for array_index in sorted(b_fcurves)]
+
+    def iter_channels(self, collection=None, member=None):
+        """Yield (channel, fcurves) for every animated channel of a member."""
+        for (b_collection, b_member, channel), b_fcurves in self.channels.items():
+            if b_collection == collection and b_member == member:
+                yield channel, [b_fcurves[array_index] for array_index in sorted(b_fcurves)]
+
 
 class AnimationExportMode:
     """
@@ -475,11 +553,239 @@ def create_controller(parent_block, target_name, priority=0):
 
     return n_kfc, n_kfi
 
+def linear_key_errors(first, last, t, values):
+    """The largest per-channel difference between values and their linear interpolation at t."""
+    return np.abs(first + (last - first) * t[:, None] - values).max(axis=-1)
+
+
+def distance_key_errors(first, last, t, values):
+    """The distance between points and their linear interpolation at t."""
+    return np.linalg.norm(first + (last - first) * t[:, None] - values, axis=-1)
+
+
+def slerp_key_errors(first, last, t, values):
+    """The angle between unit quaternions and their spherical interpolation at t."""
+    dots = np.sum(first * last, axis=-1)
+    # interpolate along the shorter arc
+    last = np.where(dots[:, None] < 0, -last, last)
+    omega = np.arccos(np.clip(np.abs(dots), 0.0, 1.0))
+    sin_omega = np.sin(omega)
+    # where the ends are this close, slerp and lerp are the same
+    close = sin_omega < 1e-6
+    sin_omega = np.where(close, 1.0, sin_omega)
+    weights_first = np.where(close, 1 - t, np.sin((1 - t) * omega) / sin_omega)
+    weights_last = np.where(close, t, np.sin(t * omega) / sin_omega)
+    interpolated = weights_first[:, None] * first + weights_last[:, None] * last
+    interpolated /= np.linalg.norm(interpolated, axis=-1, keepdims=True)
+    return 2 * np.arccos(np.clip(np.abs(np.sum(interpolated * values, axis=-1)), 0.0, 1.0))
+
+
+def reduce_keys(frames, values, key_errors, tolerance):
+    """
+    The indices of the keys to keep so that interpolating between them reproduces every dropped key within tolerance.
+
+    Starting from the first and last key, which are always kept, every segment between kept keys is split at its
+    worst reproduced key (Ramer-Douglas-Peucker). All segments of a level are tested at once.
+
+    :param frames: Frames of the keys, increasing, of shape (n,)
+    :param values: Values of the keys, of shape (n, channels)
+    :param key_errors: Function of (first values, last values, interpolation factors, values) with a row per tested
+        key, that returns the error of every tested key when interpolated between the kept keys around it
+    :param tolerance: Largest error allowed for a dropped key
+    """
+    num_keys = len(frames)
+    if num_keys <= 2 or tolerance <= 0:
+        return np.arange(num_keys)
+    keep = np.zeros(num_keys, dtype=bool)
+    keep[[0, -1]] = True
+    firsts = np.array([0])
+    lasts = np.array([num_keys - 1])
+    while len(firsts):
+        num_inner = lasts - firsts - 1
+        has_inner = num_inner > 0
+        firsts, lasts, num_inner = firsts[has_inner], lasts[has_inner], num_inner[has_inner]
+        if not len(firsts):
+            break
+        # every key strictly inside a segment, with the segment it is in
+        segment = np.repeat(np.arange(len(firsts)), num_inner)
+        starts = np.cumsum(num_inner) - num_inner
+        inner = firsts[segment] + 1 + np.arange(len(segment)) - starts[segment]
+        span = (frames[lasts] - frames[firsts])[segment]
+        t = np.divide(frames[inner] - frames[firsts[segment]], span, out=np.zeros(len(inner)), where=span > 0)
+        errors = key_errors(values[firsts[segment]], values[lasts[segment]], t, values[inner])
+        # split every segment at the first of its worst keys, if that is out of tolerance
+        worst = np.maximum.reduceat(errors, starts)
+        candidates = np.flatnonzero((errors == worst[segment]) & (worst[segment] > tolerance))
+        split_segments, first_candidates = np.unique(segment[candidates], return_index=True)
+        splits = inner[candidates[first_candidates]]
+        keep[splits] = True
+        firsts, lasts = (np.concatenate((firsts[split_segments], splits)),
+                         np.concatenate((splits, lasts[split_segments])))
+    return np.flatnonzero(keep)
+
+
+def distance_fit_errors(fitted, values):
+    """The distance between fitted and original points."""
+    return np.linalg.norm(fitted - values, axis=-1)
+
+
+def quaternion_fit_errors(fitted, values):
+    """The angle between fitted quaternions, which need not be unit, and the original unit quaternions."""
+    fitted = fitted / np.linalg.norm(fitted, axis=-1, keepdims=True)
+    return 2 * np.arccos(np.clip(np.abs(np.sum(fitted * values, axis=-1)), 0.0, 1.0))
+
+
+def absolute_fit_errors(fitted, values):
+    """The largest per-channel difference between fitted and original values."""
+    return np.abs(fitted - values).max(axis=-1)
+
+
+def continuous_quaternions(quaternions):
+    """Flip the signs of an (n, 4) array of quaternions so that every one is in the hemisphere of the one before."""
+    flips = np.sum(quaternions[1:] * quaternions[:-1], axis=-1) < 0
+    flipped = np.concatenate(([False], np.logical_xor.accumulate(flips)))
+    return np.where(flipped[:, None], -quaternions, quaternions)
+
+
+def solve_banded_cholesky(band, rhs):
+    """
+    Solve A x = rhs for a symmetric positive definite band matrix A, by its Cholesky decomposition.
+
+    :param band: The lower bands of A, of shape (bandwidth + 1, m), where band[d, j] is A[j + d, j]
+    :param rhs: Right hand sides, of shape (m, c)
+    :return: x, of shape (m, c)
+    """
+    bandwidth, size = len(band) - 1, band.shape[1]
+    matrix = band.tolist()
+    # lower[d][j] is L[j + d, j]
+    lower = [[0.0] * size for _ in range(bandwidth + 1)]
+    for j in range(size):
+        pivot = matrix[0][j] - sum(lower[d][j - d] ** 2 for d in range(1, min(bandwidth, j) + 1))
+        if pivot <= 0.0:
+            raise np.linalg.LinAlgError("matrix is not positive definite")
+        pivot = pivot ** 0.5
+        lower[0][j] = pivot
+        for d in range(1, min(bandwidth, size - 1 - j) + 1):
+            i = j + d
+            total = matrix[d][j]
+            for k in range(max(i - bandwidth, 0), j):
+                total -= lower[i - k][k] * lower[j - k][k]
+            lower[d][j] = total / pivot
+    x = np.array(rhs, dtype=float)
+    for j in range(size):
+        for d in range(1, min(bandwidth, j) + 1):
+            x[j] -= lower[d][j - d] * x[j - d]
+        x[j] /= lower[0][j]
+    for j in reversed(range(size)):
+        for d in range(1, min(bandwidth, size - 1 - j) + 1):
+            x[j] -= lower[d][j] * x[j + d]
+        x[j] /= lower[0][j]
+    return x
+
+
+def fit_bspline_points(firsts, weights, values, num_points):
+    """
+    The least squares control points of a B-spline through values, at the parameters of bspline_weights.
+
+    Every sample depends on four neighbouring control points only, so the normal equations form a band
+    matrix, which is solved in time linear in the number of control points. A tiny ridge keeps control
+    points that no sample depends on at zero, rather than making the system singular.
+    """
+    degree = BSPLINE_DEGREE
+    band = np.zeros((degree + 1, num_points))
+    rhs = np.zeros((num_points, values.shape[1]))
+    for a in range(degree + 1):
+        for b in range(a, degree + 1):
+            band[b - a] += np.bincount(firsts + a, weights=weights[:, a] * weights[:, b], minlength=num_points)
+        for c in range(values.shape[1]):
+            rhs[:, c] += np.bincount(firsts + a, weights=weights[:, a] * values[:, c], minlength=num_points)
+    band[0] += 1e-12 * max(band[0].max(), 1.0)
+    return solve_banded_cholesky(band, rhs)
+
+
+def compress_points(points):
+    """
+    Quantize control points to shorts, as stored in NiBSplineData.
+
+    Returns the shorts, and the offset and half range that restore points as offset + short * half range / 32767.
+    """
+    high, low = points.max(), points.min()
+    offset = 0.5 * (high + low)
+    half_range = 0.5 * (high - low)
+    if half_range <= 0:
+        # every point is the offset
+        half_range = 1.0
+    shorts = np.clip(np.rint((points - offset) / half_range * SHORT_MAX), -SHORT_MAX, SHORT_MAX).astype(np.int16)
+    return shorts, offset, half_range
+
+
+def decompress_points(shorts, offset, half_range):
+    """The control points of shorts from NiBSplineData, like NiBSplineData.get_comp_data."""
+    return offset + shorts * (half_range / SHORT_MAX)
+
+
+def pack_control_points(compressed):
+    """
+    Concatenate the shorts of the compressed channels, as stored in NiBSplineData.
+
+    Returns the shorts and the handle of every channel, which is the index of its first short.
+    """
+    shorts = [channel_shorts.reshape(-1) for channel_shorts, _, _ in compressed]
+    handles = np.cumsum([0] + [len(channel_shorts) for channel_shorts in shorts[:-1]])
+    return np.concatenate(shorts), handles
+
+
+def fit_compressed_bspline(times, channels, start_time, stop_time):
+    """
+    Fit the fewest control points that reproduce every channel within its tolerance, after compression.
+
+    All channels are sampled at the same times and share a single B-spline basis, as they do in a
+    NiBSplineCompTransformInterpolator, so every fit is a single banded least squares solve. The number of control
+    points is found by bisection, as the error shrinks as control points are added.
+
+    :param times: Times of the samples, increasing, of shape (n,) with n >= 4
+    :param channels: List of (values, fit errors, tolerance) per channel, where values has shape (n, size) and fit
+        errors is a function of (fitted values, values) that returns the error of every sample
+    :param start_time: Time of the first control point
+    :param stop_time: Time of the last control point
+    :return: The number of control points, and the compressed (shorts, offset, half range) of every channel.
+        If no number of control points meets the tolerances, every sample gets a control point.
+    """
+    values = np.concatenate([channel_values for channel_values, _, _ in channels], axis=-1)
+    splits = np.cumsum([channel_values.shape[1] for channel_values, _, _ in channels])[:-1]
+
+    def fit(num_points):
+        firsts, weights = bspline_weights(bspline_parameters(times, start_time, stop_time, num_points), num_points)
+        points = fit_bspline_points(firsts, weights, values, num_points)
+        compressed = [compress_points(channel_points) for channel_points in np.split(points, splits, axis=-1)]
+        within_tolerance = all(
+            fit_errors(evaluate_bspline(firsts, weights, decompress_points(*channel_compressed)),
+                       channel_values).max() <= tolerance
+            for channel_compressed, (channel_values, fit_errors, tolerance) in zip(compressed, channels))
+        return within_tolerance, compressed
+
+    low, high = BSPLINE_DEGREE + 1, max(BSPLINE_DEGREE + 1, len(times))
+    best = None
+    while low < high:
+        middle = (low + high) // 2
+        within_tolerance, compressed = fit(middle)
+        if within_tolerance:
+            high, best = middle, compressed
+        else:
+            low = middle + 1
+    if best is None:
+        # no fit with fewer control points than samples was found, or there are only four samples
+        _, best = fit(high)
+    return high, best
+
+
 class AnimationCommon(ABC):
 
     def __init__(self):
         self.fps = bpy.context.scene.render.fps
         self.target_game = bpy.context.scene.niftools_scene.game
+        # number of keys before and after reduce_curve
+        self.key_counts = [0, 0]
 
     def set_flags_and_timing(self, kfc, exp_fcurves, start_frame=None, stop_frame=None):
         # fill in the non-trivial values
@@ -568,7 +874,45 @@ class AnimationCommon(ABC):
                         new_fcurves.append(fcurve)
 
         return new_fcurves
-    
+
+    def get_fcurve_index(self, b_action, b_action_slot=None):
+        """The FCurveIndex of an action, optionally restricted to one controlled slot.
+
+        The index is shared by all exporters and every sequence that plays the action.
+        """
+        key = (b_action, b_action_slot)
+        if key not in FCURVE_INDICES:
+            FCURVE_INDICES[key] = FCurveIndex(self.get_fcurves_from_action(b_action, b_action_slot))
+        return FCURVE_INDICES[key]
+
+    @staticmethod
+    def get_frame_keys(fcurves):
+        """
+        Read the frames and keys of all fcurves in bulk.
+        Assumes the fcurves are sampled at the same time, surplus keys of longer fcurves are dropped.
+        Returns the frames of the first fcurve, of shape (n,), and the keys, of shape (n, len(fcurves)).
+        """
+        num_keys = min((len(fcu.keyframe_points) for fcu in fcurves), default=0)
+        coords = []
+        for fcu in fcurves:
+            co = np.empty(len(fcu.keyframe_points) * 2, dtype=np.float32)
+            fcu.keyframe_points.foreach_get("co", co)
+            coords.append(co.reshape((-1, 2))[:num_keys])
+        if not coords:
+            return np.empty(0), np.empty((0, 0))
+        return coords[0][:, 0].astype(float), np.stack([co[:, 1] for co in coords], axis=-1).astype(float)
+
+    def reduce_curve(self, curve, key_errors, tolerance):
+        """Drop the keys of a (frames, keys) curve that interpolation reproduces within tolerance, see reduce_keys."""
+        frames, values = curve
+        self.key_counts[0] += len(frames)
+        if len(frames) <= 2:
+            self.key_counts[1] += len(frames)
+            return curve
+        kept = reduce_keys(frames, values.reshape((len(frames), -1)), key_errors, tolerance)
+        self.key_counts[1] += len(kept)
+        return frames[kept], values[kept]
+
     @staticmethod
     def iter_frame_key(fcurves, mathutilclass):
         """
@@ -576,9 +920,7 @@ class AnimationCommon(ABC):
         Assumes the fcurves are sampled at the same time and all have the same amount of keys
         Return the key in the desired MathutilsClass
         """
-        for point in zip(*[fcu.keyframe_points for fcu in fcurves]):
-            frame = point[0].co[0]
-            key = [k.co[1] for k in point]
+        for frame, key in zip(*AnimationCommon.get_frame_keys(fcurves)):
             yield frame, mathutilclass(key)
 
 
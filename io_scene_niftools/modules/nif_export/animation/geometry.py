@@ -42,7 +42,7 @@ import re
 
 import bpy
 
-from ....modules.nif_export.animation.common import AnimationCommon
+from ....modules.nif_export.animation.common import AnimationCommon, KEY_BLOCKS
 from ....modules.nif_export.block_registry import block_store
 from ....utils.logging import NifLog
 from ....utils.singleton import NifOp, EGMData
@@ -103,9 +103,11 @@ class GeometryAnimation(AnimationCommon):
         # a nif can carry morph shapes that nothing animates, in which case there is no
         # action to take weight curves or a frame range from
         if b_shape_action:
-            action_fcurves = self.get_fcurves_from_action(b_shape_action)
+            fcurve_index = self.get_fcurve_index(b_shape_action)
+            action_fcurves = fcurve_index.fcurves
             frame_range = b_shape_action.frame_range
         else:
+            fcurve_index = None
             action_fcurves = []
             frame_range = (bpy.context.scene.frame_start, bpy.context.scene.frame_end)
 
@@ -177,8 +179,7 @@ class GeometryAnimation(AnimationCommon):
                 continue
 
             # find fcurve that animates this shapekey's influence
-            b_dtype = f'key_blocks["{key_block.name}"].value'
-            fcurves = [fcu for fcu in action_fcurves if b_dtype in fcu.data_path]
+            fcurves = fcurve_index.get_channel(KEY_BLOCKS, key_block.name, "value")
             if not fcurves:
                 continue
             fcu = fcurves[0]
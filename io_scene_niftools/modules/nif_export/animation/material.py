@@ -100,7 +100,7 @@ class MaterialAnimation(AnimationCommon):
                 return n_candidate
         return None
 
-    def get_socket_names(self, b_action, b_action_slot=None):
+    def get_socket_names(self, fcurve_index, b_action, b_action_slot=None):
         """Map the data path of every node socket curve in an action to the socket's name.
 
         The path names the node and the socket index, so the owning node tree is needed
@@ -116,14 +116,14 @@ class MaterialAnimation(AnimationCommon):
         if b_tree is None:
             return socket_names
 
-        for b_fcurve in self.get_fcurves_from_action(b_action, b_action_slot):
-            match = re.match(r'nodes\["(.+)"\]\.inputs\[(\d+)\]\.default_value$', b_fcurve.data_path)
+        for data_path in fcurve_index.paths:
+            match = re.match(r'nodes\["(.+)"\]\.inputs\[(\d+)\]\.default_value$', data_path)
             if not match:
                 continue
             b_node = b_tree.nodes.get(match.group(1))
             index = int(match.group(2))
             if b_node and index < len(b_node.inputs):
-                socket_names[b_fcurve.data_path] = b_node.inputs[index].name
+                socket_names[data_path] = b_node.inputs[index].name
         return socket_names
 
     @staticmethod
@@ -141,17 +141,19 @@ class MaterialAnimation(AnimationCommon):
                                                n_ni_controller_sequence=None, b_action_slot=None):
         """Export the material alpha or color controller data."""
 
-        action_fcurves = self.get_fcurves_from_action(b_action, b_action_slot)
+        fcurve_index = self.get_fcurve_index(b_action, b_action_slot)
+        action_fcurves = fcurve_index.fcurves
 
         # Curves on a shader node group address a socket by index, and that index moves
         # whenever the group changes, so they are matched on the socket's name instead.
-        socket_names = self.get_socket_names(b_action, b_action_slot)
+        socket_names = self.get_socket_names(fcurve_index, b_action, b_action_slot)
 
         def curves_for(socket_name, *legacy_fragments):
-            return [fcu for fcu in action_fcurves
-                    if socket_names.get(fcu.data_path) == socket_name
-                    or (socket_names.get(fcu.data_path) is None
-                        and any(fragment in fcu.data_path for fragment in legacy_fragments))]
+            return [fcu for data_path, b_fcurves in fcurve_index.paths.items()
+                    if socket_names.get(data_path) == socket_name
+                    or (socket_names.get(data_path) is None
+                        and any(fragment in data_path for fragment in legacy_fragments))
+                    for fcu in b_fcurves]
 
         ambient_color_fcurves = curves_for("Ambient Color", "ambient")
         diffuse_color_fcurves = curves_for("Material Diffuse Color", "diffuse")
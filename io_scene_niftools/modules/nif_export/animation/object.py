@@ -38,24 +38,24 @@
 # ***** END LICENSE BLOCK *****
 
 
-import re
-
 import bpy
-import mathutils
+import numpy as np
 
 from ....modules.nif_export.animation import common as Common
 
-from ....modules.nif_export.animation.common import V_INTERPOLATORS, attach_controller, get_n_target
+from ....modules.nif_export.animation.common import V_INTERPOLATORS, BSPLINE_NO_DATA, \
+    attach_controller, get_n_target, distance_key_errors, linear_key_errors, slerp_key_errors, \
+    absolute_fit_errors, distance_fit_errors, quaternion_fit_errors, continuous_quaternions, fit_compressed_bspline, \
+    pack_control_points
 from ....modules.nif_export.block_registry import block_store
 from ....utils import math, consts
+from ....utils.arrays import set_struct_fields
+from ....utils.bspline import BSPLINE_DEGREE
 from ....utils.consts import QUAT, EULER, LOC, SCALE
 from ....utils.logging import NifError, NifLog
-from ....utils.singleton import NifData
+from ....utils.singleton import NifData, NifOp
 from nifgen.formats.nif import classes as NifClasses
 
-# The visibility channel of a bone, on its armature rather than on the armature object
-BONE_HIDE_PATH = re.compile(r'^bones\["(.+)"\]\.hide$')
-
 
 class ObjectAnimation(Common.AnimationCommon):
 
@@ -65,6 +65,7 @@ class ObjectAnimation(Common.AnimationCommon):
         self.niftools_scene = bpy.context.scene.niftools_scene
 
     def export_object_animations(self, b_controlled_blocks, n_ni_controller_sequence=None):
+        self.key_counts = [0, 0]
         for b_strip, b_obj in b_controlled_blocks:
             b_action = b_strip.action
             b_action_slot = b_strip.action_slot
@@ -88,6 +89,14 @@ class ObjectAnimation(Common.AnimationCommon):
             self.export_ni_object_controllers(
                 b_obj, b_action, n_ni_controller_sequence, b_action_slot)
 
+        if self.key_counts[0]:
+            num_keys, num_kept = self.key_counts
+            if self.use_bsplines():
+                NifLog.info(f"Fitted {num_keys} transform keys with {num_kept} B-spline control points "
+                            f"({100 * num_kept / num_keys:.1f}%)")
+            elif NifOp.props.reduce_keys:
+                NifLog.info(f"Reduced {num_keys} transform keys to {num_kept} ({100 * num_kept / num_keys:.1f}%)")
+
     def export_ni_bone_vis_controllers(self, b_obj, b_action, n_ni_controller_sequence=None,
                                        b_action_slot=None):
         """Export a visibility controller for every bone whose visibility is animated."""
@@ -95,14 +104,11 @@ class ObjectAnimation(Common.AnimationCommon):
         if b_obj.type != 'ARMATURE':
             return
 
-        action_fcurves = self.get_fcurves_from_action(b_action, b_action_slot)
-
-        for b_fcurve in action_fcurves:
-            match = BONE_HIDE_PATH.match(b_fcurve.data_path)
-            if not match:
-                continue
+        fcurve_index = self.get_fcurve_index(b_action, b_action_slot)
+        action_fcurves = fcurve_index.fcurves
 
-            b_bone = b_obj.data.bones.get(match.group(1))
+        for b_bone_name, b_fcurve in self.get_bone_hide_fcurves(fcurve_index):
+            b_bone = b_obj.data.bones.get(b_bone_name)
             if b_bone is None:
                 continue
 
@@ -114,6 +120,13 @@ class ObjectAnimation(Common.AnimationCommon):
             self.export_ni_vis_controller(hide_curve, b_action, action_fcurves,
                                           n_node, n_node_name, n_ni_controller_sequence)
 
+    @staticmethod
+    def get_bone_hide_fcurves(fcurve_index):
+        """The (bone name, fcurve) pairs of the bone visibility curves of an armature action."""
+        return [(b_bone_name, b_fcurve)
+                for b_bone_name, b_fcurves in fcurve_index.iter_members(Common.BONES, "hide")
+                for b_fcurve in b_fcurves]
+
     def export_ni_vis_controller(self, hide_curves, b_action, action_fcurves, n_node, n_node_name,
                                  n_ni_controller_sequence=None):
         """Export the visibility controller data."""
@@ -142,7 +155,8 @@ class ObjectAnimation(Common.AnimationCommon):
 
     def export_ni_object_controllers(self, b_obj, b_action, n_ni_controller_sequence=None,
                                      b_action_slot=None):
-        action_fcurves = self.get_fcurves_from_action(b_action, b_action_slot)
+        fcurve_index = self.get_fcurve_index(b_action, b_action_slot)
+        action_fcurves = fcurve_index.fcurves
 
         n_obj, n_obj_name = get_n_target(b_obj)
 
@@ -150,10 +164,10 @@ class ObjectAnimation(Common.AnimationCommon):
             for b_bone in b_obj.data.bones:
                 n_node, n_node_name = get_n_target(b_bone)
 
-                quaternion_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith(f"{b_bone.name}\"].rotation_quaternion")]
-                translation_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith(f"{b_bone.name}\"].location")]
-                euler_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith(f"{b_bone.name}\"].rotation_euler")]
-                scale_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith(f"{b_bone.name}\"].scale")]
+                quaternion_data = fcurve_index.get_channel(Common.POSE_BONES, b_bone.name, "rotation_quaternion")
+                translation_data = fcurve_index.get_channel(Common.POSE_BONES, b_bone.name, "location")
+                euler_data = fcurve_index.get_channel(Common.POSE_BONES, b_bone.name, "rotation_euler")
+                scale_data = fcurve_index.get_channel(Common.POSE_BONES, b_bone.name, "scale")
 
                 # ensure that those groups that are present have all their fcurves
                 for fcus, num_fcus in ((quaternion_data, 4), (euler_data, 3), (translation_data, 3), (scale_data, 3)):
@@ -165,37 +179,17 @@ class ObjectAnimation(Common.AnimationCommon):
                 bind_matrix = math.get_object_bind(b_bone)
                 _, bind_rot, bind_trans = math.decompose_srt(bind_matrix)
 
-                quat_curve = []
-                euler_curve = []
-                trans_curve = []
-                scale_curve = []
-
-                for frame, quat in self.iter_frame_key(quaternion_data, mathutils.Quaternion):
-                    quat = math.export_keymat(bind_rot, quat.to_matrix().to_4x4(), b_bone).to_quaternion()
-                    quat_curve.append((frame, quat))
+                quat_curve, euler_curve, trans_curve, scale_curve = self.get_transform_curves(
+                    quaternion_data, euler_data, translation_data, scale_data, bind_rot, bind_trans, b_bone)
 
-                for frame, euler in self.iter_frame_key(euler_data, mathutils.Euler):
-                    keymat = math.export_keymat(bind_rot, euler.to_matrix().to_4x4(), b_bone)
-                    euler = keymat.to_euler("XYZ", euler)
-                    euler_curve.append((frame, euler))
-
-                for frame, trans in self.iter_frame_key(translation_data, mathutils.Vector):
-                    keymat = math.export_keymat(bind_rot, mathutils.Matrix.Translation(trans), b_bone)
-                    trans = keymat.to_translation() + bind_trans
-                    trans_curve.append((frame, trans))
-
-                for frame, scale in self.iter_frame_key(scale_data, mathutils.Vector):
-                    # just use the first scale curve and assume even scale over all curves
-                    scale_curve.append((frame, scale[0]))
-
-                if max(len(c) for c in (quat_curve, euler_curve, trans_curve, scale_curve)) > 0:
+                if max(len(c[0]) for c in (quat_curve, euler_curve, trans_curve, scale_curve)) > 0:
                     # number of frames is > 0, so export transform data
                     self.export_ni_transform_controller(quat_curve, euler_curve, trans_curve, scale_curve, b_action, action_fcurves, n_node, n_node_name, bind_matrix, n_ni_controller_sequence, b_bone)
         else:
-            quaternion_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith("quaternion")]
-            translation_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith("location")]
-            euler_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith("euler")]
-            scale_data = [fcu for fcu in action_fcurves if fcu.data_path.endswith("scale")]
+            quaternion_data = fcurve_index.get_channel(None, None, "rotation_quaternion")
+            translation_data = fcurve_index.get_channel(None, None, "location")
+            euler_data = fcurve_index.get_channel(None, None, "rotation_euler")
+            scale_data = fcurve_index.get_channel(None, None, "scale")
 
             # ensure that those groups that are present have all their fcurves
             for fcus, num_fcus in ((quaternion_data, 4), (euler_data, 3), (translation_data, 3), (scale_data, 3)):
@@ -207,34 +201,15 @@ class ObjectAnimation(Common.AnimationCommon):
             bind_matrix = b_obj.matrix_parent_inverse
             _, bind_rot, bind_trans = math.decompose_srt(bind_matrix)
 
-            quat_curve = []
-            euler_curve = []
-            trans_curve = []
-            scale_curve = []
-
-            for frame, quat in self.iter_frame_key(quaternion_data, mathutils.Quaternion):
-                quat = math.export_keymat(bind_rot, quat.to_matrix().to_4x4()).to_quaternion()
-                quat_curve.append((frame, quat))
+            quat_curve, euler_curve, trans_curve, scale_curve = self.get_transform_curves(
+                quaternion_data, euler_data, translation_data, scale_data, bind_rot, bind_trans)
 
-            for frame, euler in self.iter_frame_key(euler_data, mathutils.Euler):
-                keymat = math.export_keymat(bind_rot, euler.to_matrix().to_4x4())
-                euler = keymat.to_euler("XYZ", euler)
-                euler_curve.append((frame, euler))
-
-            for frame, trans in self.iter_frame_key(translation_data, mathutils.Vector):
-                keymat = math.export_keymat(bind_rot, mathutils.Matrix.Translation(trans))
-                trans = keymat.to_translation() + bind_trans
-                trans_curve.append((frame, trans))
-
-            for frame, scale in self.iter_frame_key(scale_data, mathutils.Vector):
-                # just use the first scale curve and assume even scale over all curves
-                scale_curve.append((frame, scale[0]))
-
-            if max(len(c) for c in (quat_curve, euler_curve, trans_curve, scale_curve)) > 0:
+            if max(len(c[0]) for c in (quat_curve, euler_curve, trans_curve, scale_curve)) > 0:
                 # number of frames is > 0, so export transform data
                 self.export_ni_transform_controller(quat_curve, euler_curve, trans_curve, scale_curve, b_action, action_fcurves, n_obj, n_obj_name, math.get_object_bind(b_obj), n_ni_controller_sequence)
 
-        hide_data = [fcu for fcu in action_fcurves if "hide" in fcu.data_path]
+        hide_data = [fcu for channel, b_fcurves in fcurve_index.iter_channels() if "hide" in channel
+                     for fcu in b_fcurves]
 
         hide_curve = []
 
@@ -245,9 +220,41 @@ class ObjectAnimation(Common.AnimationCommon):
         if hide_curve:
             self.export_ni_vis_controller(hide_curve, b_action, action_fcurves, n_obj, n_obj_name, n_ni_controller_sequence)
 
-    def export_ni_transform_controller(self, quat_curves, euler_curves, trans_curves, scale_curves, b_action, action_fcurves, n_node, n_node_name, bind_matrix=None, n_ni_controller_sequence=None, b_bone=None):
-        scene_fps = self.fps
+    def get_transform_curves(self, quaternion_data, euler_data, translation_data, scale_data,
+                             bind_rot, bind_trans, b_bone=None):
+        """
+        Read the keys of the transform fcurves of a bone or object, and convert them to nif space.
+
+        Every channel is read in bulk and converted as one batch, which matters for baked
+        animations with a key on every frame for every bone. Each curve is a (frames, keys) pair.
+        """
+        keymat_parts = math.get_export_keymat_parts(bind_rot, b_bone)
+
+        frames, quats = self.get_frame_keys(quaternion_data)
+        quat_curve = (frames, math.keymat_quaternions(keymat_parts, quats) if len(frames) else quats)
+
+        frames, eulers = self.get_frame_keys(euler_data)
+        # keep the eulers continuous with the ones that were keyed
+        euler_curve = (frames, math.keymat_eulers(keymat_parts, eulers, eulers) if len(frames) else eulers)
+
+        frames, translations = self.get_frame_keys(translation_data)
+        trans_curve = (frames, math.keymat_translations(keymat_parts, translations) + np.array(bind_trans)
+                       if len(frames) else translations)
+
+        frames, scales = self.get_frame_keys(scale_data)
+        # just use the first scale curve and assume even scale over all curves
+        scale_curve = (frames, scales[:, 0] if len(frames) else scales.reshape(-1))
 
+        if NifOp.props.reduce_keys and not self.use_bsplines():
+            rotation_tolerance = NifOp.props.key_tolerance_rotation
+            quat_curve = self.reduce_curve(quat_curve, slerp_key_errors, rotation_tolerance)
+            euler_curve = self.reduce_curve(euler_curve, linear_key_errors, rotation_tolerance)
+            trans_curve = self.reduce_curve(trans_curve, distance_key_errors, NifOp.props.key_tolerance_position)
+            scale_curve = self.reduce_curve(scale_curve, linear_key_errors, NifOp.props.key_tolerance_scale)
+
+        return quat_curve, euler_curve, trans_curve, scale_curve
+
+    def export_ni_transform_controller(self, quat_curves, euler_curves, trans_curves, scale_curves, b_action, action_fcurves, n_node, n_node_name, bind_matrix=None, n_ni_controller_sequence=None, b_bone=None):
         # before interpolators the controller held the keys itself, under its own block type
         use_interpolator = NifData.data.version >= V_INTERPOLATORS
 
@@ -263,72 +270,151 @@ class ObjectAnimation(Common.AnimationCommon):
             n_kfc = block_store.create_block("NiTransformController" if use_interpolator else "NiKeyframeController")
             self.set_flags_and_timing(n_kfc, action_fcurves, *b_action.frame_range)
 
+        n_kfi = None
+        if self.use_bsplines():
+            n_kfi = self.export_ni_bspline_interpolator(quat_curves, euler_curves, trans_curves, scale_curves)
+
+        if n_kfi is None:
+            n_kfd = self.export_ni_transform_data(quat_curves, euler_curves, trans_curves, scale_curves, use_interpolator)
+            if use_interpolator:
+                n_kfi = block_store.create_block("NiTransformInterpolator")
+                n_kfi.data = n_kfd
+            else:
+                n_kfc.data = n_kfd
+
+        if n_kfi is not None and bind_matrix is not None:
+            # channels left unkeyed fall back to the interpolator's own transform
+            n_scale, n_rot, n_trans = math.decompose_srt(bind_matrix)
+            n_quat = n_rot.to_quaternion()
+            n_kfi.transform.scale = n_scale
+            n_kfi.transform.translation.x, n_kfi.transform.translation.y, n_kfi.transform.translation.z = n_trans
+            n_kfi.transform.rotation.w, n_kfi.transform.rotation.x, n_kfi.transform.rotation.y, n_kfi.transform.rotation.z = n_quat
+
+        if n_multi_target_controller:
+            n_multi_target_controller.num_extra_targets += 1
+            n_multi_target_controller.extra_targets.append(n_node)
+        elif use_interpolator:
+            n_kfc.interpolator = n_kfi
+
+        attach_controller(n_kfc, n_kfi, n_node_name, "NiTransformController",
+                          n_ctrl_target=None if n_multi_target_controller else n_node,
+                          n_sequence=n_ni_controller_sequence,
+                          priority=b_bone.nif_bone.priority if b_bone else 0,
+                          blend_interpolator=not n_multi_target_controller)
+
+    def export_ni_transform_data(self, quat_curves, euler_curves, trans_curves, scale_curves, use_interpolator):
+        """Export the keys of the transform curves as they are, in a NiTransformData or NiKeyframeData."""
+        scene_fps = self.fps
+
         n_kfd = block_store.create_block("NiTransformData" if use_interpolator else "NiKeyframeData")
 
-        if euler_curves:
+        euler_frames, eulers = euler_curves
+        quat_frames, quats = quat_curves
+        trans_frames, translations = trans_curves
+        scale_frames, scales = scale_curves
+
+        if len(euler_frames):
             n_kfd.rotation_type = NifClasses.KeyType.XYZ_ROTATION_KEY
             n_kfd.num_rotation_keys = 1  # *NOT* len(frames) this crashes the engine!
             n_kfd.reset_field("xyz_rotations")
             for i, coord in enumerate(n_kfd.xyz_rotations):
-                coord.num_keys = len(euler_curves)
+                coord.num_keys = len(euler_frames)
                 coord.interpolation = NifClasses.KeyType.LINEAR_KEY
                 coord.reset_field("keys")
-                for key, (frame, euler) in zip(coord.keys, euler_curves):
-                    key.time = frame / scene_fps
-                    key.value = euler[i]
-
-        elif quat_curves:
-            n_kfd.rotation_type = NifClasses.KeyType.QUADRATIC_KEY
-            n_kfd.num_rotation_keys = len(quat_curves)
+                set_struct_fields(coord.keys, np.stack((euler_frames / scene_fps, eulers[:, i]), axis=-1),
+                                  ("time", "value"))
+
+        elif len(quat_frames):
+            # reduced keys were chosen to stay within the tolerance when slerped, while quadratic keys
+            # would be interpolated along squad tangents through the keys that were left
+            if NifOp.props.reduce_keys:
+                n_kfd.rotation_type = NifClasses.KeyType.LINEAR_KEY
+            else:
+                n_kfd.rotation_type = NifClasses.KeyType.QUADRATIC_KEY
+            n_kfd.num_rotation_keys = len(quat_frames)
             n_kfd.reset_field("quaternion_keys")
-            for key, (frame, quat) in zip(n_kfd.quaternion_keys, quat_curves):
-                key.time = frame / scene_fps
-                key.value.w = quat.w
-                key.value.x = quat.x
-                key.value.y = quat.y
-                key.value.z = quat.z
+            set_struct_fields(n_kfd.quaternion_keys, quat_frames / scene_fps, ("time",))
+            set_struct_fields(n_kfd.quaternion_keys, quats, ("w", "x", "y", "z"), member="value")
 
         n_kfd.translations.interpolation = NifClasses.KeyType.LINEAR_KEY
-        n_kfd.translations.num_keys = len(trans_curves)
+        n_kfd.translations.num_keys = len(trans_frames)
         n_kfd.translations.reset_field("keys")
-
-        for key, (frame, trans) in zip(n_kfd.translations.keys, trans_curves):
-            key.time = frame / scene_fps
-            key.value.x, key.value.y, key.value.z = trans
+        set_struct_fields(n_kfd.translations.keys, trans_frames / scene_fps, ("time",))
+        set_struct_fields(n_kfd.translations.keys, translations, ("x", "y", "z"), member="value")
 
         n_kfd.scales.interpolation = NifClasses.KeyType.LINEAR_KEY
-        n_kfd.scales.num_keys = len(scale_curves)
+        n_kfd.scales.num_keys = len(scale_frames)
         n_kfd.scales.reset_field("keys")
+        set_struct_fields(n_kfd.scales.keys, np.stack((scale_frames / scene_fps, scales), axis=-1),
+                          ("time", "value"))
 
-        for key, (frame, scale) in zip(n_kfd.scales.keys, scale_curves):
-            key.time = frame / scene_fps
-            key.value = scale
-
-        if use_interpolator:
-            n_kfi = block_store.create_block("NiTransformInterpolator")
-            n_kfi.data = n_kfd
-            if bind_matrix is not None:
-                # channels left unkeyed fall back to the interpolator's own transform
-                n_scale, n_rot, n_trans = math.decompose_srt(bind_matrix)
-                n_quat = n_rot.to_quaternion()
-                n_kfi.transform.scale = n_scale
-                n_kfi.transform.translation.x, n_kfi.transform.translation.y, n_kfi.transform.translation.z = n_trans
-                n_kfi.transform.rotation.w, n_kfi.transform.rotation.x, n_kfi.transform.rotation.y, n_kfi.transform.rotation.z = n_quat
-        else:
-            n_kfi = None
-            n_kfc.data = n_kfd
+        return n_kfd
 
-        if n_multi_target_controller:
-            n_multi_target_controller.num_extra_targets += 1
-            n_multi_target_controller.extra_targets.append(n_node)
-        elif use_interpolator:
-            n_kfc.interpolator = n_kfi
+    @staticmethod
+    def use_bsplines():
+        """Whether transforms are fitted with compressed B-splines, which only interpolators can hold."""
+        return NifOp.props.fit_bsplines and NifData.data.version >= V_INTERPOLATORS
 
-        attach_controller(n_kfc, n_kfi, n_node_name, "NiTransformController",
-                          n_ctrl_target=None if n_multi_target_controller else n_node,
-                          n_sequence=n_ni_controller_sequence,
-                          priority=b_bone.nif_bone.priority if b_bone else 0,
-                          blend_interpolator=not n_multi_target_controller)
+    def export_ni_bspline_interpolator(self, quat_curves, euler_curves, trans_curves, scale_curves):
+        """
+        Fit the transform curves with a NiBSplineCompTransformInterpolator, within the key tolerances.
+
+        The curves are resampled at the frames of all of them, so that every channel shares one basis.
+        Returns None when there are too few frames for a cubic B-spline.
+        """
+        euler_frames, eulers = euler_curves
+        if len(euler_frames):
+            # a B-spline only holds quaternions
+            quat_curves = (euler_frames, math.eulers_to_quaternions(eulers))
+
+        frames = np.unique(np.concatenate([curve_frames for curve_frames, _ in
+                                           (quat_curves, trans_curves, scale_curves)]))
+        if len(frames) <= BSPLINE_DEGREE:
+            return None
+        times = frames / self.fps
+
+        channels = []
+        channel_names = []
+        for channel_name, (curve_frames, values), fit_errors, tolerance in (
+                ("translation", trans_curves, distance_fit_errors, NifOp.props.key_tolerance_position),
+                ("rotation", quat_curves, quaternion_fit_errors, NifOp.props.key_tolerance_rotation),
+                ("scale", scale_curves, absolute_fit_errors, NifOp.props.key_tolerance_scale)):
+            if not len(curve_frames):
+                continue
+            values = values.reshape((len(curve_frames), -1))
+            if channel_name == "rotation":
+                values = continuous_quaternions(values)
+            values = np.stack([np.interp(frames, curve_frames, column) for column in values.T], axis=-1)
+            if channel_name == "rotation":
+                values /= np.linalg.norm(values, axis=-1, keepdims=True)
+            channels.append((values, fit_errors, tolerance))
+            channel_names.append(channel_name)
+
+        num_points, compressed = fit_compressed_bspline(times, channels, times[0], times[-1])
+        self.key_counts[0] += len(frames)
+        self.key_counts[1] += num_points
+
+        n_kfi = block_store.create_block("NiBSplineCompTransformInterpolator")
+        n_kfi.start_time = times[0]
+        n_kfi.stop_time = times[-1]
+        n_kfi.basis_data = block_store.create_block("NiBSplineBasisData")
+        n_kfi.basis_data.num_control_points = num_points
+        n_kfi.spline_data = block_store.create_block("NiBSplineData")
+
+        # unkeyed channels fall back to the interpolator's own transform
+        for channel_name in ("translation", "rotation", "scale"):
+            setattr(n_kfi, f"{channel_name}_handle", BSPLINE_NO_DATA)
+        shorts, handles = pack_control_points(compressed)
+        for channel_name, handle, (_, offset, half_range) in zip(channel_names, handles, compressed):
+            setattr(n_kfi, f"{channel_name}_handle", handle)
+            setattr(n_kfi, f"{channel_name}_offset", offset)
+            setattr(n_kfi, f"{channel_name}_half_range", half_range)
+
+        n_kfi.spline_data.num_compact_control_points = len(shorts)
+        n_kfi.spline_data.reset_field("compact_control_points")
+        n_kfi.spline_data.compact_control_points[:] = shorts
+
+        return n_kfi
 
     @staticmethod
     def get_multi_target_controller(n_manager, n_node):
@@ -41,11 +41,18 @@
 import numpy as np
 
 import bpy
+from ....utils.arrays import set_struct_fields
 from ....utils.logging import NifLog, NifError
 from ....utils.singleton import NifOp, NifData
 from nifgen.formats.nif import classes as NifClasses
 
 
+# struct field names of the nif vector, texture coordinate and color types
+XYZ = ('x', 'y', 'z')
+UV = ('u', 'v')
+RGBA = ('r', 'g', 'b', 'a')
+
+
 class GeometryData:
 
     @staticmethod
@@ -56,6 +63,61 @@ class GeometryData:
                         values * 12.92,
                         1.055 * np.power(values, 1.0 / 2.4) - 0.055)
 
+    @staticmethod
+    def flip_v(uv_coords):
+        """NIF flips the texture V-coordinate (OpenGL standard), so return a copy with v replaced by 1 - v."""
+        uv_coords = np.array(uv_coords, dtype=float)
+        uv_coords[..., 1] = 1.0 - uv_coords[..., 1]
+        return uv_coords
+
+    @staticmethod
+    def weld_hashes(loop_hashes, epsilon):
+        """
+        Merge loop hashes of the same blender vertex that differ by no more than epsilon in every component.
+
+        The hashes must be sorted on their first column, the blender vertex, as np.unique returns them. A hash is
+        merged into the first earlier hash of its vertex that lies within epsilon, and takes over that hash's nif
+        vertex. Rather than comparing hash pairs one at a time, every hash is compared to the hash that lies a
+        fixed number of rows before it in one array operation, for all offsets up to the largest number of hashes
+        that share a vertex. The blender vertex acts as the bucket, so the work is linear in the number of hashes
+        for any mesh with a bounded number of loops per vertex.
+
+        :param loop_hashes: Unique loop hashes, sorted on the blender vertex in the first column
+        :type loop_hashes: np.ndarray
+        :param epsilon: Largest difference per component for two hashes to be merged
+        :type epsilon: float
+
+        :return: the nif vertex index of every hash, numbered in order of first appearance
+        :rtype: np.ndarray
+        """
+        n_hashes = len(loop_hashes)
+        if n_hashes == 0:
+            return np.zeros(0, dtype=int)
+        hash_verts = loop_hashes[:, 0]
+        # position of every hash within the run of hashes that share its blender vertex
+        run_starts = np.flatnonzero(np.concatenate(([True], hash_verts[1:] != hash_verts[:-1])))
+        run_lengths = np.diff(np.append(run_starts, n_hashes))
+        run_position = np.arange(n_hashes, dtype=int) - np.repeat(run_starts, run_lengths)
+
+        # the earliest hash of the same vertex within epsilon, or the hash itself if there is none
+        hash_to_same_hash = np.arange(n_hashes, dtype=int)
+        # larger offsets reach earlier hashes, so they are applied last and win
+        for offset in range(1, run_lengths.max()):
+            comp_indices = np.flatnonzero(run_position >= offset)
+            diffs = np.abs(loop_hashes[comp_indices] - loop_hashes[comp_indices - offset])
+            same = np.all(diffs <= epsilon, axis=1)
+            hash_to_same_hash[comp_indices[same]] = comp_indices[same] - offset
+
+        # follow chains of merges down to the hash that started a new nif vertex
+        while True:
+            next_same_hash = hash_to_same_hash[hash_to_same_hash]
+            if np.array_equal(next_same_hash, hash_to_same_hash):
+                break
+            hash_to_same_hash = next_same_hash
+        # nif vertices are numbered in the order their first hash appears
+        is_new_vert = hash_to_same_hash == np.arange(n_hashes, dtype=int)
+        return (np.cumsum(is_new_vert) - 1)[hash_to_same_hash]
+
     def get_geom_data(self, b_mesh, color, normal, uv, tangent, b_mat_index):
         """
         Converts the blender information in b_mesh to a triangles, a dictionary with vertex information and a
@@ -99,32 +161,61 @@ class GeometryData:
 
         n_loops = len(b_mesh.loops)
         n_verts = len(b_mesh.vertices)
+        n_polys = len(b_mesh.polygons)
         n_tris = len(b_mesh.loop_triangles)
 
+        # the polygon of every loop, without visiting the polygons one by one
+        poly_loop_starts = np.zeros(n_polys, dtype=int)
+        b_mesh.polygons.foreach_get('loop_start', poly_loop_starts)
+        poly_loop_totals = np.zeros(n_polys, dtype=int)
+        b_mesh.polygons.foreach_get('loop_total', poly_loop_totals)
+        poly_loop_offsets = np.arange(poly_loop_totals.sum(), dtype=int) - np.repeat(
+            np.cumsum(poly_loop_totals) - poly_loop_totals, poly_loop_totals)
+        loop_to_poly = np.zeros(n_loops, dtype=int)
+        loop_to_poly[np.repeat(poly_loop_starts, poly_loop_totals) + poly_loop_offsets] = np.repeat(
+            np.arange(n_polys, dtype=int), poly_loop_totals)
+        del poly_loop_starts, poly_loop_totals, poly_loop_offsets
+
         if b_mat_index >= 0:
-            loop_mat_indices = np.ones(n_loops, dtype=int) * -1
-            for poly in b_mesh.polygons:
-                loop_mat_indices[poly.loop_indices] = poly.material_index
-            matl_to_loop = np.arange(n_loops, dtype=int)[loop_mat_indices == b_mat_index]
-            del loop_mat_indices
+            poly_mat_indices = np.zeros(n_polys, dtype=int)
+            b_mesh.polygons.foreach_get('material_index', poly_mat_indices)
+            matl_to_loop = np.flatnonzero(poly_mat_indices[loop_to_poly] == b_mat_index)
+            del poly_mat_indices
         else:
             matl_to_loop = np.arange(n_loops, dtype=int)
         # for the loops without matl equivalent, use len(matl_to_loop) to exceed the length of the matl array
-        loop_to_matl = np.ones(n_loops, dtype=int) * len(matl_to_loop)
+        loop_to_matl = np.full(n_loops, len(matl_to_loop), dtype=int)
         loop_to_matl[matl_to_loop] = np.arange(len(matl_to_loop), dtype=int)
 
-        loop_hashes = np.zeros((len(matl_to_loop), 0), dtype=float)
+        n_uv_layers = len(b_mesh.uv_layers) if uv else 0
+        separate_tangents = tangent and NifOp.props.sep_tangent_space
+        # the hash of a loop is every attribute that can split a nif vertex, so reserve a column for each
+        hash_widths = {
+            'VERTEX': 1,
+            'POSITION': 3,
+            'COLOR': 4 if color else 0,
+            'NORMAL': 3 if normal else 0,
+            'UV': 2 * n_uv_layers,
+            'TANGENT': 3 if separate_tangents else 0,
+            'BITANGENT': 3 if separate_tangents else 0,
+        }
+        hash_columns = {}
+        hash_width = 0
+        for key, width in hash_widths.items():
+            hash_columns[key] = slice(hash_width, hash_width + width)
+            hash_width += width
+        loop_hashes = np.zeros((len(matl_to_loop), hash_width), dtype=float)
 
         loop_to_vert = np.zeros(n_loops, dtype=int)
         b_mesh.loops.foreach_get('vertex_index', loop_to_vert)
         matl_to_vert = loop_to_vert[matl_to_loop]
-        loop_hashes = np.concatenate((loop_hashes, matl_to_vert.reshape((-1, 1))), axis=1)
+        loop_hashes[:, hash_columns['VERTEX']] = matl_to_vert.reshape((-1, 1))
 
         vert_positions = np.zeros((n_verts, 3), dtype=float)
         b_mesh.vertices.foreach_get('co', vert_positions.reshape((-1, 1)))
         loop_positions = vert_positions[matl_to_vert]
         del vert_positions
-        loop_hashes = np.concatenate((loop_hashes, loop_positions), axis=1)
+        loop_hashes[:, hash_columns['POSITION']] = loop_positions
 
         if color:
             loop_colors = np.zeros((n_loops, 4), dtype=float)
@@ -145,73 +236,57 @@ class GeometryData:
             # Blender holds these as scene linear values, but the games store the gamma
             # space colours they multiply onto the texture, so encode them back to sRGB
             loop_colors[:, :3] = self.scene_linear_to_srgb(loop_colors[:, :3])
-            loop_hashes = np.concatenate((loop_hashes, loop_colors), axis=1)
+            loop_hashes[:, hash_columns['COLOR']] = loop_colors
 
         if normal:
             # calculate normals
             loop_normals = np.zeros((n_loops, 3), dtype=float)
             b_mesh.loops.foreach_get('normal', loop_normals.reshape((-1, 1)))
             # smooth = vertex normal, non-smooth = face normal)
-            for poly in b_mesh.polygons:
-                if not poly.use_smooth:
-                    loop_normals[poly.loop_indices] = poly.normal
+            poly_smooth = np.zeros(n_polys, dtype=bool)
+            b_mesh.polygons.foreach_get('use_smooth', poly_smooth)
+            if not poly_smooth.all():
+                poly_normals = np.zeros((n_polys, 3), dtype=float)
+                b_mesh.polygons.foreach_get('normal', poly_normals.reshape((-1, 1)))
+                flat_loops = np.flatnonzero(~poly_smooth[loop_to_poly])
+                loop_normals[flat_loops] = poly_normals[loop_to_poly[flat_loops]]
+                del poly_normals, flat_loops
+            del poly_smooth
             loop_normals = loop_normals[matl_to_loop]
-            loop_hashes = np.concatenate((loop_hashes, loop_normals), axis=1)
+            loop_hashes[:, hash_columns['NORMAL']] = loop_normals
 
         if uv:
-            uv_layers = []
-            for layer in b_mesh.uv_layers:
-                loop_uv = np.zeros((n_loops, 2), dtype=float)
+            loop_uvs = np.zeros((len(matl_to_loop), n_uv_layers, 2), dtype=float)
+            loop_uv = np.zeros((n_loops, 2), dtype=float)
+            for layer_index, layer in enumerate(b_mesh.uv_layers):
                 layer.data.foreach_get('uv', loop_uv.reshape((-1, 1)))
-                loop_uv = loop_uv[matl_to_loop]
-                uv_layers.append(loop_uv)
-                loop_hashes = np.concatenate((loop_hashes, loop_uv), axis=1)
-            loop_uvs = np.swapaxes(uv_layers, 0, 1)
-            del uv_layers
+                loop_uvs[:, layer_index] = loop_uv[matl_to_loop]
+            del loop_uv
+            loop_hashes[:, hash_columns['UV']] = loop_uvs.reshape((len(matl_to_loop), -1))
 
         if tangent:
             b_mesh.calc_tangents(uvmap=b_mesh.uv_layers[0].name)
             loop_tangents = np.zeros((n_loops, 3), dtype=float)
             b_mesh.loops.foreach_get('tangent', loop_tangents.reshape((-1, 1)))
             loop_tangents = loop_tangents[matl_to_loop]
-            if NifOp.props.sep_tangent_space:
-                loop_hashes = np.concatenate((loop_hashes, loop_tangents), axis=1)
 
             bitangent_signs = np.zeros((n_loops, 1), dtype=float)
             b_mesh.loops.foreach_get('bitangent_sign', bitangent_signs)
             bitangent_signs = bitangent_signs[matl_to_loop]
             loop_bitangents = bitangent_signs * np.cross(loop_normals, loop_tangents)
-            if NifOp.props.sep_tangent_space:
-                loop_hashes = np.concatenate((loop_hashes, loop_bitangents), axis=1)
             del bitangent_signs
+            if separate_tangents:
+                loop_hashes[:, hash_columns['TANGENT']] = loop_tangents
+                loop_hashes[:, hash_columns['BITANGENT']] = loop_bitangents
 
         # now remove duplicates
         # first exact (also sorts by blender vertex)
         loop_hashes, hash_to_matl, matl_to_hash = np.unique(loop_hashes, return_index=True, return_inverse=True, axis=0)
-        hash_to_same_hash = np.arange(len(loop_hashes), dtype=int)
-        hash_to_nif_vert = np.arange(len(loop_hashes), dtype=int)
         # then inexact (if epsilon is not 0)
         if NifOp.props.epsilon > 0:
-
-            current_vert = -1
-            max_nif_vert = -1
-            for hash_index, loop_hash in enumerate(loop_hashes):
-                if loop_hash[0] != current_vert:
-                    current_vert = loop_hash[0]
-                    current_hash_start = hash_index
-
-                nif_vert_index = max_nif_vert + 1
-                for comp_index in range(current_hash_start, hash_index):
-                    comp_loop_hash = loop_hashes[comp_index]
-                    if any(np.abs(comp_loop_hash - loop_hash) > NifOp.props.epsilon):
-                        # this hash is different, but others may be the same
-                        continue
-                    else:
-                        nif_vert_index = hash_to_nif_vert[comp_index]
-                        hash_to_same_hash[hash_index] = comp_index
-                        break
-                hash_to_nif_vert[hash_index] = nif_vert_index
-                max_nif_vert = max((nif_vert_index, max_nif_vert))
+            hash_to_nif_vert = self.weld_hashes(loop_hashes, NifOp.props.epsilon)
+        else:
+            hash_to_nif_vert = np.arange(len(loop_hashes), dtype=int)
 
         # finally, use the mapping from blender to nif to create the triangles
         # first get the actual triangles in an array
@@ -228,16 +303,14 @@ class GeometryData:
         blend_triangles = blend_triangles[mattri_to_looptri]
         tri_to_poly = tri_to_poly[mattri_to_looptri]
         # go from loop indices to nif vertices
-        # [TODO] Possibly optimize later
-        for i in range(len(blend_triangles)):
-            blend_triangles[i] = hash_to_nif_vert[matl_to_hash[loop_to_matl[blend_triangles[i]]]]
+        blend_triangles = hash_to_nif_vert[matl_to_hash.ravel()[loop_to_matl[blend_triangles]]]
         # sort the triangles on polygon index to keep the original order
         tri_sort = np.argsort(tri_to_poly, axis=0)
         tri_to_poly = tri_to_poly[tri_sort]
         blend_triangles = blend_triangles[tri_sort]
 
         # make the vertex data from the hash map
-        nif_to_hash = np.unique(hash_to_same_hash, return_index=True)[1]
+        nif_to_hash = np.unique(hash_to_nif_vert, return_index=True)[1]
         nif_to_matl = hash_to_matl[nif_to_hash]
         data_dict = {
             'POSITION': loop_positions[nif_to_matl]
@@ -290,16 +363,11 @@ class GeometryData:
         n_geom.data_size = ((n_geom.vertex_desc & 0xF) * n_geom.num_vertices * 4) + (n_geom.num_triangles * 6)
 
         n_geom.reset_field('vertex_data')
-        for n_v, b_v in zip([data.vertex for data in n_geom.vertex_data], vertex_information['POSITION']):
-            n_v.x, n_v.y, n_v.z = b_v
+        set_struct_fields(n_geom.vertex_data, vertex_information['POSITION'], XYZ, member='vertex')
         if vertex_flags.u_vs:
-            for n_uv, b_uv in zip([data.uv for data in n_geom.vertex_data], vertex_information['UV']):
-                # NIF flips the texture V-coordinate (OpenGL standard)
-                n_uv.u = b_uv[0][0]
-                n_uv.v = 1.0 - b_uv[0][1]
+            set_struct_fields(n_geom.vertex_data, self.flip_v(vertex_information['UV'][:, 0]), UV, member='uv')
         if vertex_flags.normals:
-            for n_n, b_n in zip([data.normal for data in n_geom.vertex_data], vertex_information['NORMAL']):
-                n_n.x, n_n.y, n_n.z = b_n
+            set_struct_fields(n_geom.vertex_data, vertex_information['NORMAL'], XYZ, member='normal')
         if vertex_flags.tangents:
             # Tangents and bitangents are (mostly) stored as normbyte and therefore must be limited to [-1.0, 1.0]
             # However, Blender can sometimes give a value outside the bound due to rounding.
@@ -311,22 +379,17 @@ class GeometryData:
             )
             # B_tan: +d(B_u), B_bit: +d(B_v) and N_tan: +d(N_v), N_bit: +d(N_u)
             # moreover, N_v = 1 - B_v, so d(B_v) = - d(N_v), therefore N_tan = -B_bit and N_bit = B_tan
-            for n_t, b_t in zip([data.tangent for data in n_geom.vertex_data], vertex_information['BITANGENT']):
-                n_t.x, n_t.y, n_t.z = -b_t
-            for n_vert, b_b in zip(n_geom.vertex_data, vertex_information['TANGENT']):
-                n_vert.bitangent_x, n_vert.bitangent_y, n_vert.bitangent_z = b_b
+            set_struct_fields(n_geom.vertex_data, -vertex_information['BITANGENT'], XYZ, member='tangent')
+            set_struct_fields(n_geom.vertex_data, vertex_information['TANGENT'],
+                              ('bitangent_x', 'bitangent_y', 'bitangent_z'))
         if vertex_flags.vertex_colors:
             vertex_information['COLOR'] = np.rint(vertex_information['COLOR'] * 255).astype(int)
-            for n_c, b_c in zip([data.vertex_colors for data in n_geom.vertex_data], vertex_information['COLOR']):
-                n_c.r, n_c.g, n_c.b, n_c.a = b_c
+            set_struct_fields(n_geom.vertex_data, vertex_information['COLOR'], RGBA, member='vertex_colors')
 
         n_geom.update_center_radius()
 
         n_geom.reset_field('triangles')
-        for n_tri, b_tri in zip(n_geom.triangles, triangles):
-            n_tri.v_1 = b_tri[0]
-            n_tri.v_2 = b_tri[1]
-            n_tri.v_3 = b_tri[2]
+        set_struct_fields(n_geom.triangles, triangles, ('v_1', 'v_2', 'v_3'))
 
     def set_ni_geom_data(self, n_geom, triangles, vertex_information, b_uv_layers):
         """Sets the geometry data (triangles and flat lists of per-vertex data) to a BSGeometry block."""
@@ -335,15 +398,13 @@ class GeometryData:
         n_geom.data.num_vertices = len(vertex_information['POSITION'])
         n_geom.data.has_vertices = True
         n_geom.data.reset_field("vertices")
-        for n_v, b_v in zip(n_geom.data.vertices, vertex_information['POSITION']):
-            n_v.x, n_v.y, n_v.z = b_v
+        set_struct_fields(n_geom.data.vertices, vertex_information['POSITION'], XYZ)
         n_geom.data.update_center_radius()
         # normals
         n_geom.data.has_normals = 'NORMAL' in vertex_information
         if n_geom.data.has_normals:
             n_geom.data.reset_field("normals")
-            for n_v, b_v in zip(n_geom.data.normals, vertex_information['NORMAL']):
-                n_v.x, n_v.y, n_v.z = b_v
+            set_struct_fields(n_geom.data.normals, vertex_information['NORMAL'], XYZ)
         # tangents
         if 'TANGENT' in vertex_information:
             tangents = vertex_information['TANGENT']
@@ -359,8 +420,7 @@ class GeometryData:
         n_geom.data.has_vertex_colors = 'COLOR' in vertex_information
         if n_geom.data.has_vertex_colors:
             n_geom.data.reset_field("vertex_colors")
-            for n_v, b_v in zip(n_geom.data.vertex_colors, vertex_information['COLOR']):
-                n_v.r, n_v.g, n_v.b, n_v.a = b_v
+            set_struct_fields(n_geom.data.vertex_colors, vertex_information['COLOR'], RGBA)
         # uv_sets
         has_uv = False
         if bpy.context.scene.niftools_scene.nif_version == 0x14020007 and bpy.context.scene.niftools_scene.user_version_2:
@@ -379,14 +439,9 @@ class GeometryData:
         n_geom.data.reset_field("uv_sets")
 
         if has_uv:
-            uv_coords = vertex_information['UV']
+            uv_coords = self.flip_v(vertex_information['UV'])
             for j, n_uv_set in enumerate(n_geom.data.uv_sets):
-                for i, n_uv in enumerate(n_uv_set):
-                    if len(uv_coords[i]) == 0:
-                        continue  # skip non-uv textures
-                    n_uv.u = uv_coords[i][j][0]
-                    # NIF flips the texture V-coordinate (OpenGL standard)
-                    n_uv.v = 1.0 - uv_coords[i][j][1]  # opengl standard
+                set_struct_fields(n_uv_set, uv_coords[:, j], UV)
         # set triangles stitch strips for civ4
         n_geom.data.set_triangles(triangles, stitchstrips=True)
 
@@ -417,8 +472,6 @@ class GeometryData:
             # XXX used to be 61440
             # XXX from Sid Meier's Railroad
             n_geom.data.reset_field("tangents")
-            for n_v, b_v in zip(n_geom.data.tangents, tangents):
-                n_v.x, n_v.y, n_v.z = b_v
+            set_struct_fields(n_geom.data.tangents, tangents, XYZ)
             n_geom.data.reset_field("bitangents")
-            for n_v, b_v in zip(n_geom.data.bitangents, bitangents):
-                n_v.x, n_v.y, n_v.z = b_v
+            set_struct_fields(n_geom.data.bitangents, bitangents, XYZ)
@@ -38,13 +38,249 @@
 # ***** END LICENSE BLOCK *****
 
 
-from itertools import repeat
+import numpy as np
 
 from .... import NifLog
+from ....utils.arrays import set_struct_fields
 from nifgen.formats.nif import classes as NifClasses
 from nifgen.utils.meshopt_stripify import stripify as meshopt_stripify
 from nifgen.utils.vertex_cache import get_cache_optimized_triangles
 
+# number of set bits in every byte value, to count the bones in packed bone sets
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def get_weight_arrays(weights):
+    """Convert per vertex lists of [bone, weight] pairs to padded arrays.
+
+    :param weights: For every vertex, a list of [bone index, weight] pairs.
+    :return: Bone indices and weights of shape (num vertices, max bones per
+        vertex). Unused slots have bone index -1 and weight 0.
+    """
+    n_slots = max([len(weight) for weight in weights] + [1])
+    bone_indices = np.full((len(weights), n_slots), -1, dtype=int)
+    bone_weights = np.zeros((len(weights), n_slots), dtype=float)
+    counts = np.array([len(weight) for weight in weights], dtype=int)
+    rows = np.repeat(np.arange(len(weights), dtype=int), counts)
+    cols = np.arange(counts.sum(), dtype=int) - np.repeat(np.cumsum(counts) - counts, counts)
+    pairs = np.array([pair for weight in weights for pair in weight], dtype=float).reshape((-1, 2))
+    bone_indices[rows, cols] = pairs[:, 0]
+    bone_weights[rows, cols] = pairs[:, 1]
+    return bone_indices, bone_weights
+
+
+def sort_by_bone(bone_indices, bone_weights):
+    """Sort the influences of every vertex by bone, with unused slots last."""
+    order = np.argsort(np.where(bone_indices < 0, np.iinfo(int).max, bone_indices), axis=1, kind="stable")
+    return np.take_along_axis(bone_indices, order, axis=1), np.take_along_axis(bone_weights, order, axis=1)
+
+
+def limit_bones_per_vertex(bone_indices, bone_weights, maxbonespervertex):
+    """Keep only the largest maxbonespervertex influences of every vertex.
+
+    Vertices that lose influences are normalized again. The influences of
+    every vertex are returned sorted by bone.
+
+    :return: Bone indices, bone weights and the largest weight removed.
+    """
+    order = np.argsort(np.where(bone_indices < 0, np.inf, -bone_weights), axis=1, kind="stable")
+    bone_indices = np.take_along_axis(bone_indices, order, axis=1)
+    bone_weights = np.take_along_axis(bone_weights, order, axis=1)
+    lostweight = 0.0
+    if bone_indices.shape[1] > maxbonespervertex:
+        lostweight = float(bone_weights[:, maxbonespervertex:].max(initial=0.0))
+        pruned = bone_indices[:, maxbonespervertex] >= 0
+        bone_indices = bone_indices[:, :maxbonespervertex].copy()
+        bone_weights = bone_weights[:, :maxbonespervertex].copy()
+        totals = bone_weights[pruned].sum(axis=1, keepdims=True)
+        bone_weights[pruned] /= np.where(totals > 0, totals, 1.0)
+    # sort by again by bone (relied on later when matching vertices)
+    bone_indices, bone_weights = sort_by_bone(bone_indices, bone_weights)
+    return bone_indices, bone_weights, lostweight
+
+
+def get_bone_bitsets(bone_indices, n_bones):
+    """The bones influencing every vertex as a packed bit set, one row of bytes per vertex."""
+    has_bone = np.zeros((len(bone_indices), max(n_bones, 1)), dtype=bool)
+    rows, cols = np.nonzero(bone_indices >= 0)
+    has_bone[rows, bone_indices[rows, cols]] = True
+    return np.packbits(has_bone, axis=1)
+
+
+def count_bits(bitsets):
+    """Number of bones in every row of packed bit sets."""
+    return POPCOUNT[bitsets].sum(axis=-1, dtype=int)
+
+
+def limit_bones_per_triangle(bone_indices, bone_weights, triangles, maxbonesperpartition):
+    """Remove the least influential bones from triangles with more than maxbonesperpartition bones.
+
+    Removing bones from a vertex never adds bones to a triangle, so only the
+    triangles that are over the limit to begin with are visited. Arrays are
+    updated in place.
+
+    :return: The largest weight removed.
+    """
+    n_bones = int(bone_indices.max(initial=-1)) + 1
+    vert_bits = get_bone_bitsets(bone_indices, n_bones)
+    tri_counts = count_bits(vert_bits[triangles[:, 0]] | vert_bits[triangles[:, 1]] | vert_bits[triangles[:, 2]])
+    lostweight = 0.0
+    for tri in triangles[tri_counts > maxbonesperpartition]:
+        while True:
+            # find the bones influencing this triangle
+            tri_indices = bone_indices[tri]
+            tri_weights = bone_weights[tri]
+            valid = tri_indices >= 0
+            tribones, tribone_of_slot = np.unique(tri_indices[valid], return_inverse=True)
+            # target met?
+            if len(tribones) <= maxbonesperpartition:
+                break
+            # no, need to remove a bone
+            # sum weights for each bone to find the one that least influences this triangle
+            tribonesweights = np.bincount(tribone_of_slot, weights=tri_weights[valid], minlength=len(tribones))
+            # bones with weight 1 cannot be removed
+            single = valid.sum(axis=1) == 1
+            nono = np.isin(tribones, tri_indices[single, 0])
+            if nono.all():
+                raise ValueError(
+                    "cannot remove anymore bones in this skin; "
+                    "increase maxbonesperpartition and try again")
+            minbone = tribones[~nono][np.argmin(tribonesweights[~nono])]
+
+            # remove minbone from all vertices of this triangle
+            for t in np.unique(tri):
+                slot = np.flatnonzero(bone_indices[t] == minbone)
+                if not len(slot):
+                    continue
+                # save lost weight to return to user
+                lostweight = max(lostweight, float(bone_weights[t, slot[0]]))
+                bone_indices[t, slot[0]] = -1
+                bone_weights[t, slot[0]] = 0.0
+                # normalize
+                totalweight = bone_weights[t].sum()
+                if totalweight > 0:
+                    bone_weights[t] /= totalweight
+                order = np.argsort(np.where(bone_indices[t] < 0, np.iinfo(int).max, bone_indices[t]), kind="stable")
+                bone_indices[t] = bone_indices[t, order]
+                bone_weights[t] = bone_weights[t, order]
+    return lostweight
+
+
+def create_partitions(triangles, tri_bits, trianglepartmap, maxbonesperpartition, n_verts):
+    """Split triangles into partitions by greedy growth over the triangle adjacency graph.
+
+    A partition starts at the first triangle that has not been assigned yet.
+    It then takes in every neighbouring triangle whose bones it already has,
+    and when there are none left, the neighbour that adds the fewest new bones
+    without exceeding maxbonesperpartition. Once the neighbours are exhausted,
+    any other triangle whose bones are all in the partition is taken in too,
+    and growth continues from there. Triangles with different indices in
+    trianglepartmap never share a partition.
+
+    :return: List of (bone bit set, triangle indices, partition index) tuples.
+    """
+    n_tris = len(triangles)
+    # triangles around every vertex, in compressed sparse row form
+    corner_order = np.argsort(triangles.ravel(), kind="stable")
+    vert_tris = corner_order // 3
+    vert_starts = np.searchsorted(triangles.ravel()[corner_order], np.arange(n_verts + 1))
+
+    def incident_triangles(tris):
+        verts = np.unique(triangles[tris])
+        starts = vert_starts[verts]
+        counts = vert_starts[verts + 1] - starts
+        offsets = np.arange(counts.sum(), dtype=int) - np.repeat(np.cumsum(counts) - counts, counts)
+        return vert_tris[np.repeat(starts, counts) + offsets]
+
+    unassigned = np.ones(n_tris, dtype=bool)
+    parts = []
+    seed = 0
+    while True:
+        # keep creating partitions as long as there are triangles left
+        while seed < n_tris and not unassigned[seed]:
+            seed += 1
+        if seed == n_tris:
+            break
+        partindex = trianglepartmap[seed]
+        part_bits = tri_bits[seed].copy()
+        part_tris = [np.array([seed])]
+        unassigned[seed] = False
+        candidates = incident_triangles(part_tris[0])
+        while True:
+            candidates = np.unique(candidates)
+            candidates = candidates[unassigned[candidates] & (trianglepartmap[candidates] == partindex)]
+            added = None
+            if len(candidates):
+                n_extra = count_bits(tri_bits[candidates] & ~part_bits)
+                if (n_extra == 0).any():
+                    added = candidates[n_extra == 0]
+                else:
+                    # if we have room left in the partition, add the cheapest adjacent triangle
+                    fits = count_bits(part_bits) + n_extra <= maxbonesperpartition
+                    if fits.any():
+                        added = candidates[fits][[np.argmin(n_extra[fits])]]
+                        part_bits |= tri_bits[added[0]]
+            if added is None:
+                # no more neighbours fit, take in the rest of the triangles covered by the partition bones
+                rest = np.flatnonzero(unassigned & (trianglepartmap == partindex))
+                covered = count_bits(tri_bits[rest] & ~part_bits) == 0
+                if not covered.any():
+                    break
+                added = rest[covered]
+            unassigned[added] = False
+            part_tris.append(added)
+            candidates = np.concatenate((candidates, incident_triangles(added)))
+        parts.append((part_bits, np.sort(np.concatenate(part_tris)), partindex))
+    return parts
+
+
+def merge_partitions(parts, maxbonesperpartition):
+    """Merge partitions with the same index as long as the bone limit allows.
+
+    :param parts: List of (bone bit set, triangle indices, partition index) tuples.
+    :return: The merged partitions as [set of bones, list of triangle indices, partition index] lists.
+    """
+    n_bits = 8 * len(parts[0][0]) if parts else 0
+    # python integers are the fastest bit sets for the few partitions there are
+    parts = [[int.from_bytes(part_bits.tobytes(), "big"), [part_tris], partindex]
+             for part_bits, part_tris, partindex in parts]
+    merged = True  # signals success, in which case do another run
+    while merged:
+        merged = False
+        # newparts is to contain the updated merged partitions as we go
+        newparts = []
+        # addedparts is the set of all partitions from parts that have been added to newparts
+        addedparts = set()
+        # try all combinations
+        for a, parta in enumerate(parts):
+            if a in addedparts:
+                continue
+            newparts.append(parta)
+            addedparts.add(a)
+            for b in range(a + 1, len(parts)):
+                if b in addedparts:
+                    continue
+                partb = parts[b]
+                # if partition indices are the same, and bone limit is not exceeded, merge them
+                if (parta[2] == partb[2]) and ((parta[0] | partb[0]).bit_count() <= maxbonesperpartition):
+                    parta[0] |= partb[0]
+                    parta[1] += partb[1]
+                    addedparts.add(b)
+                    merged = True  # signal another try in merging partitions
+        # update partitions to the merged partitions
+        parts = newparts
+
+    return [[{bone for bone in range(n_bits) if (bits >> (n_bits - 1 - bone)) & 1},
+             np.concatenate(part_tris), partindex]
+            for bits, part_tris, partindex in parts]
+
+
+def first_appearance(vertices):
+    """The unique vertices in the order in which they first appear."""
+    vertices = np.asarray(vertices, dtype=int).ravel()
+    unique, first = np.unique(vertices, return_index=True)
+    return unique[np.argsort(first)]
+
 
 def update_skin_partition(self,
                           maxbonesperpartition=4, maxbonespervertex=4,
@@ -84,10 +320,6 @@ def update_skin_partition(self,
         and sorts the shared bone lists based on its first body part.
     """
 
-    # if trianglepartmap not specified, map everything to index 0
-    if trianglepartmap is None:
-        trianglepartmap = repeat(0)
-
     # shortcuts relevant blocks
     if not self.skin_instance:
         # no skin, nothing to do
@@ -100,13 +332,15 @@ def update_skin_partition(self,
     # get skindata vertex weights
     NifLog.debug("Getting vertex weights.")
     weights = self.get_vertex_weights()
+    bone_indices, bone_weights = get_weight_arrays(weights)
+    del weights
 
     # count minimum and maximum number of bones per vertex
-    minbones = min(len(weight) for weight in weights)
-    maxbones = max(len(weight) for weight in weights)
+    bone_counts = (bone_indices >= 0).sum(axis=1)
+    minbones = int(bone_counts.min(initial=0))
+    maxbones = int(bone_counts.max(initial=0))
     if minbones <= 0:
-        noweights = [v for v, weight in enumerate(weights)
-                     if not weight]
+        noweights = np.flatnonzero(bone_counts == 0).tolist()
         # raise ValueError(
         NifLog.warn(
             'bad NiSkinData: some vertices have no weights %s'
@@ -116,22 +350,7 @@ def update_skin_partition(self,
 
     # reduce bone influences to meet maximum number of bones per vertex
     NifLog.info("Imposing maximum of %i bones per vertex." % maxbonespervertex)
-    lostweight = 0.0
-    for weight in weights:
-        if len(weight) > maxbonespervertex:
-            # delete bone influences with least weight
-            weight.sort(key=lambda x: x[1], reverse=True)  # sort by weight
-            # save lost weight to return to user
-            lostweight = max(
-                lostweight, max(
-                    [x[1] for x in weight[maxbonespervertex:]]))
-            del weight[maxbonespervertex:]  # only keep first elements
-            # normalize
-            totalweight = sum([x[1] for x in weight])  # sum of all weights
-            for x in weight: x[1] /= totalweight
-            maxbones = maxbonespervertex
-        # sort by again by bone (relied on later when matching vertices)
-        weight.sort(key=lambda x: x[0])
+    bone_indices, bone_weights, lostweight = limit_bones_per_vertex(bone_indices, bone_weights, maxbonespervertex)
 
     # reduce bone influences to meet maximum number of bones per partition
     # (i.e. maximum number of bones per triangle)
@@ -141,173 +360,26 @@ def update_skin_partition(self,
 
     if triangles is None:
         triangles = geomdata.get_triangles()
+    triangles = np.asarray(triangles, dtype=int).reshape((-1, 3))
+    # if trianglepartmap not specified, map everything to index 0
+    if trianglepartmap is None:
+        trianglepartmap = np.zeros(len(triangles), dtype=int)
+    trianglepartmap = np.asarray(trianglepartmap, dtype=int)
 
-    for tri in triangles:
-        while True:
-            # find the bones influencing this triangle
-            tribones = []
-            for t in tri:
-                tribones.extend([bonenum for bonenum, boneweight in weights[t]])
-            tribones = set(tribones)
-            # target met?
-            if len(tribones) <= maxbonesperpartition:
-                break
-            # no, need to remove a bone
-
-            # sum weights for each bone to find the one that least influences
-            # this triangle
-            tribonesweights = {}
-            for bonenum in tribones: tribonesweights[bonenum] = 0.0
-            nono = set()  # bones with weight 1 cannot be removed
-            for skinweights in [weights[t] for t in tri]:
-                # skinweights[0] is the first skinweight influencing vertex t
-                # and skinweights[0][0] is the bone number of that bone
-                if len(skinweights) == 1: nono.add(skinweights[0][0])
-                for bonenum, boneweight in skinweights:
-                    tribonesweights[bonenum] += boneweight
-
-            # select a bone to remove
-            # first find bones we can remove
-
-            # restrict to bones not in the nono set
-            tribonesweights = [
-                x for x in list(tribonesweights.items()) if x[0] not in nono]
-            if not tribonesweights:
-                raise ValueError(
-                    "cannot remove anymore bones in this skin; "
-                    "increase maxbonesperpartition and try again")
-            # sort by vertex weight sum the last element of this list is now a
-            # candidate for removal
-            tribonesweights.sort(key=lambda x: x[1], reverse=True)
-            minbone = tribonesweights[-1][0]
-
-            # remove minbone from all vertices of this triangle and from all
-            # matching vertices
-            for t in tri:
-                for tt in [t]:  # match[t]:
-                    # remove bone
-                    weight = weights[tt]
-                    for i, (bonenum, boneweight) in enumerate(weight):
-                        if bonenum == minbone:
-                            # save lost weight to return to user
-                            lostweight = max(lostweight, boneweight)
-                            del weight[i]
-                            break
-                    else:
-                        continue
-                    # normalize
-                    totalweight = sum([x[1] for x in weight])
-                    for x in weight:
-                        x[1] /= totalweight
+    lostweight = max(lostweight, limit_bones_per_triangle(bone_indices, bone_weights, triangles, maxbonesperpartition))
 
     # split triangles into partitions
     NifLog.info("Creating partitions")
-    parts = []
-    # keep creating partitions as long as there are triangles left
-    while len(triangles) > 0:
-        # create a partition
-        part = [set(), [], None]  # bones, triangles, partition index
-        usedverts = set()
-        addtriangles = True
-        # keep adding triangles to it as long as the flag is set
-        while addtriangles:
-            # newtriangles is a list of triangles that have not been added to
-            # the partition, similar for newtrianglepartmap
-            newtriangles = []
-            newtrianglepartmap = []
-            for tri, partindex in zip(triangles, trianglepartmap):
-                # find the bones influencing this triangle
-                tribones = []
-                for t in tri:
-                    tribones.extend([
-                        bonenum for bonenum, boneweight in weights[t]])
-                tribones = set(tribones)
-                # if part has no bones,
-                # or if part has all bones of tribones and index coincides
-                # then add this triangle to this part
-                if ((not part[0])
-                        or ((part[0] >= tribones) and (part[2] == partindex))):
-                    part[0] |= tribones
-                    part[1].append(tri)
-                    usedverts |= set(tri)
-                    # if part was empty, assign it the index
-                    if part[2] is None:
-                        part[2] = partindex
-                else:
-                    newtriangles.append(tri)
-                    newtrianglepartmap.append(partindex)
-            triangles = newtriangles
-            trianglepartmap = newtrianglepartmap
-
-            # if we have room left in the partition
-            # then add adjacent triangles
-            addtriangles = False
-            newtriangles = []
-            newtrianglepartmap = []
-            if len(part[0]) < maxbonesperpartition:
-                for tri, partindex in zip(triangles, trianglepartmap):
-                    # if triangle is adjacent, and has same index
-                    # then check if it can be added to the partition
-                    if (usedverts & set(tri)) and (part[2] == partindex):
-                        # find the bones influencing this triangle
-                        tribones = []
-                        for t in tri:
-                            tribones.extend([
-                                bonenum for bonenum, boneweight in weights[t]])
-                        tribones = set(tribones)
-                        # and check if we exceed the maximum number of allowed
-                        # bones
-                        if len(part[0] | tribones) <= maxbonesperpartition:
-                            part[0] |= tribones
-                            part[1].append(tri)
-                            usedverts |= set(tri)
-                            # signal another try in adding triangles to
-                            # the partition
-                            addtriangles = True
-                        else:
-                            newtriangles.append(tri)
-                            newtrianglepartmap.append(partindex)
-                    else:
-                        newtriangles.append(tri)
-                        newtrianglepartmap.append(partindex)
-                triangles = newtriangles
-                trianglepartmap = newtrianglepartmap
-
-        parts.append(part)
+    n_bones = int(bone_indices.max(initial=-1)) + 1
+    vert_bits = get_bone_bitsets(bone_indices, n_bones)
+    tri_bits = vert_bits[triangles[:, 0]] | vert_bits[triangles[:, 1]] | vert_bits[triangles[:, 2]]
+    parts = create_partitions(triangles, tri_bits, trianglepartmap, maxbonesperpartition, len(bone_indices))
 
     NifLog.info("Created %i small partitions." % len(parts))
 
     # merge all partitions
     NifLog.info("Merging partitions.")
-    merged = True  # signals success, in which case do another run
-    while merged:
-        merged = False
-        # newparts is to contain the updated merged partitions as we go
-        newparts = []
-        # addedparts is the set of all partitions from parts that have been
-        # added to newparts
-        addedparts = set()
-        # try all combinations
-        for a, parta in enumerate(parts):
-            if a in addedparts:
-                continue
-            newparts.append(parta)
-            addedparts.add(a)
-            for b, partb in enumerate(parts):
-                if b <= a:
-                    continue
-                if b in addedparts:
-                    continue
-                # if partition indices are the same, and bone limit is not
-                # exceeded, merge them
-                if ((parta[2] == partb[2])
-                        and (len(parta[0] | partb[0]) <= maxbonesperpartition)):
-                    parta[0] |= partb[0]
-                    parta[1] += partb[1]
-                    addedparts.add(b)
-                    merged = True  # signal another try in merging partitions
-        # update partitions to the merged partitions
-        parts = newparts
+    parts = merge_partitions(parts, maxbonesperpartition)
 
     # write the NiSkinPartition
     NifLog.info("Skin has %i partitions." % len(parts))
@@ -437,20 +509,16 @@ def update_skin_partition(self,
             # store part for next iteration
             lastpart = part
 
-    for skinpartblock, part in zip(skinpart.partitions, parts):
+    for part_index, (skinpartblock, part) in enumerate(zip(skinpart.partitions, parts)):
         # get sorted list of bones
-        bones = sorted(list(part[0]))
-        triangles = part[1]
-        NifLog.info("Optimizing triangle ordering in partition %i"
-                    % [i for i, check_part in enumerate(parts) if id(check_part) == id(part)][0])
+        bones = sorted(part[0])
+        NifLog.info("Optimizing triangle ordering in partition %i" % part_index)
         # optimize triangles for vertex cache and calculate strips
-        triangles = get_cache_optimized_triangles(
-            triangles)
-        num_vertices = len(set([vertex for triangle in triangles for vertex in triangle]))
-        strips = meshopt_stripify(triangles, num_vertices)
-        triangles_size = 3 * len(triangles)
+        part_triangles = get_cache_optimized_triangles(triangles[part[1]].tolist())
+        num_vertices = len(np.unique(part_triangles))
+        strips = meshopt_stripify(part_triangles, num_vertices)
+        triangles_size = 3 * len(part_triangles)
         strips_size = len(strips) + sum(len(strip) for strip in strips)
-        vertices = []
         # decide whether to use strip or triangles as primitive
         if stripify is None:
             stripifyblock = (
@@ -458,28 +526,19 @@ def update_skin_partition(self,
                     and all(len(strip) < 65536 for strip in strips))
         else:
             stripifyblock = stripify
+        # get sorted list of vertices
+        # for optimal performance, vertices must be sorted by strip or by triangle
         if stripifyblock:
             # stripify the triangles
             # also update triangle list
-            numtriangles = 0
-            # calculate number of triangles and get sorted
-            # list of vertices
-            # for optimal performance, vertices must be sorted
-            # by strip
-            for strip in strips:
-                numtriangles += len(strip) - 2
-                for t in strip:
-                    if t not in vertices:
-                        vertices.append(t)
+            numtriangles = sum(len(strip) - 2 for strip in strips)
+            vertices = first_appearance(np.concatenate([np.asarray(strip, dtype=int) for strip in strips]))
         else:
-            numtriangles = len(triangles)
-            # get sorted list of vertices
-            # for optimal performance, vertices must be sorted
-            # by triangle
-            for tri in triangles:
-                for t in tri:
-                    if t not in vertices:
-                        vertices.append(t)
+            numtriangles = len(part_triangles)
+            vertices = first_appearance(part_triangles)
+        # partition vertex of every geometry vertex
+        vertex_to_local = np.zeros(len(bone_indices), dtype=int)
+        vertex_to_local[vertices] = np.arange(len(vertices), dtype=int)
         # set all the data
         skinpartblock.num_vertices = len(vertices)
         skinpartblock.num_triangles = numtriangles
@@ -502,31 +561,53 @@ def update_skin_partition(self,
         # are fewer
         skinpartblock.num_weights_per_vertex = maxbonespervertex
         skinpartblock.reset_field("bones")
-        for i, bonenum in enumerate(bones):
-            skinpartblock.bones[i] = bonenum
-        for i in range(len(bones), skinpartblock.num_bones):
-            skinpartblock.bones[i] = 0  # dummy bone slots refer to first bone
+        # dummy bone slots refer to first bone
+        skinpartblock.bones[:] = bones + [0] * (skinpartblock.num_bones - len(bones))
         skinpartblock.has_vertex_map = True
         skinpartblock.reset_field("vertex_map")
-        for i, v in enumerate(vertices):
-            skinpartblock.vertex_map[i] = v
+        skinpartblock.vertex_map[:] = vertices
+
+        # per vertex weights and partition bone indices, padded to num_weights_per_vertex
+        num_weights = skinpartblock.num_weights_per_vertex
+        part_indices = np.full((len(vertices), num_weights), -1, dtype=int)
+        part_weights = np.zeros((len(vertices), num_weights), dtype=float)
+        n_slots = min(num_weights, bone_indices.shape[1])
+        part_indices[:, :n_slots] = bone_indices[vertices, :n_slots]
+        part_weights[:, :n_slots] = bone_weights[vertices, :n_slots]
+        bone_to_local = np.zeros(max(n_bones, 1), dtype=int)
+        bone_to_local[bones] = np.arange(len(bones), dtype=int)
+        is_used = part_indices >= 0
+        part_indices[is_used] = bone_to_local[part_indices[is_used]]
+        if padbones:
+            # if padbones is True then we have enforced num_bones == num_weights_per_vertex,
+            # so every vertex has enough unused partition bones to fill its empty slots
+            used_bones = np.zeros((len(vertices), skinpartblock.num_bones), dtype=bool)
+            rows, cols = np.nonzero(is_used)
+            used_bones[rows, part_indices[rows, cols]] = True
+            unused_bones = np.argsort(used_bones, axis=1, kind="stable")
+            pad_rank = np.arange(num_weights, dtype=int) - is_used.sum(axis=1, keepdims=True)
+            pad_bones = np.take_along_axis(unused_bones, np.clip(pad_rank, 0, None), axis=1)
+            part_indices = np.where(is_used, part_indices, pad_bones)
+            # sort weights by bone index (for ffvt3r)
+            order = np.argsort(part_indices, axis=1, kind="stable")
+        else:
+            part_indices[~is_used] = 0
+            # sort weights by weight (for fallout 3, largest weight first)
+            order = np.argsort(-part_weights, axis=1, kind="stable")
         skinpartblock.has_vertex_weights = True
         skinpartblock.reset_field("vertex_weights")
-        for i, v in enumerate(vertices):
-            for j in range(skinpartblock.num_weights_per_vertex):
-                if j < len(weights[v]):
-                    skinpartblock.vertex_weights[i][j] = weights[v][j][1]
-                else:
-                    skinpartblock.vertex_weights[i][j] = 0.0
+        skinpartblock.vertex_weights[:] = np.take_along_axis(part_weights, order, axis=1)
+        skinpartblock.has_bone_indices = True
+        skinpartblock.reset_field("bone_indices")
+        skinpartblock.bone_indices[:] = np.take_along_axis(part_indices, order, axis=1)
+
         if stripifyblock:
             skinpartblock.has_faces = True
             skinpartblock.reset_field("strip_lengths")
-            for i, strip in enumerate(strips):
-                skinpartblock.strip_lengths[i] = len(strip)
+            skinpartblock.strip_lengths[:] = [len(strip) for strip in strips]
             skinpartblock.reset_field("strips")
-            for i, strip in enumerate(strips):
-                for j, v in enumerate(strip):
-                    skinpartblock.strips[i][j] = vertices.index(v)
+            for n_strip, strip in zip(skinpartblock.strips, strips):
+                n_strip[:] = vertex_to_local[np.asarray(strip, dtype=int)]
         else:
             skinpartblock.has_faces = True
             # clear strip lengths array
@@ -534,43 +615,7 @@ def update_skin_partition(self,
             # clear strips array
             skinpartblock.reset_field("strips")
             skinpartblock.reset_field("triangles")
-            for i, (v_1, v_2, v_3) in enumerate(triangles):
-                skinpartblock.triangles[i].v_1 = vertices.index(v_1)
-                skinpartblock.triangles[i].v_2 = vertices.index(v_2)
-                skinpartblock.triangles[i].v_3 = vertices.index(v_3)
-        skinpartblock.has_bone_indices = True
-        skinpartblock.reset_field("bone_indices")
-        for i, v in enumerate(vertices):
-            # the boneindices set keeps track of indices that have not been
-            # used yet
-            boneindices = set(range(skinpartblock.num_bones))
-            for j in range(len(weights[v])):
-                skinpartblock.bone_indices[i][j] = bones.index(weights[v][j][0])
-                boneindices.remove(skinpartblock.bone_indices[i][j])
-            for j in range(len(weights[v]), skinpartblock.num_weights_per_vertex):
-                if padbones:
-                    # if padbones is True then we have enforced
-                    # num_bones == num_weights_per_vertex so this will not trigger
-                    # a KeyError
-                    skinpartblock.bone_indices[i][j] = boneindices.pop()
-                else:
-                    skinpartblock.bone_indices[i][j] = 0
-
-        # sort weights
-        for i, v in enumerate(vertices):
-            vweights = []
-            for j in range(skinpartblock.num_weights_per_vertex):
-                vweights.append([
-                    skinpartblock.bone_indices[i][j],
-                    skinpartblock.vertex_weights[i][j]])
-            if padbones:
-                # by bone index (for ffvt3r)
-                vweights.sort(key=lambda w: w[0])
-            else:
-                # by weight (for fallout 3, largest weight first)
-                vweights.sort(key=lambda w: -w[1])
-            for j in range(skinpartblock.num_weights_per_vertex):
-                skinpartblock.bone_indices[i][j] = vweights[j][0]
-                skinpartblock.vertex_weights[i][j] = vweights[j][1]
+            set_struct_fields(skinpartblock.triangles, vertex_to_local[np.asarray(part_triangles, dtype=int)],
+                              ('v_1', 'v_2', 'v_3'))
 
     return lostweight
@@ -42,6 +42,7 @@ import numpy as np
 
 import bpy
 from ....modules.nif_export.block_registry import block_store
+from ....modules.nif_export.geometry.skin_partition import update_skin_partition
 from ....utils import math
 from ....utils.logging import NifLog, NifError
 from ....utils.singleton import NifOp, NifData
@@ -91,59 +92,41 @@ class SkinnedGeometry:
                                                                                 face_group_names)
                 n_ni_geometry.skin_instance = n_ni_skin_instance
 
-                # Vertex weights,  find weights and normalization factors
-                vert_list = {}
-                vert_norm = {}
-                unweighted_vertices = []
-
-                for bone_group in boneinfluences:
-                    b_list_weight = []
-                    b_vert_group = b_obj.vertex_groups[bone_group]
-
-                    for b_vert in b_eval_mesh.vertices:
-                        if len(b_vert.groups) == 0:  # check vert has weight_groups
-                            unweighted_vertices.append(b_vert.index)
-                            continue
-
-                        for g in b_vert.groups:
-                            if b_vert_group.name in boneinfluences:
-                                if g.group == b_vert_group.index:
-                                    b_list_weight.append((b_vert.index, g.weight))
-                                    break
-
-                    vert_list[bone_group] = b_list_weight
-
-                    # create normalisation groupings
-                    for v in vert_list[bone_group]:
-                        if v[0] in vert_norm:
-                            vert_norm[v[0]] += v[1]
-                        else:
-                            vert_norm[v[0]] = v[1]
+                # Vertex weights as a sparse vertices x bones matrix, normalised per vertex
+                bone_names = sorted(boneinfluences, key=lambda name: b_obj.vertex_groups[name].index)
+                weight_rows, weight_bones, weights, unweighted_vertices = self.get_bone_weights(
+                    b_obj, b_eval_mesh, bone_names)
 
                 self.select_unweighted_vertices(b_obj, unweighted_vertices)
 
-                # for each bone, get the vertex weights and add its n_node to the NiSkinData
-                for b_bone_name in boneinfluences:
-                    # find vertex weights
-                    vert_weights = {}
-                    for v in vert_list[b_bone_name]:
-                        # v[0] is the original vertex index
-                        # v[1] is the weight
-
-                        # vertex_map[v[0]] is the set of vertices (indices) to which v[0] was mapped
-                        # so we simply export the same weight as the original vertex for each new vertex
-
-                        # write the weights
-                        # extra check for multi material meshes
-                        if vertex_map[v[0]] and vert_norm[v[0]]:
-                            for vert_index in vertex_map[v[0]]:
-                                vert_weights[vert_index] = v[1] / vert_norm[v[0]]
+                # vertex_map[v] is the list of nif vertices to which blender vertex v was mapped,
+                # so we simply export the same weight as the original vertex for each new vertex
+                # (it is empty for the vertices of other materials)
+                map_lengths = np.array([len(nif_verts) if nif_verts else 0 for nif_verts in vertex_map], dtype=int)
+                nif_to_blend = np.repeat(np.arange(len(vertex_map), dtype=int), map_lengths)
+                nif_vert_indices = np.array([nif_vert for nif_verts in vertex_map if nif_verts
+                                             for nif_vert in nif_verts], dtype=int)
+                # every stored weight of a blender vertex, repeated for each of its nif vertices
+                row_lengths = np.diff(weight_rows)[nif_to_blend]
+                entry_offsets = np.arange(row_lengths.sum(), dtype=int) - np.repeat(
+                    np.cumsum(row_lengths) - row_lengths, row_lengths)
+                entries = np.repeat(weight_rows[nif_to_blend], row_lengths) + entry_offsets
+                entry_nif_verts = np.repeat(nif_vert_indices, row_lengths)
+                entry_bones = weight_bones[entries]
+                entry_weights = weights[entries]
+
+                # for each bone, add its n_node and vertex weights to the NiSkinData
+                bone_order = np.argsort(entry_bones, kind='stable')
+                bone_starts = np.searchsorted(entry_bones[bone_order], np.arange(len(bone_names) + 1))
+                for bone_index, b_bone_name in enumerate(bone_names):
+                    bone_entries = bone_order[bone_starts[bone_index]:bone_starts[bone_index + 1]]
                     # add bone as influence, but only if there were actually any vertices influenced by the bone
-                    if vert_weights:
+                    if len(bone_entries):
+                        vert_weights = dict(zip(entry_nif_verts[bone_entries].tolist(),
+                                                entry_weights[bone_entries].tolist()))
                         # find bone in exported blocks
                         n_node = self.get_bone_block(b_obj_armature.data.bones[b_bone_name])
                         n_ni_geometry.add_bone(n_node, vert_weights)
-                del vert_weights
 
                 # update bind position skinning data
                 # n_geom.update_bind_position()
@@ -155,6 +138,64 @@ class SkinnedGeometry:
                 # calculate center and radius for each skin bone data block
                 n_ni_geometry.update_skin_center_radius()
 
+    @staticmethod
+    def get_bone_weights(b_obj, b_mesh, bone_names):
+        """
+        Gather the bone weights of all vertices in a single pass, as a sparse matrix of vertices by bones in
+        compressed sparse row form. Weights are normalised so that the bone weights of every vertex sum to one;
+        vertices whose bone weights sum to zero keep no entries.
+
+        :param b_obj: The skinned Blender object, which owns the vertex groups
+        :type b_obj: class:`bpy.types.Object`
+        :param b_mesh: The evaluated mesh of b_obj
+        :type b_mesh: class:`bpy.types.Mesh`
+        :param bone_names: Names of the vertex groups that correspond to bones, in the order of the matrix columns
+        :type bone_names: list(str)
+
+        :return: row pointers into the entries, bone index of every entry, weight of every entry and the indices of
+            the vertices that are not in any vertex group
+        :rtype: tuple(np.ndarray, np.ndarray, np.ndarray, list(int))
+        """
+        group_to_bone = np.full(len(b_obj.vertex_groups), -1, dtype=int)
+        for bone_index, bone_name in enumerate(bone_names):
+            group_to_bone[b_obj.vertex_groups[bone_name].index] = bone_index
+
+        n_verts = len(b_mesh.vertices)
+        group_counts = np.zeros(n_verts, dtype=int)
+        group_indices = []
+        group_weights = []
+        unweighted_vertices = []
+        for b_vert in b_mesh.vertices:
+            b_groups = b_vert.groups
+            if len(b_groups) == 0:  # check vert has weight_groups
+                unweighted_vertices.append(b_vert.index)
+                continue
+            group_counts[b_vert.index] = len(b_groups)
+            for g in b_groups:
+                group_indices.append(g.group)
+                group_weights.append(g.weight)
+
+        entry_verts = np.repeat(np.arange(n_verts, dtype=int), group_counts)
+        entry_bones = group_to_bone[np.array(group_indices, dtype=int)]
+        entry_weights = np.array(group_weights, dtype=float)
+        # only keep the groups that are bones
+        is_bone = entry_bones >= 0
+        entry_verts = entry_verts[is_bone]
+        entry_bones = entry_bones[is_bone]
+        entry_weights = entry_weights[is_bone]
+
+        # normalise, and drop the vertices that have no bone weight to normalise by
+        vert_norm = np.bincount(entry_verts, weights=entry_weights, minlength=n_verts)
+        is_normalised = vert_norm[entry_verts] != 0
+        entry_verts = entry_verts[is_normalised]
+        entry_bones = entry_bones[is_normalised]
+        entry_weights = entry_weights[is_normalised] / vert_norm[entry_verts]
+
+        # entries are already sorted by vertex, so only the row pointers are left to build
+        weight_rows = np.zeros(n_verts + 1, dtype=int)
+        weight_rows[1:] = np.cumsum(np.bincount(entry_verts, minlength=n_verts))
+        return weight_rows, entry_bones, entry_weights, unweighted_vertices
+
     def export_skin_partition(self, b_obj, n_face_groups, face_group_names, triangles, n_ni_geometry):
         """
         Attaches a skin partition to n_geom if needed.
@@ -197,7 +238,8 @@ class SkinnedGeometry:
                           face_group_names.keys() if body_part_name in NifClasses.BSDismemberBodyPartType.__members__]
 
             # Update skin partition
-            lostweight = n_ni_geometry.update_skin_partition(
+            lostweight = update_skin_partition(
+                n_ni_geometry,
                 maxbonesperpartition=NifOp.props.max_bones_per_partition,
                 maxbonespervertex=NifOp.props.max_bones_per_vertex,
                 stripify=NifOp.props.stripify,
@@ -38,26 +38,37 @@
 # ***** END LICENSE BLOCK *****
 import bpy
 import math as python_math
+
+import numpy as np
+
 from ....utils.consts import QUAT, EULER, LOC, SCALE
 from ....utils.logging import NifLog
 from nifgen.formats.nif import classes as NifClasses
 
 
 _ACTIONS = {}
+_ACTIONS_BY_POINTER = {}
 _ACTION_OWNERS = {}
 _ACTION_SLOTS = {}
+_STASHED_SLOTS = {}
 _FPS = 30
 _MAX_KEY_TIME = 0
 _DEFAULT_SEQUENCE = None
 
+# values of Blender's keyframe interpolation and handle type enums, for writing them with foreach_set
+KEYFRAME_INTERPOLATIONS = {"CONSTANT": 0, "LINEAR": 1, "BEZIER": 2}
+KEYFRAME_HANDLE_TYPES = {"FREE": 0, "AUTO": 1, "VECTOR": 2, "ALIGNED": 3, "AUTO_CLAMPED": 4}
+
 
 def clear():
     """Reset animation state shared by all controller import helpers for one NIF."""
 
     global _FPS, _MAX_KEY_TIME, _DEFAULT_SEQUENCE
     _ACTIONS.clear()
+    _ACTIONS_BY_POINTER.clear()
     _ACTION_OWNERS.clear()
     _ACTION_SLOTS.clear()
+    _STASHED_SLOTS.clear()
     _FPS = 30
     _MAX_KEY_TIME = 0
     _DEFAULT_SEQUENCE = None
@@ -72,8 +83,12 @@ class Animation:
         # to prevent overwriting existing animations from older imports
         # and still be able to access existing actions from this run
         self.actions = _ACTIONS
+        # the same actions, by pointer, as the action slots refer to them
+        self.actions_by_pointer = _ACTIONS_BY_POINTER
         self.action_owners = _ACTION_OWNERS
         self.action_slots = _ACTION_SLOTS
+        # the (action pointer, slot handle) pairs of every owner already stashed in an NLA track
+        self.stashed_slots = _STASHED_SLOTS
 
     @property
     def fps(self):
@@ -220,6 +235,7 @@ class Animation:
             b_action = bpy.data.actions.new(sequence_name or action_name)
             b_action.use_fake_user = True
             self.actions[action_key] = b_action
+            self.actions_by_pointer[b_action.as_pointer()] = b_action
 
         if sequence_name:
             b_action.nifanimation.sequence_name = sequence_name
@@ -288,11 +304,7 @@ class Animation:
         """Put every non-default sequence action in a muted NLA track."""
 
         for (action_pointer, owner_pointer), b_slot in self.action_slots.items():
-            b_action = next(
-                (action for action in self.actions.values()
-                 if action.as_pointer() == action_pointer),
-                None,
-            )
+            b_action = self.actions_by_pointer.get(action_pointer)
             if b_action is None or b_action.is_empty:
                 continue
             sequence_name = b_action.nifanimation.sequence_name
@@ -302,15 +314,17 @@ class Animation:
             b_owner = self.action_owners.get(owner_pointer)
             if b_owner is None:
                 continue
-            if not b_owner.animation_data:
-                b_owner.animation_data_create()
-            b_anim_data = b_owner.animation_data
 
             # Finalization can safely be called more than once without adding another
             # strip for the same action.
-            if any(strip.action == b_action and strip.action_slot == b_slot
-                   for track in b_anim_data.nla_tracks for strip in track.strips):
+            stashed_slots = self.stashed_slots.setdefault(owner_pointer, set())
+            if (action_pointer, b_slot.handle) in stashed_slots:
                 continue
+            stashed_slots.add((action_pointer, b_slot.handle))
+
+            if not b_owner.animation_data:
+                b_owner.animation_data_create()
+            b_anim_data = b_owner.animation_data
 
             frame_start, frame_end = b_action.frame_range
             b_track = b_anim_data.nla_tracks.new()
@@ -325,12 +339,13 @@ class Animation:
     def finalize(self):
         """Finish sequence storage and choose the default preview range."""
 
-        from ....modules.nif_import.animation.object import update_bone_visibility
+        from ....modules.nif_import.animation.object import invalidate_bone_visibility, update_bone_visibility
 
         self.stash_inactive_sequences()
         self.update_active_action_range()
         # objects attached to a bone are only synced to it when the frame changes,
         # so give them the visibility of the frame the import ends on
+        invalidate_bone_visibility()
         update_bone_visibility()
 
     def create_fcurves(self, obj, action, dtype, drange, flags, bone_name, key_name):
@@ -415,6 +430,126 @@ class Animation:
             for fcurve in fcurves:
                 fcurve.extrapolation = 'CONSTANT'
 
+    @staticmethod
+    def get_bezier_handles(samples, values, forward, backward):
+        """Convert the Hermite tangents of quadratic NIF keys to Bézier handle positions.
+
+        NifSkope's quadratic evaluator uses the current key's backward tangent as the
+        outgoing Hermite tangent and the next key's forward tangent as the incoming one.
+        Hermite-to-Bézier conversion divides both by three.
+
+        :return: left and right handles, each of shape (len(samples), 2)
+        :rtype: tuple(np.ndarray, np.ndarray)
+        """
+
+        samples = np.asarray(samples, dtype=float)
+        values = np.asarray(values, dtype=float)
+        previous_samples = np.concatenate((samples[:1], samples[:-1]))
+        next_samples = np.concatenate((samples[1:], samples[-1:]))
+        handle_left = np.column_stack((
+            samples - (samples - previous_samples) / 3,
+            values - np.asarray(forward, dtype=float) / 3))
+        handle_right = np.column_stack((
+            samples + (next_samples - samples) / 3,
+            values + np.asarray(backward, dtype=float) / 3))
+        return handle_left, handle_right
+
+    @staticmethod
+    def add_fcurve_keys_bulk(fcurve, samples, values, interp, tangents):
+        """Add keys to an fcurve with one foreach_set per keyframe property.
+
+        Only possible when the samples are strictly increasing and none of them is
+        already keyed on the fcurve. The keys already on the fcurve are read back
+        and written out again along with the new ones.
+
+        :return: whether the keys were added
+        :rtype: bool
+        """
+
+        samples = np.asarray(samples, dtype=float)
+        points = fcurve.keyframe_points
+        n_old = len(points)
+        old_co = np.empty(2 * n_old, dtype=np.float32)
+        points.foreach_get("co", old_co)
+        if np.any(np.diff(samples) <= 0) or np.isin(samples, old_co[0::2]).any():
+            return False
+
+        co = np.column_stack((samples, values))
+        if tangents:
+            handle_left, handle_right = Animation.get_bezier_handles(samples, values, *tangents)
+            handle_type = KEYFRAME_HANDLE_TYPES["FREE"]
+        else:
+            # fcurve.update() recalculates the automatic handles of the new keys
+            handle_left = handle_right = co
+            handle_type = KEYFRAME_HANDLE_TYPES["AUTO_CLAMPED"]
+        n_new = len(samples)
+        arrays = {
+            "co": co,
+            "handle_left": handle_left,
+            "handle_right": handle_right,
+        }
+        enums = {
+            "interpolation": [KEYFRAME_INTERPOLATIONS[interp]] * n_new,
+            "handle_left_type": [handle_type] * n_new,
+            "handle_right_type": [handle_type] * n_new,
+        }
+        if n_old:
+            arrays["co"] = np.concatenate((old_co.reshape((-1, 2)), co))
+            for name in ("handle_left", "handle_right"):
+                old_values = np.empty(2 * n_old, dtype=np.float32)
+                points.foreach_get(name, old_values)
+                arrays[name] = np.concatenate((old_values.reshape((-1, 2)), arrays[name]))
+            for name in enums:
+                # enums are stored as chars, so they go through plain python lists
+                old_values = [0] * n_old
+                points.foreach_get(name, old_values)
+                enums[name] = old_values + enums[name]
+
+        points.add(count=n_new)
+        for name, values in arrays.items():
+            points.foreach_set(name, np.ascontiguousarray(values, dtype=np.float32).ravel())
+        for name, values in enums.items():
+            points.foreach_set(name, values)
+        fcurve.update()
+        return True
+
+    @staticmethod
+    def merge_fcurve_keys(fcurve, samples, values, interp, tangents):
+        """Add keys to an fcurve, replacing the keys already on any of their frames."""
+
+        values = list(values)
+        points_by_frame = {point.co[0]: point for point in fcurve.keyframe_points}
+        new_keys = []
+        for sample, value in zip(samples, values):
+            point = points_by_frame.get(sample)
+            if point is None:
+                new_keys.append((sample, value))
+            else:
+                # A reused action may legitimately encounter the same channel again.
+                # Replace that frame instead of appending a duplicate key.
+                point.co = (sample, value)
+                point.interpolation = interp
+
+        first_new_index = len(fcurve.keyframe_points)
+        fcurve.keyframe_points.add(count=len(new_keys))
+        for index, (sample, value) in enumerate(new_keys, first_new_index):
+            point = fcurve.keyframe_points[index]
+            point.co = (sample, value)
+            point.interpolation = interp
+        # update
+        fcurve.update()
+        if tangents:
+            handle_left, handle_right = Animation.get_bezier_handles(samples, values, *tangents)
+            points_by_frame = {
+                point.co[0]: point for point in fcurve.keyframe_points}
+            for key_index, sample in enumerate(samples):
+                point = points_by_frame[sample]
+                point.handle_left_type = "FREE"
+                point.handle_right_type = "FREE"
+                point.handle_left = handle_left[key_index]
+                point.handle_right = handle_right[key_index]
+            fcurve.update()
+
     def add_keys(self, b_obj, b_action, key_type, key_range, flags, times, keys,
                  interp, bone_name=None, key_name=None, tangents=None):
         """
@@ -443,55 +578,10 @@ class Animation:
                     tangent_per_fcurve = [None] * len(fcurves)
             for fcurve, fcu_keys, fcu_tangents in zip(
                     fcurves, key_per_fcurve, tangent_per_fcurve):
-                fcu_keys = list(fcu_keys)
-                points_by_frame = {point.co[0]: point for point in fcurve.keyframe_points}
-                new_keys = []
-                for sample, value in zip(samples, fcu_keys):
-                    point = points_by_frame.get(sample)
-                    if point is None:
-                        new_keys.append((sample, value))
-                    else:
-                        # A reused action may legitimately encounter the same channel again.
-                        # Replace that frame instead of appending a duplicate key.
-                        point.co = (sample, value)
-                        point.interpolation = interp
-
-                first_new_index = len(fcurve.keyframe_points)
-                fcurve.keyframe_points.add(count=len(new_keys))
-                for index, (sample, value) in enumerate(new_keys, first_new_index):
-                    point = fcurve.keyframe_points[index]
-                    point.co = (sample, value)
-                    point.interpolation = interp
-                # update
-                fcurve.update()
-                if fcu_tangents:
-                    forward, backward = (list(values) for values in fcu_tangents)
-                    points_by_frame = {
-                        point.co[0]: point for point in fcurve.keyframe_points}
-                    for key_index, (sample, value) in enumerate(zip(samples, fcu_keys)):
-                        point = points_by_frame[sample]
-                        point.handle_left_type = "FREE"
-                        point.handle_right_type = "FREE"
-
-                        previous_sample = (
-                            samples[key_index - 1] if key_index else sample)
-                        next_sample = (
-                            samples[key_index + 1]
-                            if key_index + 1 < len(samples) else sample)
-
-                        # NifSkope's quadratic evaluator uses:
-                        #   current.backward as the outgoing Hermite tangent
-                        #   next.forward as the incoming Hermite tangent.
-                        # Hermite-to-Bézier conversion divides both by three.
-                        point.handle_left = (
-                            sample - (sample - previous_sample) / 3,
-                            value - forward[key_index] / 3,
-                        )
-                        point.handle_right = (
-                            sample + (next_sample - sample) / 3,
-                            value + backward[key_index] / 3,
-                        )
-                    fcurve.update()
+                fcu_keys = np.asarray(list(fcu_keys), dtype=float)
+                # the keys only need merging into the fcurve when they collide with keys already on it
+                if not self.add_fcurve_keys_bulk(fcurve, samples, fcu_keys, interp, fcu_tangents):
+                    self.merge_fcurve_keys(fcurve, samples, fcu_keys.tolist(), interp, fcu_tangents)
                 # Update max_key_time
                 self.max_key_time = max(self.max_key_time, max(times))
         except RuntimeError as error:
@@ -38,6 +38,7 @@
 # ***** END LICENSE BLOCK *****
 
 import re
+import time
 
 import bpy
 
@@ -85,23 +86,39 @@ def hide_animated_bones(b_armature):
     return b_bone_names
 
 
-def update_bone_visibility():
+# The names of the objects attached to a bone whose visibility is animated, mapped to the names of
+# their armature and bone, built by get_bone_visibility_map and dropped by invalidate_bone_visibility.
+# Names rather than references are kept, as undo and file loads replace the datablocks.
+_BONE_VISIBILITY_MAP = None
+
+# Cost of the frame change handler, for profiling playback: calls of update_bone_visibility,
+# rebuilds of the map among them, objects visited and the total time taken in seconds
+BONE_VISIBILITY_STATS = {"calls": 0, "rebuilds": 0, "objects": 0, "seconds": 0.0}
+
+
+def get_bone_visibility_map():
     """
-    Hide the objects attached to a bone along with the bone itself.
+    The names of the objects attached to a bone that any action of its armature hides, mapped to the
+    names of the armature and the bone.
 
-    A nif node that a visibility controller hides takes its geometry with it, but a
-    Blender bone and the objects parented to it are hidden separately. Parenting is read
-    fresh on every call, so relationship changes are reflected.
+    Parenting and actions are scanned when the map was dropped by invalidate_bone_visibility, so
+    a skeleton and the meshes attached to it can be imported in any order and still animate together.
     """
 
+    global _BONE_VISIBILITY_MAP
+    if _BONE_VISIBILITY_MAP is not None:
+        return _BONE_VISIBILITY_MAP
+
+    BONE_VISIBILITY_STATS["rebuilds"] += 1
     b_hidden_bones = {}
     for b_armature in bpy.data.armatures:
         b_bone_names = hide_animated_bones(b_armature)
         if b_bone_names:
             b_hidden_bones[b_armature] = b_bone_names
 
+    _BONE_VISIBILITY_MAP = {}
     if not b_hidden_bones:
-        return
+        return _BONE_VISIBILITY_MAP
 
     for b_obj in bpy.data.objects:
         if b_obj.parent_type != 'BONE' or not b_obj.parent_bone:
@@ -111,9 +128,82 @@ def update_bone_visibility():
         if b_obj.parent_bone not in b_hidden_bones.get(b_armature, ()):
             continue
 
-        b_bone = b_armature.bones.get(b_obj.parent_bone)
-        if b_bone is not None and b_obj.hide_viewport != b_bone.hide:
+        if b_obj.parent_bone in b_armature.bones:
+            _BONE_VISIBILITY_MAP[b_obj.name] = (b_armature.name, b_obj.parent_bone)
+    return _BONE_VISIBILITY_MAP
+
+
+def invalidate_bone_visibility():
+    """Drop the map of get_bone_visibility_map, to be rebuilt on the next update."""
+
+    global _BONE_VISIBILITY_MAP
+    _BONE_VISIBILITY_MAP = None
+
+
+def bone_visibility_changed(depsgraph):
+    """
+    Whether a depsgraph update can change the map of get_bone_visibility_map.
+
+    Actions and armatures change which bones are animated. Objects only matter when they
+    are attached to a different bone than the map has them on, as every visibility the map
+    changes updates its object as well.
+    """
+
+    if _BONE_VISIBILITY_MAP is None:
+        return False
+    for update in depsgraph.updates:
+        b_id = update.id.original
+        if isinstance(b_id, (bpy.types.Action, bpy.types.Armature)):
+            return True
+        if not isinstance(b_id, bpy.types.Object):
+            continue
+        b_names = _BONE_VISIBILITY_MAP.get(b_id.name)
+        if b_names is None:
+            if b_id.parent_type == 'BONE':
+                return True
+        elif (b_id.parent_type != 'BONE' or b_id.parent_bone != b_names[1]
+              or b_id.parent is None or b_id.parent.type != 'ARMATURE' or b_id.parent.data.name != b_names[0]):
+            return True
+    return False
+
+
+def apply_bone_visibility(b_bone_visibility_map):
+    """Hide the objects of a bone visibility map along with their bones, or return False if one is missing."""
+
+    b_objects, b_armatures = bpy.data.objects, bpy.data.armatures
+    for b_obj_name, (b_armature_name, b_bone_name) in b_bone_visibility_map.items():
+        b_obj = b_objects.get(b_obj_name)
+        b_armature = b_armatures.get(b_armature_name)
+        b_bone = b_armature.bones.get(b_bone_name) if b_armature is not None else None
+        if b_obj is None or b_bone is None:
+            return False
+        if b_obj.hide_viewport != b_bone.hide:
             b_obj.hide_viewport = b_bone.hide
+    return True
+
+
+def update_bone_visibility():
+    """
+    Hide the objects attached to a bone along with the bone itself.
+
+    A nif node that a visibility controller hides takes its geometry with it, but a
+    Blender bone and the objects parented to it are hidden separately. Only the objects
+    of get_bone_visibility_map are visited, looked up by name in bpy.data.
+    """
+
+    start = time.perf_counter()
+    BONE_VISIBILITY_STATS["calls"] += 1
+    try:
+        # a map built from the current data resolves, so it is rebuilt at most once
+        for _attempt in range(2):
+            b_bone_visibility_map = get_bone_visibility_map()
+            if apply_bone_visibility(b_bone_visibility_map):
+                break
+            # an object, armature or bone of the map was removed or renamed
+            invalidate_bone_visibility()
+        BONE_VISIBILITY_STATS["objects"] += len(b_bone_visibility_map)
+    finally:
+        BONE_VISIBILITY_STATS["seconds"] += time.perf_counter() - start
 
 
 class ObjectAnimation(Animation):
@@ -1,6 +1,7 @@
 """Import sequence-driven particle controller channels."""
 
 from ....modules.nif_import.animation import Animation
+from ....modules.nif_import.object.block_registry import block_store
 from ....utils.logging import NifLog
 from nifgen.formats.nif import classes as NifClasses
 
@@ -10,13 +11,11 @@ class ParticleAnimation(Animation):
 
     @staticmethod
     def find_settings(target_name):
-        # Imported particle systems are registered by their original NIF block,
+        # Imported particle systems are registered by their original NIF block name,
         # which avoids ambiguity if Blender had to suffix an object name.
-        from ....modules.nif_import.particle import DICT_PARTICLE_SYSTEMS
-
-        for n_system, b_obj in DICT_PARTICLE_SYSTEMS.items():
-            if str(n_system.name) == target_name and b_obj.particle_systems:
-                return b_obj.particle_systems[0].settings
+        b_obj = block_store.find_particle_system(target_name)
+        if b_obj and b_obj.particle_systems:
+            return b_obj.particle_systems[0].settings
         return None
 
     def import_sequence_controlled_block(self, controlled, sequence):
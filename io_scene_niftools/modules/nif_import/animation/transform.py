@@ -40,57 +40,60 @@
 from bisect import bisect_left
 from functools import singledispatch
 
+import numpy as np
+
 import bpy
 import mathutils
 from ....modules.nif_import.animation import Animation
 from ....modules.nif_import.object import block_registry
 from ....utils import math
+from ....utils.arrays import as_struct_array, get_struct_fields
+from ....utils.bspline import BSPLINE_DEGREE, bspline_frame_times, bspline_parameters, bspline_weights, \
+    evaluate_bspline
 from ....utils.consts import QUAT, EULER, LOC, SCALE
 from ....utils.logging import NifLog
 from nifgen.formats.nif import classes as NifClasses
 
 
-def as_b_quat(n_val):
-    return mathutils.Quaternion([n_val.w, n_val.x, n_val.y, n_val.z])
+def as_b_quat(n_vals):
+    return get_struct_fields(n_vals, ("w", "x", "y", "z"))
 
 
-def as_b_loc(n_val):
-    return mathutils.Vector([n_val.x, n_val.y, n_val.z])
+def as_b_loc(n_vals):
+    return get_struct_fields(n_vals, ("x", "y", "z"))
 
 
-def as_b_scale(n_val):
-    return n_val, n_val, n_val
+def as_b_scale(n_vals):
+    return np.repeat(np.asarray(n_vals, dtype=float).reshape((-1, 1)), 3, axis=1)
 
 
-def as_b_euler(n_val):
-    return mathutils.Euler(n_val)
+def as_b_euler(n_vals):
+    return np.asarray(n_vals, dtype=float).reshape((-1, 3))
 
 
-def correct_loc(key, n_bind_rot_inv, n_bind_trans):
-    return math.import_keymat(n_bind_rot_inv, mathutils.Matrix.Translation(key - n_bind_trans)).to_translation()
+def correct_loc(keys, keymat_parts, n_bind_trans):
+    return math.keymat_translations(keymat_parts, keys - np.array(n_bind_trans))
 
 
-def correct_loc_tangent(key, n_bind_rot_inv, n_bind_trans):
-    """Rotate a translation tangent without applying the bind translation."""
+def correct_loc_tangent(keys, keymat_parts, n_bind_trans):
+    """Rotate translation tangents without applying the bind translation."""
 
-    return math.import_keymat(
-        n_bind_rot_inv,
-        mathutils.Matrix.Translation(key),
-    ).to_translation()
+    return math.keymat_translations(keymat_parts, keys)
 
 
-def correct_quat(key, n_bind_rot_inv, n_bind_trans):
-    return math.import_keymat(n_bind_rot_inv, key.to_matrix().to_4x4()).to_quaternion()
+def correct_quat(keys, keymat_parts, n_bind_trans):
+    return math.keymat_quaternions(keymat_parts, keys)
 
 
-def correct_euler(key, n_bind_rot_inv, n_bind_trans):
-    return math.import_keymat(n_bind_rot_inv, key.to_matrix().to_4x4()).to_euler()
+def correct_euler(keys, keymat_parts, n_bind_trans):
+    return math.keymat_eulers(keymat_parts, keys)
 
 
-def correct_scale(key, n_bind_rot_inv, n_bind_trans):
-    return key
+def correct_scale(keys, keymat_parts, n_bind_trans):
+    return keys
 
 
+# every function converts or corrects a whole array of keys at once
 key_lut = {
     QUAT: (as_b_quat, correct_quat, None, 4),
     EULER: (as_b_euler, correct_euler, None, 3),
@@ -99,6 +102,34 @@ key_lut = {
 }
 
 
+def sample_bspline_interpolator(n_kfi, fps):
+    """
+    Sample the transform channels of a B-spline interpolator at every frame from its start to its stop time.
+
+    The control points only shape the curve and are not passed through, so the curve is evaluated with the
+    engine's basis, see bspline_weights.
+
+    :return: the times, and the translations, unit quaternions and scales at them, of shape (n, 3), (n, 4) and (n,),
+        where channels without control points are empty
+    """
+    num_points = n_kfi.basis_data.num_control_points
+    times = bspline_frame_times(n_kfi.start_time, n_kfi.stop_time, fps)
+    parameters = bspline_parameters(times, n_kfi.start_time, n_kfi.stop_time, num_points)
+    firsts, weights = bspline_weights(parameters, num_points)
+    samples = []
+    for points, size in ((n_kfi.get_translations(), 3), (n_kfi.get_rotations(), 4), (n_kfi.get_scales(), 1)):
+        points = np.array(list(points), dtype=float).reshape((-1, size))
+        if len(points) == num_points:
+            samples.append(evaluate_bspline(firsts, weights, points))
+        else:
+            samples.append(np.zeros((0, size)))
+    translations, rotations, scales = samples
+    # the engine normalizes the interpolated quaternions
+    norms = np.linalg.norm(rotations, axis=1, keepdims=True)
+    rotations = rotations / np.where(norms > 0, norms, 1.0)
+    return times, translations, rotations, scales[:, 0]
+
+
 def interpolate(x_out, x_in, y_in):
     """
     sample (x_in I y_in) at x coordinates x_out
@@ -127,6 +158,9 @@ class TransformAnimation(Animation):
         self.material_anim = MaterialAnimation()
         self.object_anim = ObjectAnimation()
         self.particle_anim = ParticleAnimation()
+        self.bind_data = {}
+        # the bind matrices of every bone combined with the axis correction, see get_import_keymat_parts
+        self.keymat_parts = {}
         self.import_kf_root = singledispatch(self.import_kf_root)
         self.import_kf_root.register(NifClasses.NiControllerSequence, self.import_controller_sequence)
         self.import_kf_root.register(NifClasses.NiSequenceStreamHelper, self.import_sequence_stream_helper)
@@ -135,6 +169,7 @@ class TransformAnimation(Animation):
     def get_bind_data(self, b_armature):
         """Get the required bind data of an armature. Used by standalone KF import and export. """
         self.bind_data = {}
+        self.keymat_parts = {}
         if b_armature:
             for b_bone in b_armature.data.bones:
                 n_bind_scale, n_bind_rot, n_bind_trans = math.decompose_srt(math.get_object_bind(b_bone))
@@ -148,11 +183,7 @@ class TransformAnimation(Animation):
             return b_armature_obj.pose.bones[b_name]
         # a sequence of a skinned nif also drives plain objects, such as its meshes,
         # so fall back to the objects even when there is an armature
-        if b_name in bpy.data.objects:
-            return bpy.data.objects[b_name]
-        # objects only carry their nif name separately when Blender had to rename them
-        return next((b_obj for b_obj in bpy.data.objects
-                     if getattr(b_obj.nif_object, "longname", "") == b_name), None)
+        return block_registry.block_store.find_object(b_name)
 
     def import_kf_root(self, kf_root, b_armature_obj):
         """Base method to warn user that this root type is not supported"""
@@ -308,8 +339,6 @@ class TransformAnimation(Animation):
 
         # B-spline curve import
         if isinstance(n_kfc, NifClasses.NiBSplineInterpolator):
-            # Bsplines are Bezier curves
-            interp = "BEZIER"
             if isinstance(n_kfc, NifClasses.NiBSplineCompFloatInterpolator):
                 # used by WLP2 (tiger.kf), but only for non-LocRotScale data
                 # eg. bone stretching - see controlledblock.get_variable_1()
@@ -317,13 +346,17 @@ class TransformAnimation(Animation):
                 # pyffi lacks support for this, but the following gets float keys
                 # keys = list(kfc._getCompKeys(kfc.offset, 1, kfc.bias, kfc.multiplier))
                 return
-            times = list(n_kfc.get_times())
-            keys = [NifClasses.Vector3.from_value(tuple_key) for tuple_key in n_kfc.get_translations()]
+            if not n_kfc.basis_data or n_kfc.basis_data.num_control_points <= BSPLINE_DEGREE:
+                # skip bsplines without basis data (eg bowidle.kf in Oblivion)
+                return b_action
+            # the spline is sampled at every frame, which linear keys then follow exactly
+            interp = "LINEAR"
+            times, translations, rotations, scales = sample_bspline_interpolator(n_kfc, self.fps)
+            keys = as_struct_array(translations, ("x", "y", "z"))
             self.import_keys(LOC, b_anim_owner, b_action, bone_name, times, keys, flags, interp, n_bind_rot_inv, n_bind_trans)
-            keys = [NifClasses.Quaternion.from_value(tuple_key) for tuple_key in n_kfc.get_rotations()]
+            keys = as_struct_array(rotations, ("w", "x", "y", "z"))
             self.import_keys(QUAT, b_anim_owner, b_action, bone_name, times, keys, flags, interp, n_bind_rot_inv, n_bind_trans)
-            keys = list(n_kfc.get_scales())
-            self.import_keys(SCALE, b_anim_owner, b_action, bone_name, times, keys, flags, interp, n_bind_rot_inv, n_bind_trans)
+            self.import_keys(SCALE, b_anim_owner, b_action, bone_name, times, scales, flags, interp, n_bind_rot_inv, n_bind_trans)
             return b_action
         elif isinstance(n_kfc, NifClasses.NiMultiTargetTransformController):
             # not sure what this is used for
@@ -564,31 +597,30 @@ class TransformAnimation(Animation):
     def import_keys(self, key_type, b_obj, b_action, bone_name, times, keys,
                     flags, interp, n_bind_rot_inv, n_bind_trans, tangents=None):
         """Imports key frames according to the specified key_type"""
-        if not keys:
+        if not isinstance(keys, np.ndarray):
+            keys = list(keys)
+        if not len(keys):
             return
         # look up conventions by key type
         key_func, key_corrector, tangent_corrector, key_dim = key_lut[key_type]
         NifLog.debug(f'{key_type} keys...')
         # convert nif keys to proper key type for blender
-        keys = [key_func(val) for val in keys]
+        keys = key_func(keys)
         if tangents:
             forward, backward = tangents
-            tangents = (
-                [key_func(value) for value in forward],
-                [key_func(value) for value in backward],
-            )
+            tangents = (key_func(forward), key_func(backward))
         # correct for bone space if target is an armature bone
         if bone_name:
-            keys = [key_corrector(key, n_bind_rot_inv, n_bind_trans) for key in keys]
+            # the bind matrices combined with the axis correction, once per bone
+            if bone_name not in self.keymat_parts:
+                self.keymat_parts[bone_name] = math.get_import_keymat_parts(n_bind_rot_inv)
+            keymat_parts = self.keymat_parts[bone_name]
+            keys = key_corrector(keys, keymat_parts, n_bind_trans)
             if tangents and tangent_corrector:
                 forward, backward = tangents
                 tangents = (
-                    [tangent_corrector(
-                        value, n_bind_rot_inv, n_bind_trans)
-                     for value in forward],
-                    [tangent_corrector(
-                        value, n_bind_rot_inv, n_bind_trans)
-                     for value in backward],
+                    tangent_corrector(forward, keymat_parts, n_bind_trans),
+                    tangent_corrector(backward, keymat_parts, n_bind_trans),
                 )
             elif tangents:
                 tangents = None
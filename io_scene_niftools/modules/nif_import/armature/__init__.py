@@ -48,6 +48,7 @@ from ....modules.nif_import.animation.transform import TransformAnimation
 from ....modules.nif_import.object import Object
 from ....modules.nif_import.object.block_registry import block_store, get_bone_name_for_blender
 from ....utils import math
+from ....utils.arrays import get_struct_fields, set_struct_fields
 from ....utils.logging import NifLog
 from ....utils.singleton import NifOp
 from nifgen.formats.nif import classes as NifClasses
@@ -62,6 +63,8 @@ class Armature:
         self.name_to_block = {}
         self.pose_store = {}
         self.bind_store = {}
+        # skin data whose bind pose is already in the bind store, with the transform of the geometry it came from
+        self.stored_skins = set()
         self.skinned = False
         self.n_armature = None
 
@@ -85,8 +88,12 @@ class Armature:
             if n_block.is_skin():
                 yield n_block
 
-    def get_skin_bind(self, inv_bind, geom, n_root):
-        """Get armature space bind matrix for skin partition bone's inverse bind matrix"""
+    def get_skin_bind(self, inv_bind, geom_transform):
+        """Get armature space bind matrix for skin partition bone's inverse bind matrix
+
+        :param inv_bind: the bone's inverse bind matrix
+        :param geom_transform: the armature space transform of the geometry that the skin belongs to
+        """
         # get the bind pose from the skin data
         # NiSkinData stores the inverse bind (=rest) pose for each bone, in armature space
 
@@ -94,7 +101,7 @@ class Armature:
         # this gives a straight rest pose for MW too
         # return n_bone.get_transform().get_inverse(fast=False) * geom.skin_instance.data.get_transform().get_inverse(fast=False)
         # however, this conflicts with send_geometries_to_bind_position for MW meshes, so stick to this now
-        return inv_bind.get_inverse(fast=False) * geom.get_transform(n_root)
+        return inv_bind.get_inverse(fast=False) * geom_transform
 
     def bones_iter(self, skin_instance):
         # might want to make sure that bone_list includes no dupes too to avoid breaking the first mesh
@@ -114,11 +121,13 @@ class Armature:
         NifLog.debug(f"Found {len(geoms)} skinned geometries")
         for geom in geoms:
             NifLog.debug(f"Checking skin of {geom.name}")
+            # the same for all bones of this geometry
+            geom_transform = geom.get_transform(n_armature)
             if isinstance(geom, NifClasses.NiMesh):
                 # bones have no names and are not associated with any NiNodes
                 for i, bone_transform in enumerate(geom.extra_em_data.bone_transforms):
                     # Use transpose because the matrices are stored transposed to usual format.
-                    self.bind_store[i] = self.get_skin_bind(bone_transform.get_transpose(), geom, n_armature)
+                    self.bind_store[i] = self.get_skin_bind(bone_transform.get_transpose(), geom_transform)
             else:
                 skininst = geom.skin_instance
                 for bonenode, bonedata in self.bones_iter(skininst):
@@ -129,7 +138,7 @@ class Armature:
                         diff = (bonedata.get_transform()
                                 * self.bind_store[bonenode]
                                 # * geom.skin_instance.data.get_transform())  use this if relative to skin instead of geom
-                                * geom.get_transform(n_armature).get_inverse(fast=False))
+                                * geom_transform.get_inverse(fast=False))
                         # there is a difference between the two geometries' bind poses
                         if not diff.is_identity():
                             NifLog.debug(f"Fixing {geom.name} bind position")
@@ -137,42 +146,47 @@ class Armature:
                             for bonenode, bonedata in self.bones_iter(skininst):
                                 NifLog.debug(f"Transforming bind of {bonenode.name}")
                                 bonedata.set_transform(diff.get_inverse(fast=False) * bonedata.get_transform())
-                        # transforming verts helps with nifs where the skins differ, eg MW vampire or WLP2 Gastornis
-                        if isinstance(geom, NifClasses.BSTriShape):
-                            vertex_data = geom.get_vertex_data()
-                            if isinstance(geom, NifClasses.BSDynamicTriShape):
-                                vertices = geom.vertices
-                            else:
-                                vertices = [vert_data.vertex for vert_data in vertex_data]
-
-                            normals = [vert_data.normal for vert_data in vertex_data]
-                        else:
-                            vertices = geom.data.vertices
-                            normals = geom.data.normals
-                        # BSDynamicTriShape uses Vector4 to store vertices with a 0 W component, which would
-                        # nullify translation when multiplied by a Matrix44. Hence, first conversion to three-component
-                        # vector
-                        np_vertices = np.array(vertices, dtype=float)[:, :3]
-                        np_vertices = np.pad(np_vertices, (0, 1), constant_values=1.0)
-                        np_diff = np.array(diff.as_list())
-                        np_vertices = np_vertices @ np_diff
-                        np_normals = np.array(normals, dtype=float)
-                        np_diff33 = np.array(diff.get_matrix_33().as_list())
-                        np_normals = np_normals @ np_diff33
-                        # assign the transformed values back
-                        for vertex, t_vertex in zip(vertices, np_vertices[:, :3]):
-                            vertex.x, vertex.y, vertex.z = t_vertex
-                        for normal, t_normal in zip(normals, np_normals):
-                            normal.x, normal.y, normal.z = t_normal
+                            # transforming verts helps with nifs where the skins differ, eg MW vampire or WLP2 Gastornis
+                            self.transform_geometry(geom, diff)
                         break
-                # store bind pose
+                # store bind pose, unless a geometry that shares this skin data has already done so from the same place
+                skin_key = (skininst.data, tuple(map(tuple, geom_transform.as_list())))
+                if skin_key in self.stored_skins:
+                    NifLog.debug(f"Reusing bind position stored for {geom.name}'s skin data")
+                    continue
+                self.stored_skins.add(skin_key)
                 for bonenode, bonedata in self.bones_iter(skininst):
                     NifLog.debug(f"Stored {geom.name} bind position")
-                    self.bind_store[bonenode] = self.get_skin_bind(bonedata.get_transform(), geom, n_armature)
+                    self.bind_store[bonenode] = self.get_skin_bind(bonedata.get_transform(), geom_transform)
 
         NifLog.debug("Storing non-skeletal bone poses")
         self.fix_pose(n_armature, n_armature)
 
+    @staticmethod
+    def transform_geometry(geom, diff):
+        """Transform the vertices and normals of a geometry by a nif matrix, all at once"""
+        xyz = ("x", "y", "z")
+        if isinstance(geom, NifClasses.BSTriShape):
+            vertex_data = geom.get_vertex_data()
+            # BSDynamicTriShape uses Vector4 to store vertices with a 0 W component, which would
+            # nullify translation when multiplied by a Matrix44, so only their first three components are used
+            if isinstance(geom, NifClasses.BSDynamicTriShape):
+                vertex_arrays = [(geom.vertices, None)]
+            else:
+                vertex_arrays = [(vertex_data, "vertex")]
+            normal_arrays = [(vertex_data, "normal")]
+        else:
+            vertex_arrays = [(geom.data.vertices, None)]
+            normal_arrays = [(geom.data.normals, None)] if geom.data.has_normals else []
+        np_diff = np.array(diff.as_list(), dtype=float)
+        for n_array, member in vertex_arrays:
+            np_vertices = get_struct_fields(n_array, xyz, member)
+            np_vertices = np_vertices @ np_diff[:3, :3] + np_diff[3, :3]
+            set_struct_fields(n_array, np_vertices, xyz, member)
+        for n_array, member in normal_arrays:
+            np_normals = get_struct_fields(n_array, xyz, member)
+            set_struct_fields(n_array, np_normals @ np_diff[:3, :3], xyz, member)
+
     def fix_pose(self, n_node, n_root):
         """reposition non-skeletal bones to maintain their local orientation to their skeletal parents"""
         for n_child_node in n_node.children:
@@ -220,6 +234,7 @@ class Armature:
         # store the original pose & bind matrices for all nodes
         self.pose_store = {}
         self.bind_store = {}
+        self.stored_skins = set()
         self.store_pose_matrices(n_armature, n_armature)
         self.store_bind_matrices(n_armature)
 
@@ -41,7 +41,6 @@ import numpy as np
 
 import bpy
 import bmesh
-import mathutils
 
 from .....modules.nif_import.animation.morph import MorphAnimation
 from .....modules.nif_import.geometry.vertex import Vertex
@@ -178,9 +177,9 @@ class Mesh:
     def set_face_smooth(b_mesh, smooth):
         """Set face smoothing and material"""
 
-        for poly in b_mesh.polygons:
-            poly.use_smooth = smooth
-            poly.material_index = 0  # only one material
+        n_polys = len(b_mesh.polygons)
+        b_mesh.polygons.foreach_set("use_smooth", np.full(n_polys, smooth, dtype=bool))
+        b_mesh.polygons.foreach_set("material_index", np.zeros(n_polys, dtype=np.int32))  # only one material
 
     @staticmethod
     def weld_and_mark_sharp(
@@ -199,110 +198,107 @@ class Mesh:
         Custom split normals are removed after the operation as they are no longer needed.
         """
 
-        def _pos_key_from_vec(vec, decimals=6):
-            return (round(vec.x, decimals), round(vec.y, decimals), round(vec.z, decimals))
+        def _quantize(co, decimals=6):
+            # integer grid keys, so that coincident positions compare exactly
+            return np.round(co * 10.0 ** decimals).astype(np.int64)
 
-        def _edge_key_from_positions(pos_a, pos_b):
-            return (pos_a, pos_b) if pos_a <= pos_b else (pos_b, pos_a)
+        def _edge_rows(pos_a, pos_b):
+            # both end positions of every edge as one row, the smaller position first
+            first_diff = (pos_a != pos_b).argmax(axis=1)
+            rows = np.arange(len(pos_a))
+            swap = pos_a[rows, first_diff] > pos_b[rows, first_diff]
+            start = np.where(swap[:, None], pos_b, pos_a)
+            end = np.where(swap[:, None], pos_a, pos_b)
+            return np.hstack((start, end)), swap
 
         def _norm_aligned(n1, n2):
-            return n1.dot(n2) > normal_threshold
+            return (n1 * n2).sum(axis=1) > normal_threshold
 
-        if len(b_mesh.vertices) == 0 or len(b_mesh.polygons) == 0 or len(b_mesh.loops) == 0:
+        n_verts = len(b_mesh.vertices)
+        n_polys = len(b_mesh.polygons)
+        n_loops = len(b_mesh.loops)
+        if n_verts == 0 or n_polys == 0 or n_loops == 0:
             NifLog.debug(f"Skipping merge/sharp/seam: empty/degenerate mesh '{node_name}'")
             return
 
-        loop_normals = [ln.normal.copy() for ln in b_mesh.loops]
-
-        corner_normal_by_poly_vert = {}
-        for poly in b_mesh.polygons:
-            for li in poly.loop_indices:
-                v_idx = b_mesh.loops[li].vertex_index
-                corner_normal_by_poly_vert[(poly.index, v_idx)] = loop_normals[li]
-
-        vertices_co = [v.co.copy() for v in b_mesh.vertices]
-
-        edge_incidence = {}
-        for poly in b_mesh.polygons:
-            v_indices = list(poly.vertices)
-            if len(v_indices) < 2:
-                continue
-            for i in range(len(v_indices)):
-                vA_idx = v_indices[i]
-                vB_idx = v_indices[(i + 1) % len(v_indices)]
-
-                posA = _pos_key_from_vec(vertices_co[vA_idx])
-                posB = _pos_key_from_vec(vertices_co[vB_idx])
-                ekey = _edge_key_from_positions(posA, posB)
-
-                nA = corner_normal_by_poly_vert.get((poly.index, vA_idx))
-                nB = corner_normal_by_poly_vert.get((poly.index, vB_idx))
-                edge_incidence.setdefault(ekey, []).append((nA, nB))
-
-        sharp_edge_keys = set()
-        manifold_edges = 0
-        nonmanifold_edges = 0
-        boundary_geo_edges = 0
-
-        for ekey, entries in edge_incidence.items():
-            if len(entries) == 1:
-                boundary_geo_edges += 1
-                continue
-            if len(entries) != 2:
-                nonmanifold_edges += 1
-                continue
-
-            manifold_edges += 1
-            nA0, nB0 = entries[0]
-            nA1, nB1 = entries[1]
-            if nA0 is None or nB0 is None or nA1 is None or nB1 is None:
-                continue
-
-            direct = _norm_aligned(nA0, nA1) and _norm_aligned(nB0, nB1)
-            swapped = _norm_aligned(nA0, nB1) and _norm_aligned(nB0, nA1)
-            if not (direct or swapped):
-                sharp_edge_keys.add(ekey)
+        vertices_co = np.empty((n_verts, 3), dtype=float)
+        b_mesh.vertices.foreach_get("co", vertices_co.reshape(-1))
+        vertex_keys = _quantize(vertices_co)
+        loop_normals = np.empty((n_loops, 3), dtype=float)
+        b_mesh.loops.foreach_get("normal", loop_normals.reshape(-1))
+        loop_verts = np.empty(n_loops, dtype=int)
+        b_mesh.loops.foreach_get("vertex_index", loop_verts)
+        loop_edges = np.empty(n_loops, dtype=int)
+        b_mesh.loops.foreach_get("edge_index", loop_edges)
+        poly_starts = np.empty(n_polys, dtype=int)
+        b_mesh.polygons.foreach_get("loop_start", poly_starts)
+        poly_totals = np.empty(n_polys, dtype=int)
+        b_mesh.polygons.foreach_get("loop_total", poly_totals)
+        poly_normals = np.empty((n_polys, 3), dtype=float)
+        b_mesh.polygons.foreach_get("normal", poly_normals.reshape(-1))
+        edge_verts = np.empty((len(b_mesh.edges), 2), dtype=int)
+        b_mesh.edges.foreach_get("vertices", edge_verts.reshape(-1))
+
+        # every polygon side runs from a loop to the next loop of the same polygon
+        loop_polys = np.repeat(np.arange(n_polys), poly_totals)
+        loop_starts = poly_starts[loop_polys]
+        loop_totals = poly_totals[loop_polys]
+        side_a = np.flatnonzero(loop_totals >= 2)
+        side_b = loop_starts[side_a] + (side_a - loop_starts[side_a] + 1) % loop_totals[side_a]
+
+        # group the sides by the rounded positions of their ends
+        side_rows, swap = _edge_rows(vertex_keys[loop_verts[side_a]], vertex_keys[loop_verts[side_b]])
+        start_normals = np.where(swap[:, None], loop_normals[side_b], loop_normals[side_a])
+        end_normals = np.where(swap[:, None], loop_normals[side_a], loop_normals[side_b])
+        edge_rows, side_edges, edge_counts = np.unique(side_rows, axis=0, return_inverse=True, return_counts=True)
+        side_edges = side_edges.reshape(-1)
+
+        manifold_edges = int((edge_counts == 2).sum())
+        boundary_geo_edges = int((edge_counts == 1).sum())
+        nonmanifold_edges = int((edge_counts > 2).sum())
+
+        # an edge shared by two faces is sharp if the corner normals on either side disagree
+        side_order = np.argsort(side_edges, kind="stable")
+        edge_starts = np.cumsum(edge_counts) - edge_counts
+        manifold = np.flatnonzero(edge_counts == 2)
+        side_0 = side_order[edge_starts[manifold]]
+        side_1 = side_order[edge_starts[manifold] + 1]
+        direct = (_norm_aligned(start_normals[side_0], start_normals[side_1]) &
+                  _norm_aligned(end_normals[side_0], end_normals[side_1]))
+        swapped = (_norm_aligned(start_normals[side_0], end_normals[side_1]) &
+                   _norm_aligned(end_normals[side_0], start_normals[side_1]))
+        sharp_edge_rows = edge_rows[manifold[~(direct | swapped)]]
 
         NifLog.debug(
             f"Sharp inference for '{node_name}': manifold={manifold_edges}, boundary_geo={boundary_geo_edges}, "
-            f"nonmanifold={nonmanifold_edges}, sharp_keys={len(sharp_edge_keys)}"
+            f"nonmanifold={nonmanifold_edges}, sharp_keys={len(sharp_edge_rows)}"
         )
 
-        # One bmesh session does the whole job. Copying the mesh in and out for each
-        # of the three steps used to trebled the cost of every one of them.
-        bm = bmesh.new()
-        bm.from_mesh(b_mesh)
-        bm.verts.ensure_lookup_table()
-        bm.edges.ensure_lookup_table()
-        bm.faces.ensure_lookup_table()
-
-        initial_vert_count = len(bm.verts)
-
-        boundary_position_map = {}
-        for v in bm.verts:
-            if any(e.is_boundary for e in v.link_edges):
-                boundary_position_map.setdefault(_pos_key_from_vec(v.co), []).append(v)
-
-        mergeable_verts = []
-        buckets_skipped_opposite = 0
-
-        for verts in boundary_position_map.values():
-            if len(verts) < 2:
-                continue
-
-            # Avoid collapsing double-sided coplanar shells.
-            face_normals = [f.normal for v in verts for f in v.link_faces]
-            skip_bucket = any(
-                ni.dot(nj) < -normal_threshold
-                for i, ni in enumerate(face_normals)
-                for nj in face_normals[i + 1:]
-            )
-
-            if skip_bucket:
-                buckets_skipped_opposite += 1
-                continue
-
-            mergeable_verts.extend(verts)
+        # bucket the vertices on open edges by rounded position
+        edge_faces = np.bincount(loop_edges, minlength=len(edge_verts))
+        boundary_verts = np.unique(edge_verts[edge_faces == 1])
+        _, vert_buckets, bucket_sizes = np.unique(vertex_keys[boundary_verts], axis=0,
+                                                  return_inverse=True, return_counts=True)
+        vert_buckets = vert_buckets.reshape(-1)
+        bucket_of_vert = np.full(n_verts, -1, dtype=int)
+        bucket_of_vert[boundary_verts] = np.where(bucket_sizes[vert_buckets] >= 2, vert_buckets, -1)
+
+        # Avoid collapsing double-sided coplanar shells: a bucket is left alone if any two
+        # of the faces around its vertices point in opposite directions.
+        loop_buckets = bucket_of_vert[loop_verts]
+        in_bucket = loop_buckets >= 0
+        bucket_faces = np.unique(loop_buckets[in_bucket] * n_polys + loop_polys[in_bucket])
+        face_buckets = bucket_faces // n_polys
+        face_normals = poly_normals[bucket_faces % n_polys]
+        _, group_starts, group_sizes = np.unique(face_buckets, return_index=True, return_counts=True)
+        # pair every face with the faces after it in the same bucket
+        n_partners = np.repeat(group_starts + group_sizes, group_sizes) - np.arange(len(bucket_faces)) - 1
+        pair_i = np.repeat(np.arange(len(bucket_faces)), n_partners)
+        pair_j = pair_i + 1 + np.arange(len(pair_i)) - np.repeat(np.cumsum(n_partners) - n_partners, n_partners)
+        opposite = (face_normals[pair_i] * face_normals[pair_j]).sum(axis=1) < -normal_threshold
+        skipped_buckets = np.unique(face_buckets[pair_i[opposite]])
+        buckets_skipped_opposite = len(skipped_buckets)
+        mergeable = (bucket_of_vert >= 0) & ~np.isin(bucket_of_vert, skipped_buckets)
 
         # Merging every bucket in one operation rather than one at a time. Each
         # remove_doubles call costs time in proportion to the whole mesh, so running
@@ -313,12 +309,18 @@ class Mesh:
         # merge distance but on opposite sides of a rounding boundary land in
         # different buckets, and used to survive because of that alone. They are now
         # welded like any other coincident pair.
-        if mergeable_verts:
-            bmesh.ops.remove_doubles(bm, verts=mergeable_verts, dist=epsilon)
+        initial_vert_count = n_verts
+        if mergeable.any():
+            bm = bmesh.new()
+            bm.from_mesh(b_mesh)
             bm.verts.ensure_lookup_table()
-            bm.edges.ensure_lookup_table()
+            mergeable_verts = [bm.verts[v_idx] for v_idx in np.flatnonzero(mergeable).tolist()]
+            bmesh.ops.remove_doubles(bm, verts=mergeable_verts, dist=epsilon)
+            bm.to_mesh(b_mesh)
+            bm.free()
+            b_mesh.update()
 
-        final_vert_count = len(bm.verts)
+        final_vert_count = len(b_mesh.vertices)
 
         NifLog.debug(
             f"Merging done for '{node_name}': "
@@ -326,24 +328,39 @@ class Mesh:
             f"verts_after={final_vert_count}, merged_verts={initial_vert_count - final_vert_count}"
         )
 
-        sharp_applied_inferred = 0
-        boundary_cleared = 0
-        for e in bm.edges:
-            pos0 = _pos_key_from_vec(e.verts[0].co)
-            pos1 = _pos_key_from_vec(e.verts[1].co)
-            ekey = _edge_key_from_positions(pos0, pos1)
-
-            if ekey in sharp_edge_keys:
-                e.smooth = False
-                sharp_applied_inferred += 1
-            # leftover open edges are smoothed for clarity
-            if e.is_boundary and not e.smooth:
-                e.smooth = True
-                boundary_cleared += 1
-
-        bm.to_mesh(b_mesh)
-        bm.free()
-        b_mesh.update()
+        # look the welded edges up by the rounded positions of their ends
+        n_edges = len(b_mesh.edges)
+        vertices_co = np.empty((final_vert_count, 3), dtype=float)
+        b_mesh.vertices.foreach_get("co", vertices_co.reshape(-1))
+        vertex_keys = _quantize(vertices_co)
+        edge_verts = np.empty((n_edges, 2), dtype=int)
+        b_mesh.edges.foreach_get("vertices", edge_verts.reshape(-1))
+        loop_edges = np.empty(len(b_mesh.loops), dtype=int)
+        b_mesh.loops.foreach_get("edge_index", loop_edges)
+
+        inferred = np.zeros(n_edges, dtype=bool)
+        if len(sharp_edge_rows):
+            welded_rows, _ = _edge_rows(vertex_keys[edge_verts[:, 0]], vertex_keys[edge_verts[:, 1]])
+            _, row_ids = np.unique(np.vstack((sharp_edge_rows, welded_rows)), axis=0, return_inverse=True)
+            row_ids = row_ids.reshape(-1)
+            inferred = np.isin(row_ids[len(sharp_edge_rows):], row_ids[:len(sharp_edge_rows)])
+
+        sharp_attr = b_mesh.attributes.get("sharp_edge")
+        sharp = np.zeros(n_edges, dtype=bool)
+        if sharp_attr is not None:
+            sharp_attr.data.foreach_get("value", sharp)
+        sharp |= inferred
+        # leftover open edges are smoothed for clarity
+        boundary = np.bincount(loop_edges, minlength=n_edges) == 1
+        boundary_cleared = int((sharp & boundary).sum())
+        sharp &= ~boundary
+        sharp_applied_inferred = int(inferred.sum())
+
+        if sharp.any() or sharp_attr is not None:
+            if sharp_attr is None:
+                sharp_attr = b_mesh.attributes.new("sharp_edge", 'BOOLEAN', 'EDGE')
+            sharp_attr.data.foreach_set("value", sharp)
+            b_mesh.update()
 
         NifLog.debug(
             f"Sharps applied on '{node_name}': inferred={sharp_applied_inferred}, boundary_cleared={boundary_cleared}"
@@ -37,60 +37,56 @@
 #
 # ***** END LICENSE BLOCK *****
 
-import math
-
 import numpy as np
 
 import bpy
-import mathutils
+from .....utils.arrays import get_struct_fields
 from .....utils.singleton import NifOp
 
 
 class Vertex:
     @staticmethod
-    def normalize_vertex_color_component(component):
-        """Clamp a NIF vertex color component to the normalized range."""
-        return max(0.0, min(1.0, component))
+    def srgb_to_scene_linear(values):
+        """Decode sRGB values, the space the games store colours in, to scene linear."""
+        return np.where(values <= 0.04045,
+                        values / 12.92,
+                        np.power((values + 0.055) / 1.055, 2.4))
+
+    @staticmethod
+    def get_loop_vertices(b_mesh):
+        """The vertex index of every loop, so that per vertex data can be gathered per corner."""
+        loop_vertices = np.empty(len(b_mesh.loops), dtype=int)
+        b_mesh.loops.foreach_get("vertex_index", loop_vertices)
+        return loop_vertices
 
     @staticmethod
     def map_vertex_colors(b_mesh, vertex_colors):
         color_attr = b_mesh.color_attributes.new(name="Color", type="FLOAT_COLOR", domain="CORNER")
 
-        corner_colors = []
-        for poly in b_mesh.polygons:
-            for loop_index in poly.loop_indices:
-                vertex_index = b_mesh.loops[loop_index].vertex_index
-                corner_colors.append(vertex_colors[vertex_index])
-
+        colors = get_struct_fields(vertex_colors, ("r", "g", "b", "a"))
+        # clamp the components to the normalized range, reading NaN as 1
+        colors = np.clip(np.nan_to_num(colors, nan=1.0), 0.0, 1.0)
         # A float colour attribute holds scene linear values, but the games multiply their
         # vertex colours straight onto the texture in gamma space, so they are sRGB values.
         # Without converting them, the tint is far too weak and washed out.
-        flat_colors = []
-        for color in corner_colors:
-            b_color = mathutils.Color(tuple(
-                Vertex.normalize_vertex_color_component(component)
-                for component in (color.r, color.g, color.b)
-            ))
-            flat_colors.extend(b_color.from_srgb_to_scene_linear())
-            # alpha is a plain factor and is never gamma encoded
-            flat_colors.append(Vertex.normalize_vertex_color_component(color.a))
-        color_attr.data.foreach_set("color", flat_colors)
+        # Alpha is a plain factor and is never gamma encoded.
+        colors[:, :3] = Vertex.srgb_to_scene_linear(colors[:, :3])
+        corner_colors = colors[Vertex.get_loop_vertices(b_mesh)]
+        color_attr.data.foreach_set("color", corner_colors.astype(np.float32).ravel())
 
     @staticmethod
     def map_uv_layer(b_mesh, uv_sets):
         # "Sticky" UV coordinates: these are transformed in Blender UVs
+        loop_vertices = Vertex.get_loop_vertices(b_mesh)
         for uv_i, uv_set in enumerate(uv_sets):
             name = f"UVMap{uv_i}" if uv_i > 0 else "UVMap"
             b_mesh.uv_layers.new(name=name)
-            flat_uvs = []
-            for loop in b_mesh.loops:
-                uv = uv_set[loop.vertex_index]
-                # Some shipped NIFs contain non-finite UVs. Replace only the broken
-                # components so they can be exported again without disturbing valid UVs.
-                u = uv.u if math.isfinite(uv.u) else 0.0
-                v = uv.v if math.isfinite(uv.v) else 0.0
-                flat_uvs.extend((u, 1.0 - v))
-            b_mesh.uv_layers[-1].data.foreach_set("uv", flat_uvs)
+            uvs = get_struct_fields(uv_set, ("u", "v"))
+            # Some shipped NIFs contain non-finite UVs. Replace only the broken
+            # components so they can be exported again without disturbing valid UVs.
+            uvs[~np.isfinite(uvs)] = 0.0
+            uvs[:, 1] = 1.0 - uvs[:, 1]
+            b_mesh.uv_layers[-1].data.foreach_set("uv", uvs[loop_vertices].astype(np.float32).ravel())
 
     @staticmethod
     def map_normals(b_mesh, normals):
@@ -106,7 +102,7 @@ class Vertex:
     @staticmethod
     def normalize(vector_array):
         vector_norms = np.linalg.norm(vector_array, ord=2, axis=1, keepdims=True)
-        non_zero_norms = np.reshape(vector_norms != 0, newshape=len(vector_array))
+        non_zero_norms = np.reshape(vector_norms != 0, len(vector_array))
         normalized_vectors = np.copy(vector_array)
         normalized_vectors[non_zero_norms] /= vector_norms[non_zero_norms]
         return normalized_vectors
@@ -42,66 +42,152 @@ from itertools import chain
 import numpy as np
 
 import bpy
+import bmesh
+from .....modules.nif_import.geometry.vertex import Vertex
 from .....modules.nif_import.object.block_registry import block_store, get_bone_name_for_blender
+from .....utils.arrays import get_struct_fields, set_struct_fields
 from .....utils.logging import NifLog
 from nifgen.formats.nif import classes as NifClasses
 from nifgen.formats.nif.nimesh.structs.DisplayList import DisplayList
 
+# roughly how many weights can be written through the bmesh deform layer in the time of one VertexGroup.add call,
+# measured in Blender 5.0 with 200k influences on a triangulated 50k vertex grid with a UV layer (about 8 on a mesh
+# without faces, as the bmesh round trip then costs less)
+VERTEX_GROUP_ADD_COST = 5
+
 
 class VertexGroup:
     """Class that maps weighted vertices to specific groups"""
 
     @staticmethod
-    def get_skin_deformation_from_partition(n_geom):
-        """ Workaround because pyffi does not support this skinning method """
-
-        # todo [pyffi] integrate this into pyffi!!!
-        #              so that NiGeometry.get_skin_deformation() deals with this as intended
+    def get_bone_transforms(n_geom):
+        """The transform from geometry space to skinned geometry space of every bone, as (n_bones, 4, 4) array
 
-        # mostly a copy from pyffi...
+        The matrices are in nif layout, acting on row vectors with the translation in the last row.
+        """
         skin_inst = n_geom.skin_instance
         skin_data = skin_inst.data
-        skin_partition = skin_inst.skin_partition
         skel_root = skin_inst.skeleton_root
-        vertices = [NifClasses.Vector3() for _ in range(n_geom.data.num_vertices)]
+        skin_offset = np.array(skin_data.get_transform().as_list(), dtype=float)
+        bone_transforms = np.empty((len(skin_inst.bones), 4, 4), dtype=float)
+        for i, bone_block in enumerate(skin_inst.bones):
+            bone_offset = np.array(skin_data.bone_list[i].get_transform().as_list(), dtype=float)
+            bone_matrix = np.array(bone_block.get_transform(skel_root).as_list(), dtype=float)
+            bone_transforms[i] = bone_offset @ bone_matrix @ skin_offset
+        return bone_transforms
 
-        # ignore normals for now, not needed for import
-        sum_weights = [0.0 for _ in range(n_geom.data.num_vertices)]
-        skin_offset = skin_data.get_transform()
+    @staticmethod
+    def pad_influences(num_vertices, vertices, bone_indices, weights):
+        """Gather flat vertex influences into per vertex rows
 
-        # store one transform per bone
-        bone_transforms = []
-        for i, bone_block in enumerate(skin_inst.bones):
-            bone_data = skin_data.bone_list[i]
-            bone_offset = bone_data.get_transform()
-            bone_matrix = bone_block.get_transform(skel_root)
-            transform = bone_offset * bone_matrix * skin_offset
-            bone_transforms.append(transform)
-
-        # now the actual unique bit
-        for block in skin_partition.partitions:
-            # create all vgroups for this block's bones
-            block_bone_transforms = [bone_transforms[i] for i in block.bones]
-
-            # go over each vert in this block
-            for vert_index, vertex_weights, bone_indices in zip(block.vertex_map, block.vertex_weights,
-                                                                block.bone_indices):
-                # skip verts that were already processed in an earlier block
-                if sum_weights[vert_index] != 0:
-                    continue
-
-                # go over all 4 weight / bone pairs and transform this vert
-                for weight, b_i in zip(vertex_weights, bone_indices):
-                    if weight > 0:
-                        transform = block_bone_transforms[b_i]
-                        vertices[vert_index] += weight * (n_geom.data.vertices[vert_index] * transform)
-                        sum_weights[vert_index] += weight
-
-        for i, s in enumerate(sum_weights):
-            if abs(s - 1.0) > 0.01:
-                print(f"Vertex {i:d} has weights not summing to one: {sum_weights['i']:d}")
-
-        return vertices
+        :return: bone indices and weights of shape (num_vertices, max influences per vertex), unused slots have bone
+            index 0 and weight 0
+        :rtype: tuple(np.ndarray, np.ndarray)
+        """
+        vertices = np.asarray(vertices, dtype=int).ravel()
+        order = np.argsort(vertices, kind="stable")
+        vertices = vertices[order]
+        counts = np.bincount(vertices, minlength=num_vertices)
+        slots = np.arange(len(vertices)) - np.repeat(np.cumsum(counts) - counts, counts)
+        padded_indices = np.zeros((num_vertices, max(int(counts.max(initial=0)), 1)), dtype=int)
+        padded_weights = np.zeros(padded_indices.shape, dtype=float)
+        padded_indices[vertices, slots] = np.asarray(bone_indices, dtype=int).ravel()[order]
+        padded_weights[vertices, slots] = np.asarray(weights, dtype=float).ravel()[order]
+        return padded_indices, padded_weights
+
+    @staticmethod
+    def get_skin_influences(n_geom):
+        """The bone influences of every vertex, from the skin data or else from the skin partition
+
+        :return: bone indices and weights of shape (num_vertices, max influences per vertex)
+        :rtype: tuple(np.ndarray, np.ndarray)
+        """
+        skin_inst = n_geom.skin_instance
+        skin_data = skin_inst.data
+        num_vertices = n_geom.data.num_vertices
+        # the usual case
+        if skin_data.has_vertex_weights:
+            bone_weights = [get_struct_fields(skin_data.bone_list[i].vertex_weights, ("index", "weight"))
+                            for i in range(len(skin_inst.bones))]
+            bone_indices = np.repeat(np.arange(len(bone_weights)), [len(weights) for weights in bone_weights])
+            vertices, weights = np.concatenate(bone_weights + [np.zeros((0, 2))]).T
+            return VertexGroup.pad_influences(num_vertices, vertices, bone_indices, weights)
+
+        # WLP2 - hides the weights in the partition
+        blocks = []
+        for block in skin_inst.skin_partition.partitions:
+            block_bones = np.asarray(block.bones, dtype=int)
+            if not len(block_bones):
+                continue
+            vertex_map = np.asarray(block.vertex_map, dtype=int)
+            weights = np.asarray(block.vertex_weights, dtype=float).reshape((len(vertex_map), -1))
+            indices = np.asarray(block.bone_indices, dtype=int).reshape(weights.shape)
+            blocks.append((vertex_map, block_bones[indices], weights))
+        n_slots = max([weights.shape[1] for _, _, weights in blocks] + [1])
+        padded_indices = np.zeros((num_vertices, n_slots), dtype=int)
+        padded_weights = np.zeros((num_vertices, n_slots), dtype=float)
+        if blocks:
+            vertex_map = np.concatenate([block[0] for block in blocks])
+            indices = np.concatenate([np.pad(block[1], ((0, 0), (0, n_slots - block[1].shape[1]))) for block in blocks])
+            weights = np.concatenate([np.pad(block[2], ((0, 0), (0, n_slots - block[2].shape[1]))) for block in blocks])
+            # vertices shared by several partitions only count in the first one
+            vertices, first = np.unique(vertex_map, return_index=True)
+            padded_indices[vertices] = indices[first]
+            padded_weights[vertices] = weights[first]
+        return padded_indices, padded_weights
+
+    @staticmethod
+    def deform_vertices(vertices, normals, bone_transforms, bone_indices, bone_weights):
+        """Linear blend skinning of all vertices at once
+
+        :param vertices: positions of shape (n, 3)
+        :param normals: normals of shape (n, 3), or None
+        :param bone_transforms: bone transforms of shape (n_bones, 4, 4) in nif layout
+        :param bone_indices: bone index per vertex influence, of shape (n, k)
+        :param bone_weights: weight per vertex influence, of shape (n, k)
+        :return: the deformed positions, and the deformed normals if normals were given
+        :rtype: tuple(np.ndarray, np.ndarray)
+        """
+        bone_weights = np.where(bone_weights > 0, bone_weights, 0.0)
+        influences = bone_transforms[bone_indices]
+        homogeneous = np.hstack((vertices, np.ones((len(vertices), 1))))
+        deformed = np.einsum("nk,nj,nkji->ni", bone_weights, homogeneous, influences, optimize=True)[:, :3]
+        if normals is not None:
+            # normals only follow the rotation of every bone, without its scale
+            scales = np.cbrt(np.abs(np.linalg.det(bone_transforms[:, :3, :3])))
+            rotations = bone_transforms[:, :3, :3] / np.where(scales > 0, scales, 1.0)[:, None, None]
+            normals = np.einsum("nk,nj,nkji->ni", bone_weights, normals, rotations[bone_indices], optimize=True)
+            normals = Vertex.normalize(normals)
+        return deformed, normals
+
+    @staticmethod
+    def get_skin_deformation(n_geom):
+        """The vertices and normals of a skinned geometry in their final position after skinning, in geometry space
+
+        Vertices without any weights are left where they are.
+
+        :return: the deformed positions, and the deformed normals if the geometry has normals
+        :rtype: tuple(np.ndarray, np.ndarray)
+        """
+        n_data = n_geom.data
+        vertices = get_struct_fields(n_data.vertices, ("x", "y", "z"))
+        normals = get_struct_fields(n_data.normals, ("x", "y", "z")) if n_data.has_normals else None
+        bone_indices, bone_weights = VertexGroup.get_skin_influences(n_geom)
+
+        sum_weights = np.where(bone_weights > 0, bone_weights, 0.0).sum(axis=1)
+        bad_sums = np.flatnonzero(np.abs(sum_weights - 1.0) > 0.01)
+        if len(bad_sums):
+            NifLog.warn(f"{len(bad_sums)} vertices of {n_geom.name} have weights not summing to one, "
+                        f"for instance vertex {bad_sums[0]:d} with {sum_weights[bad_sums[0]]:.3f}")
+
+        bone_transforms = VertexGroup.get_bone_transforms(n_geom)
+        deformed, deformed_normals = VertexGroup.deform_vertices(
+            vertices, normals, bone_transforms, bone_indices, bone_weights)
+        unweighted = sum_weights == 0
+        deformed[unweighted] = vertices[unweighted]
+        if normals is not None:
+            deformed_normals[unweighted] = normals[unweighted]
+        return deformed, deformed_normals
 
     @staticmethod
     def apply_skin_deformation(n_data):
@@ -112,19 +198,12 @@ class VertexGroup:
         # make sure that each skin is applied only once to avoid distortions when a model is referred to twice
         for n_geom in set(n_geoms):
             NifLog.info(f'Applying skin deformation on geometry {n_geom.name}')
-            skininst = n_geom.skin_instance
-            skindata = skininst.data
-            if skindata.has_vertex_weights:
-                vertices = n_geom.get_skin_deformation()[0]
-            else:
-                NifLog.info("PyFFI does not support this type of skinning, so here's a workaround...")
-                vertices = VertexGroup.get_skin_deformation_from_partition(n_geom)
+            vertices, normals = VertexGroup.get_skin_deformation(n_geom)
 
             # finally we can actually set the data
-            for vold, vnew in zip(n_geom.data.vertices, vertices):
-                vold.x = vnew.x
-                vold.y = vnew.y
-                vold.z = vnew.z
+            set_struct_fields(n_geom.data.vertices, vertices, ("x", "y", "z"))
+            if normals is not None:
+                set_struct_fields(n_geom.data.normals, normals, ("x", "y", "z"))
 
     @classmethod
     def import_skin(cls, ni_block, b_obj):
@@ -141,10 +220,11 @@ class VertexGroup:
         :param ni_block: NiObject from which to take the weights
         :type ni_block: NifClasses.NiAVObject
         :return: dictionary mapping bone name to vertex indices and weights
-        :rtype: dict(str, list(tuple(int, float)))
+        :rtype: dict(str, tuple(np.ndarray, np.ndarray))
 
         """
-        bone_weights_map = {}
+        bone_names = []
+        vertices = bone_indices = weights = np.zeros(0)
         if isinstance(ni_block, NifClasses.NiMesh):
             if ni_block.has_extra_em_data:
                 # only for Epic Mickey nifs for now
@@ -157,18 +237,15 @@ class VertexGroup:
                     weight_indices = displaylist.extract_mesh_data(ni_block)[2]
                 else:
                     weight_indices = ni_block.extra_em_data.vertex_to_weight_map
-                bone_indices = np.zeros((len(weight_indices), 3), dtype=int)
-                bone_weights = np.zeros((len(weight_indices), 3), dtype=float)
-                for i, set_index in enumerate(weight_indices):
-                    weight = bone_weights_set[set_index]
-                    bone_indices[i] = weight.bone_indices
-                    bone_weights[i] = weight.weights
+                set_indices = np.array([weight.bone_indices for weight in bone_weights_set], dtype=int).reshape((-1, 3))
+                set_weights = np.array([weight.weights for weight in bone_weights_set], dtype=float).reshape((-1, 3))
+                weight_indices = np.asarray(weight_indices, dtype=int)
+                vertices = np.repeat(np.arange(len(weight_indices)), 3)
+                bone_indices = set_indices[weight_indices].ravel()
+                weights = set_weights[weight_indices].ravel()
                 bone_names = [get_bone_name_for_blender(str(i)) for i in
                               range(len(ni_block.extra_em_data.bone_transforms))]
             else:
-                bone_indices = []
-                bone_weights = chain.from_iterable(ni_block.geomdata_by_name('BLENDWEIGHT'))
-
                 # assume there's only on SkinningMeshModifier
                 skin_modifier = \
                 [block for block in ni_block.modifiers if isinstance(block, NifClasses.NiSkinningMeshModifier)][0]
@@ -176,20 +253,17 @@ class VertexGroup:
 
                 bone_palettes = ni_block.geomdata_by_name('BONE_PALETTE', sep_datastreams=False, sep_regions=True)
                 bone_index_datas = ni_block.geomdata_by_name('BLENDINDICES', sep_datastreams=False, sep_regions=True)
-
+                vertex_indices = []
                 for palette, index_datas in zip(bone_palettes, bone_index_datas):
-                    bone_indices.extend([[palette[i] for i in indices] for indices in index_datas])
+                    vertex_indices.extend([[palette[i] for i in indices] for indices in index_datas])
 
-            for name in bone_names:
-                bone_weights_map[name] = []
-
-            # add every vertex to the corresponding groups
-            for i, (weights, indices) in enumerate(zip(bone_weights, bone_indices)):
-                for w, b_i in zip(weights, indices):
-                    # weights and indices is not necessarily equally long - luckily zip limits to the shortest
-                    if b_i >= 0 and w > 0:
-                        group_name = bone_names[b_i]
-                        bone_weights_map[group_name].append((i, w))
+                # weights and indices is not necessarily equally long - luckily zip limits to the shortest
+                vertex_influences = [(i, b_i, w)
+                                     for i, (vertex_weights, indices) in enumerate(
+                                         zip(chain.from_iterable(ni_block.geomdata_by_name('BLENDWEIGHT')),
+                                             vertex_indices))
+                                     for w, b_i in zip(vertex_weights, indices)]
+                vertices, bone_indices, weights = np.array(vertex_influences, dtype=float).reshape((-1, 3)).T
 
         else:
             skininst = ni_block.skin_instance
@@ -197,84 +271,148 @@ class VertexGroup:
                 skindata = skininst.data
                 bones = skininst.bones
                 if isinstance(skininst, NifClasses.BSSkinInstance):
-                    bone_names = [None for _ in bones]
-                    for idx, n_bone in enumerate(bones):
-                        if not n_bone:
-                            continue
+                    # skip empty bones
+                    bone_names = [block_store.import_name(n_bone) if n_bone else None for n_bone in bones]
 
-                        group_name = block_store.import_name(n_bone)
-                        if group_name not in bone_weights_map:
-                            bone_weights_map[group_name] = []
-                        bone_names[idx] = group_name
-                    for name in bone_names:
-                        if name:
-                            bone_weights_map[name] = []
-
-                    for i, (weights, indices) in enumerate(
-                            [(vert.bone_weights, vert.bone_indices) for vert in ni_block.vertex_data]):
-                        for w, b_i in zip(weights, indices):
-                            if b_i >= 0 and w > 0:
-                                group_name = bone_names[b_i]
-                                bone_weights_map[group_name].append((i, w))
+                    vertex_data = ni_block.vertex_data
+                    bone_indices = np.array([vert.bone_indices for vert in vertex_data], dtype=int).reshape((-1, 4))
+                    weights = np.array([vert.bone_weights for vert in vertex_data], dtype=float).reshape((-1, 4))
+                    vertices = np.repeat(np.arange(len(bone_indices)), 4)
 
                 # the usual case
                 elif skindata.has_vertex_weights:
-                    bone_weights = skindata.bone_list
-                    for idx, n_bone in enumerate(bones):
-                        # skip empty bones (see pyffi issue #3114079)
-                        if not n_bone:
-                            continue
-
-                        vertex_weights = bone_weights[idx].vertex_weights
-                        group_name = block_store.import_name(n_bone)
-                        if group_name not in bone_weights_map:
-                            bone_weights_map[group_name] = []
-
-                        for skinWeight in vertex_weights:
-                            vert = skinWeight.index
-                            weight = skinWeight.weight
-                            bone_weights_map[group_name].append((vert, weight))
+                    # skip empty bones (see pyffi issue #3114079)
+                    bone_names = [block_store.import_name(n_bone) if n_bone else None for n_bone in bones]
+
+                    bone_weights = [get_struct_fields(skindata.bone_list[idx].vertex_weights, ("index", "weight"))
+                                    for idx in range(len(bones))]
+                    bone_counts = [len(vertex_weights) for vertex_weights in bone_weights]
+                    bone_indices = np.repeat(np.arange(len(bones)), bone_counts)
+                    vertices, weights = np.concatenate(bone_weights + [np.zeros((0, 2))]).T
+                    # the skin data lists every influence explicitly, so vertices stay in the groups of their bones
+                    # even with a weight of zero, unlike on the other paths
+                    return VertexGroup.group_weights_by_bone(bone_names, vertices, bone_indices, weights,
+                                                             skip_unweighted=False)
 
                 # WLP2 - hides the weights in the partition
                 else:
                     skin_partition = skininst.skin_partition
+                    block_vertices = []
+                    block_bone_indices = []
+                    block_weights = []
+                    used_bones = set()
                     for block in skin_partition.partitions:
-                        # create all vgroups for this block's bones
-                        bone_names = [block_store.import_name(bones[i]) for i in block.bones]
-                        for group_name in bone_names:
-                            bone_weights_map[group_name] = []
-
-                        # go over each vert in this block
-                        for vert, vertex_weights, bone_indices in zip(block.vertex_map, block.vertex_weights,
-                                                                      block.bone_indices):
-
-                            # assign this vert's 4 weights to its 4 vgroups (at max)
-                            for w, b_i in zip(vertex_weights, bone_indices):
-                                if w > 0:
-                                    group_name = bone_names[b_i]
-                                    bone_weights_map[group_name].append((vert, w))
-        return bone_weights_map
+                        # map this block's bone indices to the skin instance's bones
+                        block_bones = np.asarray(block.bones, dtype=int)
+                        if not len(block_bones):
+                            continue
+                        used_bones.update(block_bones.tolist())
+                        vertex_map = np.asarray(block.vertex_map, dtype=int)
+                        vertex_weights = np.asarray(block.vertex_weights, dtype=float).reshape((len(vertex_map), -1))
+                        indices = np.asarray(block.bone_indices, dtype=int).reshape(vertex_weights.shape)
+                        block_vertices.append(np.repeat(vertex_map, vertex_weights.shape[1]))
+                        block_bone_indices.append(block_bones[indices].ravel())
+                        block_weights.append(vertex_weights.ravel())
+                    bone_names = [block_store.import_name(n_bone) if i in used_bones else None
+                                  for i, n_bone in enumerate(bones)]
+                    if block_vertices:
+                        vertices = np.concatenate(block_vertices)
+                        bone_indices = np.concatenate(block_bone_indices)
+                        weights = np.concatenate(block_weights)
+
+        return VertexGroup.group_weights_by_bone(bone_names, vertices, bone_indices, weights)
+
+    @staticmethod
+    def group_weights_by_bone(bone_names, vertices, bone_indices, weights, skip_unweighted=True):
+        """Group flat vertex influences by the name of their bone
+
+        Influences with a negative bone index are skipped, and so are bones without a name. When a bone influences a
+        vertex more than once, the last influence wins, as it would when adding them one at a time.
+
+        :param bone_names: name of the bone for every bone index, None for bones to skip
+        :type bone_names: list(str)
+        :param vertices: vertex index of every influence
+        :type vertices: np.ndarray
+        :param bone_indices: bone index of every influence
+        :type bone_indices: np.ndarray
+        :param weights: weight of every influence
+        :type weights: np.ndarray
+        :param skip_unweighted: whether to skip influences with a weight of zero or less
+        :type skip_unweighted: bool
+        :return: dictionary mapping bone name to vertex indices and weights, in order of vertex index
+        :rtype: dict(str, tuple(np.ndarray, np.ndarray))
+        """
+        # bones may share a name, and every name gets a group, even without any weights
+        names = list(dict.fromkeys(name for name in bone_names if name))
+        name_ids = {name: name_id for name_id, name in enumerate(names)}
+        bone_to_name = np.array([name_ids[name] if name else -1 for name in bone_names] + [-1], dtype=int)
+
+        vertices = np.asarray(vertices, dtype=int).ravel()
+        bone_indices = np.asarray(bone_indices, dtype=int).ravel()
+        weights = np.asarray(weights, dtype=float).ravel()
+        valid = (bone_indices >= 0) & (bone_indices < len(bone_names))
+        if skip_unweighted:
+            valid &= weights > 0
+        group_ids = bone_to_name[np.where(valid, bone_indices, -1)]
+        valid &= group_ids >= 0
+        vertices, group_ids, weights = vertices[valid], group_ids[valid], weights[valid]
+
+        # keep the last influence per group and vertex, sorted by group and then by vertex
+        keys = group_ids * (int(vertices.max(initial=0)) + 1) + vertices
+        _, last = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - last
+        vertices, group_ids, weights = vertices[last], group_ids[last], weights[last]
+
+        bounds = np.searchsorted(group_ids, np.arange(len(names) + 1))
+        return {name: (vertices[bounds[i]:bounds[i + 1]], weights[bounds[i]:bounds[i + 1]])
+                for i, name in enumerate(names)}
 
     @staticmethod
     def set_bone_weights(bone_weights, b_obj):
         """Set the bone weights on the object
 
+        Vertices that share a bone and a weight are added to the vertex group in a single call. Where the weights are
+        too varied for that to save many calls, they are written through the deform layer of the mesh instead.
+
         :param bone_weights: dictionary mapping bone name to vertex indices and weights
-        :type bone_weights: dict(str, list(tuple(int, float)))
+        :type bone_weights: dict(str, tuple(np.ndarray, np.ndarray))
         :param b_obj: Blender object to which to add the vertex groups
         :type b_obj: bpy.types.Object
         :return: None
         :rtype: NoneType
 
         """
-        for bone_name, index_weights in bone_weights.items():
+        batches = []
+        for bone_name, (v_indices, weights) in bone_weights.items():
             if bone_name not in b_obj.vertex_groups:
                 v_group = b_obj.vertex_groups.new(name=bone_name)
             else:
                 v_group = b_obj.vertex_groups[bone_name]
-            for (v_index, weight) in index_weights:
-                # conversion from numpy.uint16 to int necessary because Blender doesn't accept them
-                v_group.add([int(v_index)], weight, 'REPLACE')
+            unique_weights, weight_ids = np.unique(weights, return_inverse=True)
+            batches.append((v_group, v_indices, weights, unique_weights, weight_ids.reshape(-1)))
+
+        n_influences = sum(len(v_indices) for _, v_indices, _, _, _ in batches)
+        n_calls = sum(len(unique_weights) for _, _, _, unique_weights, _ in batches)
+        if n_calls * VERTEX_GROUP_ADD_COST <= n_influences:
+            for v_group, v_indices, _, unique_weights, weight_ids in batches:
+                order = np.argsort(weight_ids, kind="stable")
+                bounds = np.searchsorted(weight_ids[order], np.arange(len(unique_weights) + 1))
+                for i, weight in enumerate(unique_weights.tolist()):
+                    # conversion from numpy ints to python ints necessary because Blender doesn't accept them
+                    v_group.add(v_indices[order[bounds[i]:bounds[i + 1]]].tolist(), weight, 'REPLACE')
+        elif n_influences:
+            b_mesh = b_obj.data
+            bm = bmesh.new()
+            bm.from_mesh(b_mesh)
+            deform = bm.verts.layers.deform.verify()
+            bm.verts.ensure_lookup_table()
+            b_verts = bm.verts
+            for v_group, v_indices, weights, _, _ in batches:
+                group_index = v_group.index
+                for v_index, weight in zip(v_indices.tolist(), weights.tolist()):
+                    b_verts[v_index][deform][group_index] = weight
+            bm.to_mesh(b_mesh)
+            bm.free()
 
     @staticmethod
     def get_face_groups(ni_block):
@@ -327,10 +465,11 @@ class VertexGroup:
                 b_attribute = b_mesh.attributes[group_name]
 
             # Assign values to the attribute
-            tri_indices_set = set(tri_indices)  # Use a set for faster membership testing
             data = b_attribute.data
-            for i in range(len(data)):
-                data[i].value = i in tri_indices_set
+            values = np.zeros(len(data), dtype=bool)
+            tri_indices = np.asarray(tri_indices, dtype=int)
+            values[tri_indices[tri_indices < len(data)]] = True
+            data.foreach_set("value", values)
 
         # Update the mesh to ensure changes are reflected
         b_obj.data.update()
@@ -71,8 +71,98 @@ def replace_nif_name(name, original, replacement, open_replace, close_replace):
 
 class BlockRegistry:
 
-    @staticmethod
-    def store_longname(b_obj, n_name):
+    def __init__(self):
+        # objects imported for particle system blocks, listed in import order by nif block name,
+        # see particle.clear
+        self.particle_systems = {}
+        self.clear_targets()
+
+    def clear_targets(self):
+        """Forget the animation target index, so that the next lookup indexes the scene afresh.
+
+        Sequences and particle references name their targets, and resolving each name
+        by scanning every object in the file makes importing a large scene quadratic.
+        The index is built from bpy.data on first use and then kept up to date by the
+        importer as it creates objects and particle systems.
+        """
+        # objects by their Blender name and by their nif long name
+        self.target_objects = None
+        self.target_longnames = None
+        # the object owning each particle settings datablock
+        self.particle_owners = None
+        # number of objects seen when the index was built, to notice objects created elsewhere
+        self.num_indexed = 0
+
+    def index_targets(self):
+        """Index all objects in the file by name, long name and owned particle settings."""
+        self.target_objects = {}
+        self.target_longnames = {}
+        self.particle_owners = {}
+        for b_obj in bpy.data.objects:
+            self.add_target(b_obj)
+        self.num_indexed = len(bpy.data.objects)
+        NifLog.debug(f"Indexed {self.num_indexed} objects as animation targets")
+
+    def add_target(self, b_obj):
+        """Make an object, and the particle settings it owns, available to the target lookups."""
+        if self.target_objects is None:
+            return
+        self.target_objects.setdefault(b_obj.name, b_obj)
+        longname = getattr(b_obj.nif_object, "longname", "")
+        if longname:
+            self.target_longnames.setdefault(longname, b_obj)
+        for b_psys in b_obj.particle_systems:
+            self.particle_owners.setdefault(b_psys.settings, b_obj)
+
+    def is_stale(self):
+        """Whether objects were added or removed without going through add_target."""
+        return self.target_objects is None or self.num_indexed != len(bpy.data.objects)
+
+    def lookup(self, get):
+        """Run a lookup on the index, rebuilding it first if needed, and once more if it missed."""
+        if self.target_objects is None:
+            self.index_targets()
+        try:
+            b_data = get()
+            if b_data is not None:
+                # touch the datablock, removed ones raise a ReferenceError
+                b_data.name
+                return b_data
+        except ReferenceError:
+            pass
+        else:
+            if not self.is_stale():
+                return None
+        self.index_targets()
+        return get()
+
+    def find_object(self, b_name):
+        """The object imported under the given name, or None.
+
+        Objects only carry their nif name separately when Blender had to rename them,
+        so the Blender name takes precedence over the long name.
+        """
+        return self.lookup(lambda: self.target_objects.get(b_name) or self.target_longnames.get(b_name))
+
+    def find_particle_owner(self, b_settings):
+        """The object owning a particle settings datablock, or None."""
+        return self.lookup(lambda: self.particle_owners.get(b_settings))
+
+    def store_particle_system(self, n_block, b_obj):
+        """Register the object imported for a particle system block by the block's name."""
+        self.particle_systems.setdefault(str(n_block.name), []).append(b_obj)
+        # the object itself is already indexed, but its particle settings are new
+        self.add_target(b_obj)
+
+    def find_particle_system(self, n_name):
+        """The first object imported for a particle system block of the given name that has particle systems,
+        or None."""
+        for b_obj in self.particle_systems.get(n_name, ()):
+            if b_obj.particle_systems:
+                return b_obj
+        return None
+
+    def store_longname(self, b_obj, n_name):
         """Save original name as object property, for export"""
         if b_obj.name != n_name:
             if isinstance(b_obj, bpy.types.Bone):
@@ -80,6 +170,10 @@ class BlockRegistry:
             else:
                 b_obj.nif_object.longname = n_name
             NifLog.debug(f"Stored long name for {b_obj.name}")
+        # every object the importer creates passes through here
+        if not isinstance(b_obj, bpy.types.Bone) and self.target_objects is not None:
+            self.num_indexed += 1
+            self.add_target(b_obj)
 
     @staticmethod
     def import_name(n_block):
@@ -104,6 +104,7 @@ def clear():
     PENDING_NIF_REFERENCES.clear()
     PENDING_GRAVITY_PREVIEWS.clear()
     DICT_PARTICLE_SYSTEMS.clear()
+    block_store.particle_systems.clear()
     SEQUENCE_CONTROLLED_BLOCKS.clear()
     PARTICLE_TIMELINE_RANGES.clear()
     INSTANCE_ROTATIONS.clear()
@@ -209,6 +210,7 @@ class Particle:
             nif_ps, n_block, n_block.data, n_modifiers, list(self.iter_controllers(n_block))))
 
         DICT_PARTICLE_SYSTEMS[n_block] = b_obj
+        block_store.store_particle_system(n_block, b_obj)
         return b_obj
 
     @staticmethod
@@ -1453,22 +1455,12 @@ def find_imported_object(n_block):
     """Find the Blender object imported for a nif block, by the name it was imported under."""
     if n_block in DICT_PARTICLE_SYSTEMS:
         return DICT_PARTICLE_SYSTEMS[n_block]
-    n_name = block_store.import_name(n_block)
-    for b_obj in bpy.data.objects:
-        # objects only carry their nif name separately when Blender had to rename them
-        if b_obj.name == n_name or getattr(b_obj.nif_object, "longname", "") == n_name:
-            return b_obj
-    return None
+    return block_store.find_object(block_store.import_name(n_block))
 
 
 def find_particle_object(b_settings):
     """Find the scene object owning a particle settings datablock."""
-
-    for b_obj in bpy.data.objects:
-        for b_psys in b_obj.particle_systems:
-            if b_psys.settings == b_settings:
-                return b_obj
-    return None
+    return block_store.find_particle_owner(b_settings)
 
 
 def build_object_emitter_preview(b_particle_obj, b_emitter_obj, nif_ps, b_settings=None):
@@ -52,7 +52,7 @@ from .utils.logging import NifLog, NifError
 from .utils.singleton import NifOp, EGMData, NifData
 
 from .modules.nif_export.animation import Animation
-from .modules.nif_export.animation.common import add_skeleton_controllers
+from .modules.nif_export.animation.common import FCURVE_INDICES, add_skeleton_controllers
 from .modules.nif_export.collision import Collision
 from .modules.nif_export.constraint import Constraint
 from .modules.nif_export.object import DICT_NAMES, Object
@@ -105,6 +105,7 @@ class NifExport(NifCommon):
         block_store.block_to_obj = {}  # Clear data from last export attempt
         block_store.obj_to_block = {}
         DICT_NAMES.clear()
+        FCURVE_INDICES.clear()  # the actions may have been edited since
 
         # Bpy functions are sensitive to the UI context
         # Force it to object mode for now
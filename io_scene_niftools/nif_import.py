@@ -91,6 +91,7 @@ class NifImport(NifCommon):
         self.SELECTED_OBJECTS = bpy.context.selected_objects[:]
 
         particle.clear()  # Clear data from the last import attempt
+        block_store.clear_targets()  # objects may have been added or renamed since
         material.clear()  # Materials are only shared within a single imported file
         TextureLoader.clear_directory_cache()  # the texture folders may have changed
 
@@ -106,6 +106,48 @@ class CommonScale:
         min=0.001, max=100.0, precision=2)
 
 
+class CommonKeyReduction:
+    """Settings for dropping transform keys that interpolation between the kept keys reproduces, or that a
+    B-spline fitted through all keys reproduces."""
+
+    # Reduce transform keys on export.
+    reduce_keys: bpy.props.BoolProperty(
+        name="Reduce Keys",
+        description="Drop transform keys that linear and slerp interpolation between the remaining keys "
+                    "reproduces within the tolerances below. Meant for baked and motion capture actions",
+        default=False)
+
+    # Fit transforms with compressed B-splines on export.
+    fit_bsplines: bpy.props.BoolProperty(
+        name="Fit B-Splines",
+        description="Export transforms as compressed B-spline interpolators, with the fewest control points that "
+                    "reproduce every key within the tolerances below. Needs interpolators (Oblivion onwards), "
+                    "older versions keep their keys",
+        default=False)
+
+    # Largest position error of a dropped key, in Blender units.
+    key_tolerance_position: bpy.props.FloatProperty(
+        name="Position Tolerance",
+        description="Largest distance between a dropped translation key and the interpolated translation",
+        default=0.0001,
+        min=0.0, max=1.0, precision=5)
+
+    # Largest rotation error of a dropped key.
+    key_tolerance_rotation: bpy.props.FloatProperty(
+        name="Rotation Tolerance",
+        description="Largest angle between a dropped rotation key and the interpolated rotation",
+        default=0.00175,
+        min=0.0, max=0.5, precision=3,
+        subtype='ANGLE')
+
+    # Largest scale error of a dropped key.
+    key_tolerance_scale: bpy.props.FloatProperty(
+        name="Scale Tolerance",
+        description="Largest difference between a dropped scale key and the interpolated scale",
+        default=0.0001,
+        min=0.0, max=1.0, precision=5)
+
+
 class CommonNif:
     # Default file name extension.
     filename_ext = ".nif"
@@ -42,11 +42,11 @@ from bpy.types import Operator
 from bpy_extras.io_utils import ExportHelper
 
 from ..kf_export import KfExport
-from ..operators.common_op import CommonDevOperator, CommonScale, CommonKf
+from ..operators.common_op import CommonDevOperator, CommonScale, CommonKf, CommonKeyReduction
 from ..utils.decorators import register_classes, unregister_classes
 
 
-class KfExportOperator(Operator, ExportHelper, CommonDevOperator, CommonScale, CommonKf):
+class KfExportOperator(Operator, ExportHelper, CommonDevOperator, CommonScale, CommonKf, CommonKeyReduction):
     """Operator for saving a kf file."""
 
     # Name of function for calling the kf export operators.
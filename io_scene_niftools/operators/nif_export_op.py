@@ -42,11 +42,11 @@ from bpy.types import Operator
 from bpy_extras.io_utils import ExportHelper
 
 from ..nif_export import NifExport
-from ..operators.common_op import CommonDevOperator, CommonNif, CommonScale
+from ..operators.common_op import CommonDevOperator, CommonNif, CommonScale, CommonKeyReduction
 from ..utils.decorators import register_classes, unregister_classes
 
 
-class NifExportOperator(Operator, ExportHelper, CommonDevOperator, CommonNif, CommonScale):
+class NifExportOperator(Operator, ExportHelper, CommonDevOperator, CommonNif, CommonScale, CommonKeyReduction):
     """Operator for saving a nif file."""
 
     # Name of function for calling the nif export operators.
@@ -122,6 +122,14 @@ class OperatorExportAnimationPanel(OperatorSetting, Panel):
         layout.prop(operator, "animation")
         layout.prop(operator, "bs_animation_node")
 
+        layout.prop(operator, "reduce_keys")
+        layout.prop(operator, "fit_bsplines")
+        col = layout.column(align=True)
+        col.active = operator.reduce_keys or operator.fit_bsplines
+        col.prop(operator, "key_tolerance_position")
+        col.prop(operator, "key_tolerance_rotation")
+        col.prop(operator, "key_tolerance_scale")
+
 
 class OperatorExportOptimisePanel(OperatorSetting, Panel):
     bl_label = "Optimise"
@@ -140,7 +140,7 @@ class NifResourceClearCache(bpy.types.Operator):
     bl_label = "Refresh Resources"
 
     def execute(self, context):
-        resources.clear_cache()
+        resources.clear_index_store()
         self.report({'INFO'}, "Resource listings will be rebuilt on the next import")
         return {'FINISHED'}
 
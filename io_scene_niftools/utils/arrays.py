@@ -0,0 +1,115 @@
+"""Bulk transfer between NumPy arrays and nifgen struct arrays."""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import numpy as np
+from numpy.lib.recfunctions import unstructured_to_structured
+
+
+def _is_structured(n_array):
+    return isinstance(n_array, np.ndarray) and n_array.dtype.names is not None
+
+
+def _members(n_array, member):
+    """The (nested) structs of every element of a nifgen array, or the elements themselves."""
+    if member is None:
+        return n_array
+    if _is_structured(n_array):
+        return n_array[member]
+    return [getattr(n_struct, member) for n_struct in n_array]
+
+
+def set_struct_fields(n_array, values, fields, member=None):
+    """
+    Copy the columns of values into the named fields of every struct in a nifgen array.
+
+    Arrays of basic-typed structs are stored by nifgen as structured numpy arrays, which are filled with one copy per
+    field. Arrays of struct instances are filled in a single pass from plain python values, so that no numpy scalars
+    are unpacked per element.
+
+    :param n_array: A nifgen array, already sized to the number of rows in values
+    :param values: Array of shape (len(n_array), len(fields))
+    :type values: np.ndarray
+    :param fields: Names of the struct fields that receive the columns, in order
+    :type fields: tuple(str)
+    :param member: Name of a struct nested in every element to fill instead of the element itself
+    :type member: str
+    """
+    n_structs = _members(n_array, member)
+    values = np.asarray(values).reshape((len(n_structs), len(fields)))
+    if _is_structured(n_structs):
+        for field_index, field in enumerate(fields):
+            n_structs[field] = values[:, field_index]
+        return
+    for n_struct, row in zip(n_structs, values.tolist()):
+        for field, value in zip(fields, row):
+            setattr(n_struct, field, value)
+
+
+def get_struct_fields(n_array, fields, member=None, dtype=float):
+    """
+    Gather the named fields of every struct in a nifgen array into an array with one column per field.
+
+    :param n_array: A nifgen array of structs
+    :param fields: Names of the struct fields to gather, in order
+    :type fields: tuple(str)
+    :param member: Name of a struct nested in every element to read instead of the element itself
+    :type member: str
+    :param dtype: Data type of the returned array
+
+    :return: the field values
+    :rtype: np.ndarray of shape (len(n_array), len(fields))
+    """
+    n_structs = _members(n_array, member)
+    if _is_structured(n_structs):
+        return np.stack([n_structs[field] for field in fields], axis=-1).astype(dtype)
+    return np.array([[getattr(n_struct, field) for field in fields] for n_struct in n_structs],
+                    dtype=dtype).reshape((-1, len(fields)))
+
+
+def as_struct_array(values, fields):
+    """
+    The columns of values as the named fields of a structured array, which get_struct_fields reads like a nifgen array.
+
+    :param values: Array of shape (n, len(fields))
+    :type values: np.ndarray
+    :param fields: Names of the fields that hold the columns, in order
+    :type fields: tuple(str)
+    :rtype: np.ndarray of shape (n,)
+    """
+    return unstructured_to_structured(np.asarray(values, dtype=float).reshape((-1, len(fields))), names=list(fields))
@@ -0,0 +1,106 @@
+"""Helpers for the cubic B-splines of NiBSplineInterpolator blocks, shared by import and export."""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import numpy as np
+
+# The engine's B-splines are cubic
+BSPLINE_DEGREE = 3
+
+
+def bspline_parameters(times, start_time, stop_time, num_points):
+    """The parameters of times on a B-spline of num_points control points that runs from start to stop time."""
+    duration = stop_time - start_time
+    if duration <= 0:
+        return np.zeros(len(times))
+    return np.clip((times - start_time) / duration, 0.0, 1.0) * (num_points - BSPLINE_DEGREE)
+
+
+def bspline_weights(parameters, num_points):
+    """
+    The basis functions of a B-spline of num_points control points that are non-zero at parameters.
+
+    The engine's B-splines are cubic on a clamped uniform knot vector, so that they start at the first control
+    point and end at the last one, and parameters run from 0 to num_points - 3. The basis functions of all
+    parameters are found at once with the Cox-de Boor recursion.
+
+    :return: The index of the first control point each parameter depends on, of shape (n,), and the weights of
+        that control point and the three after it, of shape (n, 4)
+    """
+    degree = BSPLINE_DEGREE
+    knots = np.concatenate((np.zeros(degree), np.arange(num_points - degree + 1, dtype=float),
+                            np.full(degree, float(num_points - degree))))
+    spans = np.minimum(np.floor(parameters).astype(int), num_points - degree - 1) + degree
+    left = np.empty((degree + 1, len(parameters)))
+    right = np.empty((degree + 1, len(parameters)))
+    weights = np.zeros((len(parameters), degree + 1))
+    weights[:, 0] = 1.0
+    for j in range(1, degree + 1):
+        left[j] = parameters - knots[spans + 1 - j]
+        right[j] = knots[spans + j] - parameters
+        saved = np.zeros(len(parameters))
+        for r in range(j):
+            temp = weights[:, r] / (right[r + 1] + left[j - r])
+            weights[:, r] = saved + right[r + 1] * temp
+            saved = left[j - r] * temp
+        weights[:, j] = saved
+    return spans - degree, weights
+
+
+def bspline_basis(parameters, num_points):
+    """The (len(parameters), num_points) matrix that evaluates a B-spline of num_points control points at
+    parameters, see bspline_weights."""
+    firsts, weights = bspline_weights(parameters, num_points)
+    basis = np.zeros((len(parameters), num_points))
+    basis[np.arange(len(parameters))[:, None], firsts[:, None] + np.arange(BSPLINE_DEGREE + 1)] = weights
+    return basis
+
+
+def evaluate_bspline(firsts, weights, points):
+    """The values of a B-spline with control points of shape (num_points, size), at the parameters of
+    bspline_weights."""
+    return np.einsum("nk,nkc->nc", weights, points[firsts[:, None] + np.arange(BSPLINE_DEGREE + 1)])
+
+
+def bspline_frame_times(start_time, stop_time, fps):
+    """The times of every frame from start to stop time, ending on the stop time when it falls between frames."""
+    num_frames = max(int(np.floor((stop_time - start_time) * fps + 1e-6)), 0)
+    times = start_time + np.arange(num_frames + 1) / fps
+    if stop_time - times[-1] > 1e-6 / fps:
+        times = np.append(times, stop_time)
+    return times
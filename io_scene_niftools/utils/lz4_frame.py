@@ -0,0 +1,150 @@
+"""Decoder of the LZ4 frame format, for Skyrim SE archives when the native lz4 module is not installed."""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import struct
+
+LZ4_FRAME_MAGIC = 0x184D2204
+
+# magic numbers of skippable frames, whose content is ignored
+LZ4_SKIPPABLE_MAGICS = range(0x184D2A50, 0x184D2A60)
+
+
+def decompress_block(block, output):
+    """Decode an LZ4 block onto the end of output.
+
+    Matches may reach back into the earlier blocks of the frame, which output holds already.
+
+    :param block: the compressed block, bytes or a memoryview
+    :param output: bytearray that receives the decoded data
+    """
+    end = len(block)
+    pos = 0
+    while pos < end:
+        token = block[pos]
+        pos += 1
+
+        # literals, with their length extended by bytes of 255 and the byte that follows them
+        length = token >> 4
+        if length == 15:
+            extra = 255
+            while extra == 255:
+                extra = block[pos]
+                pos += 1
+                length += extra
+        if length:
+            if pos + length > end:
+                raise ValueError("LZ4 literals run past the end of the block")
+            output += block[pos:pos + length]
+            pos += length
+        if pos == end:
+            # the last sequence of a block holds literals only
+            break
+
+        offset = block[pos] | block[pos + 1] << 8
+        pos += 2
+        length = (token & 15) + 4
+        if length == 19:
+            extra = 255
+            while extra == 255:
+                extra = block[pos]
+                pos += 1
+                length += extra
+        start = len(output) - offset
+        if not offset or start < 0:
+            raise ValueError(f"LZ4 match offset {offset} is out of range")
+        if length <= offset:
+            output += output[start:start + length]
+        else:
+            # the match overlaps the data it produces, so it repeats the last offset bytes
+            pattern = output[start:]
+            output += pattern * (length // offset) + pattern[:length % offset]
+
+
+def decompress(data, size=None):
+    """Decompress a sequence of LZ4 frames.
+
+    The header and content checksums are not verified, as hashing them in Python would take
+    longer than the decoding itself.
+
+    :param data: the compressed frames, bytes or a memoryview
+    :param size: the expected size of the decompressed data, if it is known
+    :return: the decompressed bytes
+    """
+    data = memoryview(data)
+    output = bytearray()
+    pos = 0
+    try:
+        while pos < len(data):
+            magic = struct.unpack_from("<I", data, pos)[0]
+            if magic in LZ4_SKIPPABLE_MAGICS:
+                pos += 8 + struct.unpack_from("<I", data, pos + 4)[0]
+                continue
+            if magic != LZ4_FRAME_MAGIC:
+                raise ValueError(f"not an LZ4 frame (unexpected magic {magic:#x})")
+
+            flags = data[pos + 4]
+            if flags >> 6 != 1:
+                raise ValueError(f"unsupported LZ4 frame version {flags >> 6}")
+            # skip the magic, flags, block descriptor, optional content size and dictionary id, and header checksum
+            pos += 7 + (8 if flags & 0x8 else 0) + (4 if flags & 0x1 else 0)
+            block_checksum_size = 4 if flags & 0x10 else 0
+
+            while True:
+                block_size = struct.unpack_from("<I", data, pos)[0]
+                pos += 4
+                if not block_size:
+                    break
+                if block_size & 0x80000000:
+                    # stored uncompressed
+                    block_size &= 0x7FFFFFFF
+                    output += data[pos:pos + block_size]
+                else:
+                    decompress_block(data[pos:pos + block_size], output)
+                pos += block_size + block_checksum_size
+            if flags & 0x4:
+                # content checksum
+                pos += 4
+            if pos > len(data):
+                raise ValueError("truncated LZ4 frame")
+    except (IndexError, struct.error) as error:
+        raise ValueError("truncated LZ4 frame") from error
+
+    if size is not None and len(output) != size:
+        raise ValueError(f"LZ4 data decompressed to {len(output)} bytes instead of {size}")
+    return bytes(output)
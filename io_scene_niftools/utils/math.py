@@ -37,6 +37,9 @@
 #
 # ***** END LICENSE BLOCK *****
 
+from collections import namedtuple
+
+import numpy as np
 
 import bpy
 import mathutils
@@ -81,6 +84,136 @@ def export_keymat(rest_rot, key_matrix, bone=None):
         return rest_rot @ key_matrix
 
 
+# import_keymat and export_keymat are left @ key_matrix @ right, with these parts as numpy arrays
+KeymatParts = namedtuple("KeymatParts", ("left", "right", "left_quat", "right_quat"))
+
+
+def get_keymat_parts(left, right):
+    """The KeymatParts of left @ key_matrix @ right, for 4x4 rotation matrices left and right."""
+    return KeymatParts(np.array(left), np.array(right), np.array(left.to_quaternion()), np.array(right.to_quaternion()))
+
+
+def get_import_keymat_parts(rest_rot_inv):
+    """Precompute the matrices of import_keymat for one bone, to convert whole key arrays at once."""
+    return get_keymat_parts(correction @ rest_rot_inv, correction_inv)
+
+
+def get_export_keymat_parts(rest_rot, bone=None):
+    """Precompute the matrices of export_keymat for one bone or object, to convert whole key arrays at once."""
+    if bone:
+        return get_keymat_parts(rest_rot @ correction_inv, correction)
+    return get_keymat_parts(rest_rot, mathutils.Matrix.Identity(4))
+
+
+def keymat_translations(parts, translations):
+    """The translation of a keymat for an (n, 3) array of translation key matrices."""
+    return (translations + parts.right[:3, 3]) @ parts.left[:3, :3].T + parts.left[:3, 3]
+
+
+def keymat_quaternions(parts, quaternions):
+    """The rotation of a keymat for an (n, 4) array of rotation key quaternions, as w >= 0 quaternions."""
+    quaternions = quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+    quaternions = quaternion_multiply(quaternion_multiply(parts.left_quat, quaternions), parts.right_quat)
+    return np.where(quaternions[:, :1] < 0, -quaternions, quaternions)
+
+
+def keymat_eulers(parts, eulers, compatible=None):
+    """The rotation of a keymat for an (n, 3) array of XYZ euler rotation keys, as XYZ eulers.
+
+    With compatible, every euler is chosen closest to its row there, like mathutils' Matrix.to_euler("XYZ", compat).
+    """
+    left = quaternions_to_matrices(parts.left_quat)
+    right = quaternions_to_matrices(parts.right_quat)
+    return matrices_to_eulers(left @ eulers_to_matrices(eulers) @ right, compatible)
+
+
+def quaternion_multiply(quat_a, quat_b):
+    """Hamilton product of (..., 4) arrays of w, x, y, z quaternions, like mathutils' quat_a @ quat_b."""
+    w1, x1, y1, z1 = np.moveaxis(np.asarray(quat_a, dtype=float), -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(np.asarray(quat_b, dtype=float), -1, 0)
+    return np.stack((w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2), axis=-1)
+
+
+def quaternions_to_matrices(quaternions):
+    """Rotation matrices of shape (..., 3, 3) for (..., 4) arrays of unit w, x, y, z quaternions."""
+    w, x, y, z = np.moveaxis(np.asarray(quaternions, dtype=float), -1, 0)
+    return np.stack((np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)), axis=-1),
+                     np.stack((2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)), axis=-1),
+                     np.stack((2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)), axis=-1)),
+                    axis=-2)
+
+
+def eulers_to_matrices(eulers):
+    """Rotation matrices of shape (n, 3, 3) for an (n, 3) array of XYZ eulers, like mathutils' Euler.to_matrix()."""
+    ci, cj, ch = np.cos(eulers).T
+    si, sj, sh = np.sin(eulers).T
+    cc, cs, sc, ss = ci * ch, ci * sh, si * ch, si * sh
+    return np.stack((np.stack((cj * ch, sj * sc - cs, sj * cc + ss), axis=-1),
+                     np.stack((cj * sh, sj * ss + cc, sj * cs - sc), axis=-1),
+                     np.stack((-sj, cj * si, cj * ci), axis=-1)), axis=-2)
+
+
+def eulers_to_quaternions(eulers):
+    """Unit w, x, y, z quaternions of shape (n, 4) for an (n, 3) array of XYZ eulers, like mathutils'
+    Euler.to_quaternion()."""
+    half = np.asarray(eulers, dtype=float) / 2
+    zeros = np.zeros(len(half))
+    quat_x, quat_y, quat_z = (np.stack((np.cos(half[:, i]),) + tuple(np.sin(half[:, i]) if j == i else zeros
+                                                                       for j in range(3)), axis=-1)
+                              for i in range(3))
+    return quaternion_multiply(quaternion_multiply(quat_z, quat_y), quat_x)
+
+
+def matrices_to_eulers(matrices, compatible=None):
+    """XYZ eulers for an (n, 3, 3) array of rotation matrices, choosing between the two solutions like mathutils'
+    Matrix.to_euler() does, or Matrix.to_euler("XYZ", compat) for every row of compatible."""
+    cy = np.hypot(matrices[:, 0, 0], matrices[:, 1, 0])
+    regular = cy > 16.0 * np.finfo(np.float32).eps
+    euler_1 = np.stack((np.where(regular, np.arctan2(matrices[:, 2, 1], matrices[:, 2, 2]),
+                                 np.arctan2(-matrices[:, 1, 2], matrices[:, 1, 1])),
+                        np.arctan2(-matrices[:, 2, 0], cy),
+                        np.where(regular, np.arctan2(matrices[:, 1, 0], matrices[:, 0, 0]), 0.0)), axis=-1)
+    euler_2 = np.where(regular[:, None],
+                       np.stack((np.arctan2(-matrices[:, 2, 1], -matrices[:, 2, 2]),
+                                 np.arctan2(-matrices[:, 2, 0], -cy),
+                                 np.arctan2(-matrices[:, 1, 0], -matrices[:, 0, 0])), axis=-1),
+                       euler_1)
+    if compatible is None:
+        use_2 = np.abs(euler_1).sum(axis=1) > np.abs(euler_2).sum(axis=1)
+    else:
+        compatible = np.asarray(compatible, dtype=float)
+        euler_1 = compatible_eulers(euler_1, compatible)
+        euler_2 = compatible_eulers(euler_2, compatible)
+        use_2 = np.abs(euler_1 - compatible).sum(axis=1) > np.abs(euler_2 - compatible).sum(axis=1)
+    return np.where(use_2[:, None], euler_2, euler_1)
+
+
+# The thresholds of Blender's compatible_eul since Blender 4.0, which wraps any axis more than half a turn off.
+# Older releases only wrapped beyond 5.1 radians, and flipped beyond 3.2 while the others were within 1.6.
+EULER_WRAP_THRESHOLD = np.pi
+EULER_FLIP_THRESHOLD = np.pi
+EULER_FLIP_OTHERS_THRESHOLD = np.pi / 2
+
+
+def compatible_eulers(eulers, compatible):
+    """Wrap every euler by whole turns to lie closest to its row in compatible, like Blender's compatible_eul."""
+    delta = eulers - compatible
+    turns = np.where(delta > EULER_WRAP_THRESHOLD, -np.floor(delta / (2 * np.pi) + 0.5),
+                     np.where(delta < -EULER_WRAP_THRESHOLD, np.floor(-delta / (2 * np.pi) + 0.5), 0.0))
+    eulers = eulers + turns * 2 * np.pi
+    delta = eulers - compatible
+    # an axis more than half a turn off while the others are within a quarter turn is flipped once more
+    eulers = eulers.copy()
+    for i, j, k in ((0, 1, 2), (1, 2, 0), (2, 0, 1)):
+        flip = ((np.abs(delta[:, i]) > EULER_FLIP_THRESHOLD) & (np.abs(delta[:, j]) < EULER_FLIP_OTHERS_THRESHOLD) &
+                (np.abs(delta[:, k]) < EULER_FLIP_OTHERS_THRESHOLD))
+        eulers[:, i] -= np.where(flip, np.sign(delta[:, i]) * 2 * np.pi, 0.0)
+    return eulers
+
+
 def _get_bone_bind(bone):
     """Get a nif local-space matrix from a blender bone. """
     bind = bone.matrix_local @ correction
@@ -1,4 +1,4 @@
-"""This script contains helper methods for locating game assets in loose folders and BSA archives."""
+"""This script contains helper methods for locating game assets in loose folders and BSA and BA2 archives."""
 
 # ***** BEGIN LICENSE BLOCK *****
 #
@@ -38,13 +38,30 @@
 # ***** END LICENSE BLOCK *****
 
 
+import mmap
 import os
+import sqlite3
 import struct
 import zlib
+from array import array
+from collections import OrderedDict
 
 import bpy
 from ..utils.logging import NifLog
 
+try:
+    # much faster than the decoder of the add-on, when it is installed
+    import lz4.frame
+
+    def decompress_lz4(data, size):
+        """Decompress LZ4 frames with the lz4 module, checking the size like the decoder of the add-on."""
+        output = lz4.frame.decompress(data)
+        if len(output) != size:
+            raise ValueError(f"LZ4 data decompressed to {len(output)} bytes instead of {size}")
+        return output
+except ImportError:
+    from ..utils.lz4_frame import decompress as decompress_lz4
+
 ADDON_PACKAGE = __package__.rpartition(".")[0]
 
 RESOURCE_GROUPS = (
@@ -90,17 +107,250 @@ GAME_STEAM_FOLDERS = {
 }
 
 # Archive index cache, valid for the session:
-# archive path -> dict mapping lower case backslashed file path -> (offset, size, compressed, embedded_name)
+# archive path -> dict mapping lower case backslashed file path -> index entry,
+# see parse_bsa_index and parse_ba2_index for the entries of either kind of archive
 _archive_indices = {}
 
+# BSA version of Skyrim SE, which compresses files with lz4 rather than zlib
+BSA_LZ4_VERSION = 105
+
+BA2_MAGIC = b"BTDX"
+
+# Fallout 4 and Fallout 76 archives, including those of the next gen update
+BA2_VERSIONS = (1, 7, 8)
+
+# DXGI formats of BA2 textures that DDS readers know by a four character code
+DDS_FOURCC_FORMATS = {71: b"DXT1", 74: b"DXT3", 77: b"DXT5", 80: b"ATI1", 83: b"ATI2"}
+
+# uncompressed DXGI formats that DDS readers know by their bit masks: bits per pixel, red, green, blue, alpha mask
+DDS_RGB_FORMATS = {
+    28: (32, 0x000000FF, 0x0000FF00, 0x00FF0000, 0xFF000000),  # R8G8B8A8_UNORM
+    87: (32, 0x00FF0000, 0x0000FF00, 0x000000FF, 0xFF000000),  # B8G8R8A8_UNORM
+    88: (32, 0x00FF0000, 0x0000FF00, 0x000000FF, 0x00000000),  # B8G8R8X8_UNORM
+}
+
+# block compressed DXGI formats BC1 to BC7 -> bytes per block of 4x4 pixels
+DXGI_BLOCK_SIZES = {dxgi_format: 8 if dxgi_format <= 72 or 79 <= dxgi_format <= 81 else 16
+                    for dxgi_format in (*range(70, 85), *range(94, 100))}
+
+# bits per pixel of the other DXGI formats found in BA2 archives, 32 if missing
+DXGI_PIXEL_BITS = {49: 16, 56: 16, 61: 8, 65: 8}
+
 # Loose file listing cache, valid for the session: folder path -> dict of relative path -> full path
 _folder_indices = {}
 
+# Number of archives kept open and mapped into memory at once, see get_archive_map
+ARCHIVE_POOL_SIZE = 8
+
+# Archives mapped into memory, valid for the session: archive path -> mmap, least recently used first
+_archive_maps = OrderedDict()
+
+# Merged asset lookup of every resource group, valid for the session or until clear_cache:
+# group -> (resource path settings it was built from, list of (resource path, index) in search order,
+# dict of relative path -> (rank, resource path, entry)), see get_asset_table
+_asset_tables = {}
+
+
+# Archive and folder indices kept between sessions, in the user folder of the add-on.
+# Archives are valid while their size and modification time are, folder listings per
+# directory while the modification time of that directory is. Stores of another
+# version are emptied.
+INDEX_STORE_NAME = "resource_indices.sqlite"
+INDEX_STORE_VERSION = 2
+
+# Connection to the index store, opened on first use, False if it could not be opened
+_index_store = None
+
+# Archives and folder directories whose stored index could be used, or had to be read again
+INDEX_STORE_STATS = {"archive_hits": 0, "archive_misses": 0, "folder_hits": 0, "folder_misses": 0}
+
 
 def clear_cache():
     """Forget the cached archive and folder listings, so changed resources are picked up."""
     _archive_indices.clear()
     _folder_indices.clear()
+    _asset_tables.clear()
+    close_archive_maps()
+
+
+def clear_index_store():
+    """Forget the indices stored between sessions as well, so everything is read again."""
+    clear_cache()
+    index_store = get_index_store()
+    if index_store is None:
+        return
+    try:
+        with index_store:
+            index_store.execute("DELETE FROM archives")
+            index_store.execute("DELETE FROM folder_directories")
+    except sqlite3.Error as error:
+        NifLog.warn(f"Could not clear the resource index store: {error}")
+
+
+def get_index_store():
+    """Return the connection to the index store, opening it on first use, or None if there is none."""
+    global _index_store
+    if _index_store is None:
+        _index_store = False
+        try:
+            store_folder = bpy.utils.extension_path_user(ADDON_PACKAGE, path="cache", create=True)
+        except (AttributeError, ValueError, OSError):
+            # only extensions have a user folder of their own
+            return None
+        store_path = os.path.join(store_folder, INDEX_STORE_NAME)
+        try:
+            index_store = sqlite3.connect(store_path)
+            if index_store.execute("PRAGMA user_version").fetchone()[0] != INDEX_STORE_VERSION:
+                index_store.executescript(f"""
+                    DROP TABLE IF EXISTS archives;
+                    DROP TABLE IF EXISTS folder_directories;
+                    CREATE TABLE archives (
+                        path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, kind TEXT,
+                        names BLOB, offsets BLOB, sizes BLOB, flags BLOB, textures BLOB);
+                    CREATE TABLE folder_directories (
+                        folder TEXT, directory TEXT, mtime INTEGER, files BLOB, subdirectories BLOB,
+                        PRIMARY KEY (folder, directory));
+                    PRAGMA user_version = {INDEX_STORE_VERSION};
+                    """)
+            _index_store = index_store
+        except sqlite3.Error as error:
+            NifLog.warn(f"Could not open the resource index store '{store_path}': {error}")
+    return _index_store or None
+
+
+def _pack_names(names):
+    """Pack a list of names into a compressed blob."""
+    return zlib.compress("\0".join(names).encode("utf-8", errors="surrogateescape"), 1)
+
+
+def _unpack_names(blob):
+    """Unpack a list of names packed by _pack_names."""
+    names = zlib.decompress(blob).decode("utf-8", errors="surrogateescape")
+    return names.split("\0") if names else []
+
+
+def _unpack_array(type_code, blob):
+    """Unpack a compressed array of numbers."""
+    numbers = array(type_code)
+    numbers.frombytes(zlib.decompress(blob))
+    return numbers
+
+
+def _unpack_ba2_entries(offsets, sizes, chunk_counts, textures):
+    """Unpack the BA2 index entries stored by store_archive_index."""
+    entries = []
+    first = 0
+    for i, chunk_count in enumerate(chunk_counts):
+        chunks = tuple(zip(offsets[first:first + chunk_count],
+                           sizes[2 * first:2 * (first + chunk_count):2],
+                           sizes[2 * first + 1:2 * (first + chunk_count):2]))
+        first += chunk_count
+        if textures is None:
+            entries.append((chunks, None))
+        else:
+            height, width, mip_count, dxgi_format, cubemap = textures[5 * i:5 * i + 5]
+            entries.append((chunks, (height, width, mip_count, dxgi_format, bool(cubemap))))
+    return entries
+
+
+def load_stored_archive_index(archive_path, archive_stat):
+    """Return the stored index of an archive, or None if there is none for its current size and mtime."""
+    index_store = get_index_store()
+    if index_store is None:
+        return None
+    try:
+        row = index_store.execute(
+            "SELECT kind, names, offsets, sizes, flags, textures FROM archives "
+            "WHERE path = ? AND size = ? AND mtime = ?",
+            (archive_path, archive_stat.st_size, archive_stat.st_mtime_ns)).fetchone()
+    except sqlite3.Error as error:
+        NifLog.warn(f"Could not read the resource index store: {error}")
+        return None
+    if row is None:
+        INDEX_STORE_STATS["archive_misses"] += 1
+        return None
+    INDEX_STORE_STATS["archive_hits"] += 1
+    kind, names, offsets, sizes, flags, textures = row
+    offsets, sizes, flags = _unpack_array("Q", offsets), _unpack_array("Q", sizes), zlib.decompress(flags)
+    if kind == "BA2":
+        textures = None if textures is None else _unpack_array("I", textures)
+        return dict(zip(_unpack_names(names), _unpack_ba2_entries(offsets, sizes, flags, textures)))
+    return {name: (offset, size, bool(flag & 1), bool(flag & 2)) for name, offset, size, flag in
+            zip(_unpack_names(names), offsets, sizes, flags)}
+
+
+def store_archive_index(archive_path, archive_stat, kind, index):
+    """Store the index of an archive of the given kind, BSA or BA2, for its current size and mtime.
+
+    BA2 entries are stored as their chunk offsets, packed and unpacked chunk sizes and chunk count
+    in place of the flags, plus the texture header fields of every entry if they are textures.
+    """
+    index_store = get_index_store()
+    if index_store is None:
+        return
+    entries = list(index.values())
+    textures = None
+    if kind == "BA2":
+        offsets = [chunk[0] for chunks, _texture in entries for chunk in chunks]
+        sizes = [size for chunks, _texture in entries for chunk in chunks for size in chunk[1:]]
+        flags = bytes(len(chunks) for chunks, _texture in entries)
+        if entries and entries[0][1] is not None:
+            textures = zlib.compress(array("I", [int(field) for _chunks, texture in entries
+                                                 for field in texture]).tobytes(), 1)
+    else:
+        offsets = [entry[0] for entry in entries]
+        sizes = [entry[1] for entry in entries]
+        flags = bytes(entry[2] | entry[3] << 1 for entry in entries)
+    try:
+        with index_store:
+            index_store.execute(
+                "INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (archive_path, archive_stat.st_size, archive_stat.st_mtime_ns, kind, _pack_names(index),
+                 zlib.compress(array("Q", offsets).tobytes(), 1),
+                 zlib.compress(array("Q", sizes).tobytes(), 1),
+                 zlib.compress(flags, 1), textures))
+    except sqlite3.Error as error:
+        NifLog.warn(f"Could not write the resource index store: {error}")
+
+
+def load_stored_folder_listing(folder_path):
+    """Return the stored listing of a resource folder, as a dict of relative directory -> (mtime, files,
+    subdirectories)."""
+    index_store = get_index_store()
+    if index_store is None:
+        return {}
+    try:
+        rows = index_store.execute(
+            "SELECT directory, mtime, files, subdirectories FROM folder_directories WHERE folder = ?",
+            (folder_path,)).fetchall()
+    except sqlite3.Error as error:
+        NifLog.warn(f"Could not read the resource index store: {error}")
+        return {}
+    return {directory: (mtime, _unpack_names(files), _unpack_names(subdirectories))
+            for directory, mtime, files, subdirectories in rows}
+
+
+def store_folder_listing(folder_path, changed, removed):
+    """
+    Update the stored listing of a resource folder.
+
+    :param changed: list of (relative directory, mtime, files, subdirectories) of the directories that were read
+    :param removed: relative directories that no longer exist
+    """
+    index_store = get_index_store()
+    if index_store is None or not (changed or removed):
+        return
+    try:
+        with index_store:
+            index_store.executemany(
+                "INSERT OR REPLACE INTO folder_directories VALUES (?, ?, ?, ?, ?)",
+                [(folder_path, directory, mtime, _pack_names(files), _pack_names(subdirectories))
+                 for directory, mtime, files, subdirectories in changed])
+            index_store.executemany(
+                "DELETE FROM folder_directories WHERE folder = ? AND directory = ?",
+                [(folder_path, directory) for directory in removed])
+    except sqlite3.Error as error:
+        NifLog.warn(f"Could not write the resource index store: {error}")
 
 
 def get_addon_preferences():
@@ -249,11 +499,110 @@ def parse_bsa_index(archive_path):
     return index
 
 
+def parse_ba2_index(archive_path):
+    """Parse the file index of a Fallout 4 or Fallout 76 BA2 archive, of either GNRL or DX10 type.
+
+    Only the file records and the name table are read. Every file is stored as one or more
+    chunks, which are zlib compressed unless their packed size is 0. Textures of DX10
+    archives are stored without their DDS header, and split into chunks of mip levels.
+
+    :return: dict mapping lower case backslashed file paths to (chunks, texture) tuples, where
+        chunks is a tuple of (data offset, packed size, size) tuples and texture is None for GNRL
+        archives, and (height, width, mip count, DXGI format, cubemap) for DX10 archives
+    """
+
+    entries = []
+    with open(archive_path, "rb") as stream:
+        magic, version, archive_type, file_count, names_offset = struct.unpack("<4sI4sIQ", stream.read(24))
+        if magic != BA2_MAGIC:
+            raise ValueError(f"not a BA2 archive (unexpected magic {magic!r})")
+        if version not in BA2_VERSIONS:
+            raise ValueError(f"unsupported BA2 version {version}")
+
+        if archive_type == b"GNRL":
+            for (_name_hash, _extension, _folder_hash, _flags, data_offset, packed_size, size,
+                 _padding) in struct.iter_unpack("<I4sIIQIII", stream.read(36 * file_count)):
+                entries.append((((data_offset, packed_size, size),), None))
+        elif archive_type == b"DX10":
+            for _ in range(file_count):
+                (_name_hash, _extension, _folder_hash, _unknown, chunk_count, _chunk_record_size,
+                 height, width, mip_count, dxgi_format, flags) = struct.unpack("<I4sIBBHHHBBH", stream.read(24))
+                chunks = tuple((data_offset, packed_size, size) for
+                               data_offset, packed_size, size, _first_mip, _last_mip, _padding in
+                               struct.iter_unpack("<QIIHHI", stream.read(24 * chunk_count)))
+                entries.append((chunks, (height, width, mip_count, dxgi_format, bool(flags & 1))))
+        else:
+            raise ValueError(f"unsupported BA2 type {archive_type!r}")
+
+        # the names follow the data as uint16 length prefixed strings, in record order
+        stream.seek(names_offset)
+        name_block = stream.read()
+
+    index = {}
+    offset = 0
+    for entry in entries:
+        length = struct.unpack_from("<H", name_block, offset)[0]
+        name = name_block[offset + 2:offset + 2 + length].decode("windows-1252", errors="replace")
+        offset += 2 + length
+        index[name.lower().replace("/", "\\")] = entry
+    return index
+
+
+def build_dds_header(height, width, mip_count, dxgi_format, cubemap):
+    """Return the DDS header of a texture stored in a DX10 BA2 archive.
+
+    Formats that DDS readers know from before DirectX 10 get a classic header, the others
+    the extended DX10 header that names the DXGI format directly.
+    """
+
+    # caps, height, width, pixel format and mip map count are always given
+    flags = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000
+    if dxgi_format in DXGI_BLOCK_SIZES:
+        # linear size of the top mip level
+        flags |= 0x80000
+        pitch = max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * DXGI_BLOCK_SIZES[dxgi_format]
+    else:
+        # pitch of a row of the top mip level
+        flags |= 0x8
+        bits = DDS_RGB_FORMATS[dxgi_format][0] if dxgi_format in DDS_RGB_FORMATS else DXGI_PIXEL_BITS.get(dxgi_format, 32)
+        pitch = (width * bits + 7) // 8
+
+    # texture, and complex with mip maps or faces
+    caps = 0x1000
+    if mip_count > 1:
+        caps |= 0x400008
+    # all six faces of a cubemap
+    caps2 = 0xFE00 if cubemap else 0
+    if cubemap:
+        caps |= 0x8
+
+    extended = b""
+    if dxgi_format in DDS_RGB_FORMATS:
+        bits, red, green, blue, alpha = DDS_RGB_FORMATS[dxgi_format]
+        pixel_format = struct.pack("<II4s5I", 32, 0x41 if alpha else 0x40, b"", bits, red, green, blue, alpha)
+    else:
+        four_cc = DDS_FOURCC_FORMATS.get(dxgi_format, b"DX10")
+        pixel_format = struct.pack("<II4s5I", 32, 0x4, four_cc, 0, 0, 0, 0, 0)
+        if four_cc == b"DX10":
+            # a 2D texture, flagged as a cube if it is one
+            extended = struct.pack("<5I", dxgi_format, 3, 0x4 if cubemap else 0, 1, 0)
+
+    return (b"DDS " + struct.pack("<7I44x", 124, flags, height, width, pitch, 0, mip_count) +
+            pixel_format + struct.pack("<4I4x", caps, caps2, 0, 0) + extended)
+
+
 def get_archive_index(archive_path):
-    """Return the cached file index of an archive, parsing it on first use."""
+    """Return the cached file index of an archive, parsing it on first use unless it was stored."""
     if archive_path not in _archive_indices:
         try:
-            _archive_indices[archive_path] = parse_bsa_index(archive_path)
+            archive_stat = os.stat(archive_path)
+            index = load_stored_archive_index(archive_path, archive_stat)
+            if index is None:
+                with open(archive_path, "rb") as stream:
+                    kind = "BA2" if stream.read(4) == BA2_MAGIC else "BSA"
+                index = parse_ba2_index(archive_path) if kind == "BA2" else parse_bsa_index(archive_path)
+                store_archive_index(archive_path, archive_stat, kind, index)
+            _archive_indices[archive_path] = index
             NifLog.debug(f"Indexed {len(_archive_indices[archive_path])} files in {archive_path}")
         except (OSError, ValueError, struct.error, IndexError) as error:
             NifLog.warn(f"Could not read archive '{archive_path}': {error}")
@@ -261,52 +610,156 @@ def get_archive_index(archive_path):
     return _archive_indices[archive_path]
 
 
+def list_directory(directory):
+    """Return the files and subdirectories of a directory, like a single step of os.walk."""
+    files = []
+    subdirectories = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                files.append(entry.name)
+            elif not entry.is_symlink():
+                # like os.walk, linked directories are not followed
+                subdirectories.append(entry.name)
+    return files, subdirectories
+
+
 def get_folder_index(folder_path):
     """Return the cached listing of a resource folder, walking it on first use.
 
     Paths are relative to the folder itself, so a folder can be either a game data
-    folder or a folder holding the asset trees directly.
+    folder or a folder holding the asset trees directly. Only the directories that
+    changed since the listing was stored are read again.
     """
     if folder_path not in _folder_indices:
         index = {}
-        try:
-            for root, _dirs, files in os.walk(folder_path):
-                relative_root = os.path.relpath(root, folder_path)
-                for file_name in files:
-                    relative = os.path.join(relative_root, file_name) if relative_root != "." else file_name
-                    index[relative.lower().replace("/", "\\")] = os.path.join(root, file_name)
-        except OSError as error:
-            NifLog.warn(f"Could not read resource folder '{folder_path}': {error}")
+        stored = load_stored_folder_listing(folder_path)
+        changed = []
+        visited = set()
+        pending = [""]
+        while pending:
+            relative_root = pending.pop()
+            root = os.path.join(folder_path, relative_root) if relative_root else folder_path
+            try:
+                mtime = os.stat(root).st_mtime_ns
+                if relative_root in stored and stored[relative_root][0] == mtime:
+                    _mtime, files, subdirectories = stored[relative_root]
+                    INDEX_STORE_STATS["folder_hits"] += 1
+                else:
+                    files, subdirectories = list_directory(root)
+                    changed.append((relative_root, mtime, files, subdirectories))
+                    INDEX_STORE_STATS["folder_misses"] += 1
+            except OSError as error:
+                # like os.walk, skip subdirectories that cannot be read
+                if not relative_root:
+                    NifLog.warn(f"Could not read resource folder '{folder_path}': {error}")
+                continue
+            visited.add(relative_root)
+            key_prefix = (relative_root + os.sep).lower().replace(os.sep, "\\") if relative_root else ""
+            path_prefix = os.path.join(root, "")
+            index.update((key_prefix + file_name.lower().replace("/", "\\"), path_prefix + file_name)
+                         for file_name in files)
+            pending.extend(os.path.join(relative_root, subdirectory) if relative_root else subdirectory
+                           for subdirectory in subdirectories)
+        store_folder_listing(folder_path, changed, stored.keys() - visited)
         _folder_indices[folder_path] = index
         NifLog.debug(f"Indexed {len(index)} files in {folder_path}")
     return _folder_indices[folder_path]
 
 
+def _close_archive_map(archive_map):
+    """Unmap an archive, unless a view into it is still in use, which then keeps it mapped."""
+    try:
+        archive_map.close()
+    except BufferError:
+        # the mapping is released along with the last view into it
+        pass
+
+
+def close_archive_maps():
+    """Unmap all archives of the pool."""
+    while _archive_maps:
+        _close_archive_map(_archive_maps.popitem(last=False)[1])
+
+
+def get_archive_map(archive_path):
+    """Return an archive mapped into memory, from a pool of the most recently read archives.
+
+    Reading many files from the same archive then opens it only once. The least recently
+    used archive is unmapped when more than ARCHIVE_POOL_SIZE archives are in the pool.
+    """
+    archive_map = _archive_maps.get(archive_path)
+    if archive_map is not None:
+        _archive_maps.move_to_end(archive_path)
+        return archive_map
+    with open(archive_path, "rb") as stream:
+        # the mapping stays valid after the file is closed
+        archive_map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    _archive_maps[archive_path] = archive_map
+    while len(_archive_maps) > ARCHIVE_POOL_SIZE:
+        _close_archive_map(_archive_maps.popitem(last=False)[1])
+    return archive_map
+
+
 def read_archive_file(archive_path, entry):
-    """Return the bytes of a file in an archive, described by an index entry."""
-    offset, size, compressed, has_embedded_name = entry
+    """Return the data of a file in an archive, described by an index entry.
+
+    Uncompressed data is a read only memoryview into the mapped archive, without copying it.
+    Compressed data is decompressed straight from the mapped archive into bytes, with lz4 for
+    Skyrim SE archives and zlib for the older ones.
+    """
     try:
-        with open(archive_path, "rb") as stream:
-            stream.seek(offset)
-            blob = stream.read(size)
-    except OSError as error:
+        archive_map = get_archive_map(archive_path)
+    except (OSError, ValueError) as error:
         NifLog.warn(f"Could not read from archive '{archive_path}': {error}")
         return None
+    if archive_map[:4] == BA2_MAGIC:
+        return read_ba2_file(archive_path, archive_map, entry)
+    offset, size, compressed, has_embedded_name = entry
+    blob = memoryview(archive_map)[offset:offset + size]
     if has_embedded_name and blob:
         # skip the length prefixed file name stored before the data
         blob = blob[1 + blob[0]:]
     if compressed:
         # a uint32 with the original size precedes the compressed data
         try:
-            blob = zlib.decompress(blob[4:])
-        except zlib.error:
-            # skyrim se archives may use lz4, which python cannot decompress natively
-            NifLog.warn(f"Could not decompress a file from '{archive_path}' "
-                        f"(lz4 compressed archives are not supported)")
+            size = struct.unpack_from("<I", blob)[0]
+            if archive_map[:4] == b"BSA\x00" and struct.unpack_from("<I", archive_map, 4)[0] == BSA_LZ4_VERSION:
+                blob = decompress_lz4(blob[4:], size)
+            else:
+                blob = zlib.decompress(blob[4:], bufsize=size)
+        except (zlib.error, struct.error, RuntimeError, ValueError) as error:
+            NifLog.warn(f"Could not decompress a file from '{archive_path}': {error}")
             return None
     return blob
 
 
+def read_ba2_file(archive_path, archive_map, entry):
+    """Return the data of a file in a mapped BA2 archive, described by an index entry.
+
+    The chunks of a texture are joined behind a DDS header into a single buffer holding the
+    complete DDS file. A file stored in a single uncompressed chunk is returned as a read only
+    memoryview into the mapped archive, as for BSA archives.
+    """
+    chunks, texture = entry
+    view = memoryview(archive_map)
+    if texture is None and len(chunks) == 1 and not chunks[0][1]:
+        data_offset, _packed_size, size = chunks[0]
+        return view[data_offset:data_offset + size]
+
+    parts = [] if texture is None else [build_dds_header(*texture)]
+    try:
+        for data_offset, packed_size, size in chunks:
+            if packed_size:
+                parts.append(zlib.decompress(view[data_offset:data_offset + packed_size], bufsize=size))
+            else:
+                parts.append(view[data_offset:data_offset + size])
+    except zlib.error as error:
+        NifLog.warn(f"Could not decompress a file from '{archive_path}': {error}")
+        return None
+    return b"".join(parts)
+
+
 def relative_search_paths(file_path, asset_folder="textures"):
     """Return the candidate paths of an asset relative to a game data folder."""
     relative = file_path.lower().replace("/", "\\").replace(os.sep, "\\").lstrip("\\")
@@ -321,6 +774,47 @@ def relative_search_paths(file_path, asset_folder="textures"):
     return candidates
 
 
+def get_asset_table(group=None):
+    """Return the sources and merged lookup of all assets of a resource group, building them when its resource path settings changed.
+
+    The sources are the (resource path, index) of every resource path in search order, where an index maps
+    relative asset paths to the full path of a loose file or the index entry of an archived one. Loose files
+    take precedence over archives, matching how the games load assets, and otherwise the resource paths
+    are searched in the configured order. Every relative asset path maps to the (rank, resource path, entry)
+    of the source it is found in first, where the rank is the position of that source in the search order.
+
+    The lookup is kept for the configured paths as they are written in the preferences, so that finding an
+    asset does not touch the file system. Whether they exist is only checked again when the lookup is
+    rebuilt, because the settings changed or the cache was cleared.
+    """
+    prefs = get_addon_preferences()
+    if prefs is None:
+        return [], {}
+    if group is None:
+        group = get_resource_group()
+
+    settings = tuple((item.group, item.filepath) for item in prefs.resource_paths if item.group == group)
+    if any(filepath.startswith("//") for _, filepath in settings):
+        # relative paths resolve against the blend file
+        settings += (bpy.data.filepath,)
+    if group in _asset_tables and _asset_tables[group][0] == settings:
+        return _asset_tables[group][1:]
+
+    resource_paths = get_resource_paths(group)
+    folders = [resource_path for resource_path in resource_paths if os.path.isdir(resource_path)]
+    archives = [resource_path for resource_path in resource_paths if not os.path.isdir(resource_path)]
+    sources = [(folder, get_folder_index(folder)) for folder in folders]
+    sources.extend((archive, get_archive_index(archive)) for archive in archives)
+
+    # merged in reverse, so that the first source of every asset overwrites the later ones
+    table = {}
+    for rank, (resource_path, index) in reversed(list(enumerate(sources))):
+        table.update((relative, (rank, resource_path, entry)) for relative, entry in index.items())
+    NifLog.debug(f"Merged {len(table)} assets from {len(sources)} resource paths")
+    _asset_tables[group] = (settings, sources, table)
+    return sources, table
+
+
 def find_asset(file_path, asset_folder="textures", group=None):
     """Look for an asset in the configured resource folders and archives.
 
@@ -330,38 +824,30 @@ def find_asset(file_path, asset_folder="textures", group=None):
     :return: tuple of (path identifying the asset, its bytes), or None if it was not found
     """
 
-    resource_paths = get_resource_paths(group)
-    if not resource_paths:
-        return None
-
+    sources, table = get_asset_table(group)
     candidates = relative_search_paths(file_path, asset_folder)
+    ranks = [table[candidate][0] for candidate in candidates if candidate in table]
+    if not ranks:
+        return None
 
-    # loose files win over archives, so check every folder first
-    for resource_path in resource_paths:
-        if not os.path.isdir(resource_path):
-            continue
-        index = get_folder_index(resource_path)
+    # start at the first source holding a candidate, and fall back to the later ones if it cannot be read
+    for resource_path, index in sources[min(ranks):]:
         for candidate in candidates:
-            found = index.get(candidate)
-            if found:
-                NifLog.debug(f"Found {candidate} in {resource_path}")
+            entry = index.get(candidate)
+            if entry is None:
+                continue
+            NifLog.debug(f"Found {candidate} in {resource_path}")
+            if isinstance(entry, str):
                 try:
-                    with open(found, "rb") as stream:
-                        return found, stream.read()
+                    with open(entry, "rb") as stream:
+                        return entry, stream.read()
                 except OSError as error:
-                    NifLog.warn(f"Could not read '{found}': {error}")
-
-    for resource_path in resource_paths:
-        if os.path.isdir(resource_path):
-            continue
-        index = get_archive_index(resource_path)
-        for candidate in candidates:
-            entry = index.get(candidate)
-            if entry:
-                NifLog.debug(f"Found {candidate} in {resource_path}")
+                    NifLog.warn(f"Could not read '{entry}': {error}")
+            else:
                 data = read_archive_file(resource_path, entry)
                 if data is not None:
-                    return os.path.join(resource_path, candidate.replace("\\", os.sep)), data
+                    # copy views out of the mapped archive, so they do not keep it mapped and locked
+                    return os.path.join(resource_path, candidate.replace("\\", os.sep)), bytes(data)
     return None
 
 
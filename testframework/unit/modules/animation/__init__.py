@@ -0,0 +1,64 @@
+"""Module for unit testing the Blender Niftools Addon animation modules"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import numpy as np
+
+
+def smooth_track(rng, num_keys, num_channels, amplitude, noise=0.0):
+    """A smooth random track of num_keys frames, with a little gaussian noise, as baked from motion capture."""
+    frames = np.arange(num_keys)[:, None]
+    phases = rng.uniform(0, 2 * np.pi, (3, num_channels))
+    periods = rng.uniform(60, 240, (3, num_channels))
+    waves = np.sin(2 * np.pi * frames[:, :, None] / periods.T[None] + phases.T[None]).sum(axis=-1)
+    return amplitude * waves + rng.normal(0, noise, (num_keys, num_channels))
+
+
+def random_quaternions(rng, num_keys, amplitude, noise=0.0):
+    """Unit quaternions of a smooth random rotation track, with w >= 0 as the exporter converts them."""
+    axis_angles = smooth_track(rng, num_keys, 3, amplitude, noise)
+    angles = np.linalg.norm(axis_angles, axis=1, keepdims=True)
+    axes = axis_angles / np.maximum(angles, 1e-12)
+    quaternions = np.hstack((np.cos(angles / 2), axes * np.sin(angles / 2)))
+    return np.where(quaternions[:, :1] < 0, -quaternions, quaternions)
+
+
+def baked_bone_tracks(rng, num_keys, noise=0.0):
+    """The rotations, translations and scales of a bone baked with a key on every frame, the scale left constant."""
+    return (random_quaternions(rng, num_keys, 0.6, noise), smooth_track(rng, num_keys, 3, 0.2, noise),
+            np.ones((num_keys, 1)))
@@ -0,0 +1,233 @@
+"""Unit testing of the compressed B-spline fitting used on animation export, and of sampling it on import"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import time
+from types import SimpleNamespace
+
+import nose
+import numpy as np
+
+from io_scene_niftools.modules.nif_export.animation.common import SHORT_MAX, absolute_fit_errors, \
+    continuous_quaternions, distance_fit_errors, fit_bspline_points, fit_compressed_bspline, pack_control_points, \
+    quaternion_fit_errors
+from io_scene_niftools.modules.nif_import.animation.transform import sample_bspline_interpolator
+from io_scene_niftools.utils.bspline import BSPLINE_DEGREE, bspline_basis, bspline_parameters, bspline_weights, \
+    evaluate_bspline
+from unit.modules.animation import baked_bone_tracks, random_quaternions, smooth_track
+
+FPS = 30
+POSITION_TOLERANCE = 0.001
+ROTATION_TOLERANCE = 0.002
+SCALE_TOLERANCE = 0.001
+
+# bytes of the translation, rotation and scale keys of a frame in NiTransformData
+TRANSFORM_KEY_SIZE = (4 + 12) + (4 + 16) + (4 + 4)
+# bytes of the translation, rotation and scale shorts of a control point in NiBSplineData
+CONTROL_POINT_SIZE = 2 * (3 + 4 + 1)
+
+
+class PackedInterpolator:
+    """A NiBSplineCompTransformInterpolator as export_ni_bspline_interpolator fills it, with the accessors the
+    importer reads it through, which dequantize the shorts of NiBSplineData as get_comp_data does."""
+
+    def __init__(self, start_time, stop_time, num_points, shorts, channels):
+        self.start_time = start_time
+        self.stop_time = stop_time
+        self.basis_data = SimpleNamespace(num_control_points=num_points)
+        self.shorts = [int(x) for x in shorts]
+        # channel name -> (handle, offset, half range)
+        self.channels = channels
+
+    def get_comp_keys(self, channel_name, size):
+        if channel_name not in self.channels:
+            return
+        handle, offset, half_range = self.channels[channel_name]
+        for i in range(self.basis_data.num_control_points):
+            yield tuple(offset + x * half_range / SHORT_MAX
+                        for x in self.shorts[handle + i * size:handle + (i + 1) * size])
+
+    def get_translations(self):
+        return self.get_comp_keys("translation", 3)
+
+    def get_rotations(self):
+        return self.get_comp_keys("rotation", 4)
+
+    def get_scales(self):
+        for key in self.get_comp_keys("scale", 1):
+            yield key[0]
+
+
+def pack_interpolator(times, channels, channel_names):
+    """Fit and pack channels into an interpolator as the exporter does."""
+    num_points, compressed = fit_compressed_bspline(times, channels, times[0], times[-1])
+    shorts, handles = pack_control_points(compressed)
+    packed_channels = {channel_name: (handle, offset, half_range)
+                       for channel_name, handle, (_, offset, half_range) in zip(channel_names, handles, compressed)}
+    return PackedInterpolator(times[0], times[-1], num_points, shorts, packed_channels)
+
+
+def cox_de_boor(knots, i, degree, parameter):
+    """The basis function i of the given degree on a knot vector, straight from its recursive definition."""
+    if degree == 0:
+        return float(knots[i] <= parameter < knots[i + 1])
+    value = 0.0
+    if knots[i + degree] > knots[i]:
+        value += (parameter - knots[i]) / (knots[i + degree] - knots[i]) * cox_de_boor(knots, i, degree - 1, parameter)
+    if knots[i + degree + 1] > knots[i + 1]:
+        value += ((knots[i + degree + 1] - parameter) / (knots[i + degree + 1] - knots[i + 1])
+                  * cox_de_boor(knots, i + 1, degree - 1, parameter))
+    return value
+
+
+def engine_knots(num_points):
+    """The clamped uniform knot vector of a cubic B-spline with num_points control points, as used by the engine:
+    four knots at either end and one knot per unit in between, so that parameters run from 0 to num_points - 3."""
+    span_count = num_points - BSPLINE_DEGREE
+    return [0] * BSPLINE_DEGREE + list(range(span_count + 1)) + [span_count] * BSPLINE_DEGREE
+
+
+class TestBSplineFit:
+
+    @classmethod
+    def setup_class(cls):
+        cls.rng = np.random.default_rng(0)
+
+    def test_basis(self):
+        """The basis sums to one everywhere and the curve starts and ends at its end control points"""
+        parameters = np.linspace(0, 7, 50)
+        basis = bspline_basis(parameters, 10)
+        nose.tools.assert_true(np.allclose(basis.sum(axis=1), 1.0))
+        nose.tools.assert_true(np.allclose(basis[0], np.eye(10)[0]))
+        nose.tools.assert_true(np.allclose(basis[-1], np.eye(10)[-1]))
+
+    def test_knot_vector(self):
+        """The basis is that of the definition on the engine's clamped uniform knot vector"""
+        for num_points in (4, 5, 12):
+            knots = engine_knots(num_points)
+            # the last parameter lies on the closed end of the last span
+            parameters = np.append(self.rng.uniform(0, num_points - BSPLINE_DEGREE, 40), 0.0)
+            expected = [[cox_de_boor(knots, i, BSPLINE_DEGREE, parameter) for i in range(num_points)]
+                        for parameter in parameters]
+            nose.tools.assert_true(np.allclose(bspline_basis(parameters, num_points), expected))
+
+    def test_linear_precision(self):
+        """Control points at the Greville abscissae of the knots give an interpolator whose translation is its
+        time, so the importer maps start and stop time onto the whole parameter range"""
+        start_time, stop_time, num_points = 0.5, 3.2, 9
+        knots = engine_knots(num_points)
+        greville = np.array([sum(knots[i + 1:i + BSPLINE_DEGREE + 1]) / BSPLINE_DEGREE for i in range(num_points)])
+        points = start_time + greville / (num_points - BSPLINE_DEGREE) * (stop_time - start_time)
+        # the closest the shorts get to the points
+        offset, half_range = (points[0] + points[-1]) / 2, (points[-1] - points[0]) / 2
+        shorts = np.round((points - offset) / half_range * SHORT_MAX)
+        n_kfi = PackedInterpolator(start_time, stop_time, num_points, np.repeat(shorts, 3),
+                                   {"translation": (0, offset, half_range)})
+        times, translations, rotations, scales = sample_bspline_interpolator(n_kfi, FPS)
+        nose.tools.assert_almost_equal(times[0], start_time)
+        nose.tools.assert_almost_equal(times[-1], stop_time)
+        nose.tools.assert_true(np.allclose(np.diff(times[:-1]), 1 / FPS))
+        nose.tools.assert_less(np.abs(translations - times[:, None]).max(), 2 * half_range / SHORT_MAX)
+        nose.tools.assert_equal(len(rotations), 0)
+        nose.tools.assert_equal(len(scales), 0)
+
+    def test_import_round_trip(self):
+        """The importer samples every key of an exported interpolator within tolerance, with fewer control points"""
+        num_frames = 300
+        times = np.arange(num_frames) / FPS
+        quaternions = continuous_quaternions(random_quaternions(self.rng, num_frames, 0.6))
+        channels = [
+            (smooth_track(self.rng, num_frames, 3, 0.2), distance_fit_errors, POSITION_TOLERANCE),
+            (quaternions, quaternion_fit_errors, ROTATION_TOLERANCE),
+            (1 + smooth_track(self.rng, num_frames, 1, 0.05), absolute_fit_errors, SCALE_TOLERANCE),
+        ]
+        n_kfi = pack_interpolator(times, channels, ("translation", "rotation", "scale"))
+        nose.tools.assert_less(n_kfi.basis_data.num_control_points, num_frames)
+        sampled_times, *sampled = sample_bspline_interpolator(n_kfi, FPS)
+        nose.tools.assert_true(np.allclose(sampled_times, times))
+        sampled[2] = sampled[2][:, None]
+        for values, (channel_values, fit_errors, tolerance) in zip(sampled, channels):
+            nose.tools.assert_less_equal(fit_errors(values, channel_values).max(), tolerance)
+
+    def test_banded_solve(self):
+        """The banded least squares fit finds the same control points as a dense solve"""
+        times = np.arange(120) / FPS
+        values = smooth_track(self.rng, 120, 4, 1.0)
+        parameters = bspline_parameters(times, times[0], times[-1], 30)
+        firsts, weights = bspline_weights(parameters, 30)
+        points = fit_bspline_points(firsts, weights, values, 30)
+        dense_points = np.linalg.lstsq(bspline_basis(parameters, 30), values, rcond=None)[0]
+        nose.tools.assert_true(np.allclose(points, dense_points, atol=1e-6))
+        nose.tools.assert_true(np.allclose(evaluate_bspline(firsts, weights, points),
+                                           bspline_basis(parameters, 30) @ points))
+
+    def test_quaternion_signs(self):
+        """Quaternions are made continuous before fitting, as the exporter gives them w >= 0"""
+        quaternions = random_quaternions(self.rng, 100, 0.6)
+        flips = np.sum(quaternions[1:] * quaternions[:-1], axis=-1) < 0
+        continuous = continuous_quaternions(quaternions)
+        nose.tools.assert_true(np.all(np.sum(continuous[1:] * continuous[:-1], axis=-1) >= 0))
+        nose.tools.assert_true(np.allclose(np.abs(continuous), np.abs(quaternions)))
+        nose.tools.assert_equal(flips.any(), not np.allclose(continuous, quaternions))
+
+    def test_zero_tolerance(self):
+        """Without a tolerance every key gets a control point"""
+        times = np.arange(20) / FPS
+        channels = [(smooth_track(self.rng, 20, 3, 1.0), distance_fit_errors, 0.0)]
+        nose.tools.assert_equal(fit_compressed_bspline(times, channels, times[0], times[-1])[0], 20)
+
+    def test_baked_action(self):
+        """Benchmark: a baked 50 bone action, with a key on every frame for every bone"""
+        num_bones, num_frames = 50, 300
+        times = np.arange(num_frames) / FPS
+        num_points = 0
+        start = time.perf_counter()
+        for _ in range(num_bones):
+            quaternions, translations, scales = baked_bone_tracks(self.rng, num_frames)
+            channels = [
+                (translations, distance_fit_errors, POSITION_TOLERANCE),
+                (continuous_quaternions(quaternions), quaternion_fit_errors, ROTATION_TOLERANCE),
+                (scales, absolute_fit_errors, SCALE_TOLERANCE),
+            ]
+            num_points += fit_compressed_bspline(times, channels, times[0], times[-1])[0]
+        duration = time.perf_counter() - start
+        size = num_bones * num_frames * TRANSFORM_KEY_SIZE
+        size_fitted = num_points * CONTROL_POINT_SIZE
+        print(f"fit_compressed_bspline: {num_bones * num_frames} keys to {num_points} control points, "
+              f"key data {size} to {size_fitted} bytes, in {duration:.3f}s")
+        nose.tools.assert_less(size_fitted, 0.25 * size)
@@ -0,0 +1,137 @@
+"""Unit testing of the transform key reduction used on animation export"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import time
+
+import nose
+import numpy as np
+
+from io_scene_niftools.modules.nif_export.animation.common import distance_key_errors, linear_key_errors, \
+    reduce_keys, slerp_key_errors
+from unit.modules.animation import baked_bone_tracks, random_quaternions, smooth_track
+
+TOLERANCE = 0.001
+# noise of the tracks, as baked from motion capture, well under the tolerance
+NOISE = TOLERANCE / 20
+
+# bytes of a time and a value of each key type in NiTransformData
+QUATERNION_KEY_SIZE = 4 + 16
+TRANSLATION_KEY_SIZE = 4 + 12
+SCALE_KEY_SIZE = 4 + 4
+
+
+def worst_error(frames, values, kept, key_errors):
+    """The largest error of all dropped keys, interpolated between the kept keys around them."""
+    worst = 0.0
+    for first, last in zip(kept, kept[1:]):
+        if last - first < 2:
+            continue
+        inner = np.arange(first + 1, last)
+        t = (frames[inner] - frames[first]) / (frames[last] - frames[first])
+        firsts = np.repeat(values[first:first + 1], len(inner), axis=0)
+        lasts = np.repeat(values[last:last + 1], len(inner), axis=0)
+        worst = max(worst, key_errors(firsts, lasts, t, values[inner]).max())
+    return worst
+
+
+class TestKeyReduction:
+
+    @classmethod
+    def setup_class(cls):
+        cls.rng = np.random.default_rng(0)
+
+    def test_within_tolerance(self):
+        """Every dropped key is reproduced within tolerance by the kept keys"""
+        frames = np.arange(200, dtype=float)
+        # with random signs, which the slerp errors must not depend on
+        signs = np.where(self.rng.random((200, 1)) < 0.5, -1, 1)
+        tracks = (
+            (smooth_track(self.rng, 200, 3, 0.1, NOISE), distance_key_errors),
+            (smooth_track(self.rng, 200, 3, 0.1, NOISE), linear_key_errors),
+            (signs * random_quaternions(self.rng, 200, 0.3, NOISE), slerp_key_errors),
+        )
+        for values, key_errors in tracks:
+            kept = reduce_keys(frames, values, key_errors, TOLERANCE)
+            nose.tools.assert_equal(kept[0], 0)
+            nose.tools.assert_equal(kept[-1], 199)
+            nose.tools.assert_less(len(kept), 200)
+            nose.tools.assert_less_equal(worst_error(frames, values, kept, key_errors), TOLERANCE)
+
+    def test_linear_track(self):
+        """A track that interpolation reproduces exactly keeps only its ends"""
+        frames = np.arange(50, dtype=float)
+        values = np.outer(frames, (1.0, -2.0, 0.5))
+        nose.tools.assert_equal(list(reduce_keys(frames, values, distance_key_errors, TOLERANCE)), [0, 49])
+        angles = frames / 49 * 2.5
+        quaternions = np.column_stack((np.cos(angles / 2), np.sin(angles / 2), np.zeros(50), np.zeros(50)))
+        nose.tools.assert_equal(list(reduce_keys(frames, quaternions, slerp_key_errors, TOLERANCE)), [0, 49])
+
+    def test_step(self):
+        """Keys on both sides of a jump are kept"""
+        frames = np.arange(20, dtype=float)
+        values = np.where(frames < 10, 0.0, 1.0)[:, None]
+        kept = reduce_keys(frames, values, linear_key_errors, TOLERANCE)
+        nose.tools.assert_true({9, 10} <= set(kept))
+
+    def test_zero_tolerance(self):
+        """Without a tolerance every key is kept"""
+        frames = np.arange(10, dtype=float)
+        values = np.zeros((10, 3))
+        nose.tools.assert_equal(len(reduce_keys(frames, values, linear_key_errors, 0.0)), 10)
+
+    def test_baked_action(self):
+        """Benchmark: a baked 200 bone action, with a key on every frame for every bone"""
+        num_bones, num_frames = 200, 300
+        frames = np.arange(num_frames, dtype=float)
+        num_keys = num_kept = size = size_kept = 0
+        start = time.perf_counter()
+        for _ in range(num_bones):
+            tracks = zip(baked_bone_tracks(self.rng, num_frames, NOISE),
+                         (slerp_key_errors, distance_key_errors, linear_key_errors),
+                         (QUATERNION_KEY_SIZE, TRANSLATION_KEY_SIZE, SCALE_KEY_SIZE))
+            for values, key_errors, key_size in tracks:
+                kept = len(reduce_keys(frames, values, key_errors, TOLERANCE))
+                num_keys += num_frames
+                num_kept += kept
+                size += num_frames * key_size
+                size_kept += kept * key_size
+        duration = time.perf_counter() - start
+        print(f"reduce_keys: {num_keys} keys to {num_kept}, key data {size} to {size_kept} bytes, "
+              f"in {duration:.3f}s")
+        nose.tools.assert_less(size_kept, 0.75 * size)
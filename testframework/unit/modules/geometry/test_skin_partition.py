@@ -0,0 +1,110 @@
+"""Unit testing of the skin partitioning used on geometry export"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import nose
+import numpy as np
+
+from io_scene_niftools.modules.nif_export.geometry import skin_partition
+
+
+def random_skin(n_verts=400, n_bones=24, max_influences=6, seed=0):
+    """Grid mesh with random normalized bone weights that vary smoothly across the grid."""
+    rng = np.random.default_rng(seed)
+    side = int(np.sqrt(n_verts))
+    index = np.arange(side * side).reshape((side, side))
+    quads = np.stack((index[:-1, :-1], index[1:, :-1], index[1:, 1:], index[:-1, 1:]), axis=-1).reshape((-1, 4))
+    triangles = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]))
+    weights = []
+    for vert in range(side * side):
+        base = (vert // side) * n_bones // side
+        bones = np.unique(np.clip(base + rng.integers(-2, 3, rng.integers(1, max_influences + 1)), 0, n_bones - 1))
+        bone_weights = rng.random(len(bones))
+        bone_weights /= bone_weights.sum()
+        weights.append([[int(bone), float(weight)] for bone, weight in zip(bones, bone_weights)])
+    return weights, triangles
+
+
+class TestSkinPartition:
+
+    def setup(self):
+        self.weights, self.triangles = random_skin()
+        self.bone_indices, self.bone_weights = skin_partition.get_weight_arrays(self.weights)
+
+    def test_bones_per_vertex(self):
+        """Pruned vertices keep their largest weights and sum to one."""
+        bone_indices, bone_weights, lostweight = skin_partition.limit_bones_per_vertex(
+            self.bone_indices, self.bone_weights, 4)
+        nose.tools.assert_equal(bone_indices.shape[1], 4)
+        nose.tools.assert_true(np.allclose(bone_weights.sum(axis=1), 1.0))
+        for vert, weight in enumerate(self.weights):
+            kept = sorted(weight, key=lambda pair: -pair[1])[:4]
+            nose.tools.assert_equal(sorted(bone for bone, _ in kept),
+                                    [bone for bone in bone_indices[vert] if bone >= 0])
+        nose.tools.assert_true(lostweight < 1.0)
+
+    def test_partitions(self):
+        """Every triangle ends up in exactly one partition within the bone limit."""
+        maxbonesperpartition = 8
+        bone_indices, bone_weights, _ = skin_partition.limit_bones_per_vertex(
+            self.bone_indices, self.bone_weights, 4)
+        skin_partition.limit_bones_per_triangle(bone_indices, bone_weights, self.triangles, maxbonesperpartition)
+        n_bones = int(bone_indices.max()) + 1
+        vert_bits = skin_partition.get_bone_bitsets(bone_indices, n_bones)
+        tri_bits = vert_bits[self.triangles[:, 0]] | vert_bits[self.triangles[:, 1]] | vert_bits[self.triangles[:, 2]]
+        nose.tools.assert_true((skin_partition.count_bits(tri_bits) <= maxbonesperpartition).all())
+        trianglepartmap = np.zeros(len(self.triangles), dtype=int)
+        parts = skin_partition.create_partitions(
+            self.triangles, tri_bits, trianglepartmap, maxbonesperpartition, len(bone_indices))
+        parts = skin_partition.merge_partitions(parts, maxbonesperpartition)
+        covered = np.sort(np.concatenate([part[1] for part in parts]))
+        nose.tools.assert_true(np.array_equal(covered, np.arange(len(self.triangles))))
+        for bones, tris, _ in parts:
+            nose.tools.assert_true(len(bones) <= maxbonesperpartition)
+            used = set(bone_indices[np.unique(self.triangles[tris])].ravel().tolist()) - {-1}
+            nose.tools.assert_true(used <= bones)
+
+    def test_partition_index(self):
+        """Triangles with different partition indices never share a partition."""
+        bone_indices, _, _ = skin_partition.limit_bones_per_vertex(self.bone_indices, self.bone_weights, 4)
+        vert_bits = skin_partition.get_bone_bitsets(bone_indices, int(bone_indices.max()) + 1)
+        tri_bits = vert_bits[self.triangles[:, 0]] | vert_bits[self.triangles[:, 1]] | vert_bits[self.triangles[:, 2]]
+        trianglepartmap = np.arange(len(self.triangles)) % 2
+        parts = skin_partition.create_partitions(self.triangles, tri_bits, trianglepartmap, 40, len(bone_indices))
+        for _, tris, partindex in skin_partition.merge_partitions(parts, 40):
+            nose.tools.assert_true((trianglepartmap[tris] == partindex).all())
@@ -0,0 +1,107 @@
+"""Unit testing of the epsilon vertex welding used on geometry export"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import time
+
+import nose
+import numpy as np
+
+from io_scene_niftools.modules.nif_export.geometry.data import GeometryData
+
+EPSILON = 0.0005
+
+
+def weld_hashes_reference(loop_hashes, epsilon):
+    """The original pairwise weld, kept as the reference for the batched one."""
+    hash_to_nif_vert = np.arange(len(loop_hashes), dtype=int)
+    current_vert = -1
+    max_nif_vert = -1
+    for hash_index, loop_hash in enumerate(loop_hashes):
+        if loop_hash[0] != current_vert:
+            current_vert = loop_hash[0]
+            current_hash_start = hash_index
+        nif_vert_index = max_nif_vert + 1
+        for comp_index in range(current_hash_start, hash_index):
+            if not any(np.abs(loop_hashes[comp_index] - loop_hash) > epsilon):
+                nif_vert_index = hash_to_nif_vert[comp_index]
+                break
+        hash_to_nif_vert[hash_index] = nif_vert_index
+        max_nif_vert = max((nif_vert_index, max_nif_vert))
+    return hash_to_nif_vert
+
+
+def make_hashes(rng, n_loops, n_verts, spread):
+    """Sorted unique loop hashes with a vertex column and a few jittered attribute columns."""
+    verts = rng.integers(0, n_verts, n_loops)
+    attributes = rng.integers(0, 4, (n_loops, 6)) * spread
+    return np.unique(np.column_stack((verts, attributes)), axis=0)
+
+
+class TestWeldHashes:
+
+    @classmethod
+    def setup_class(cls):
+        cls.rng = np.random.default_rng(0)
+
+    def test_matches_reference(self):
+        """The batched weld gives the same nif vertex for every hash as the pairwise weld"""
+        for _ in range(50):
+            loop_hashes = make_hashes(self.rng, 400, 60, 0.8 * EPSILON)
+            nose.tools.assert_true(np.array_equal(GeometryData.weld_hashes(loop_hashes, EPSILON),
+                                                  weld_hashes_reference(loop_hashes, EPSILON)))
+
+    def test_no_merge_outside_epsilon(self):
+        """Hashes further apart than epsilon each keep their own nif vertex"""
+        loop_hashes = make_hashes(self.rng, 400, 60, 3 * EPSILON)
+        nose.tools.assert_true(np.array_equal(GeometryData.weld_hashes(loop_hashes, EPSILON),
+                                              np.arange(len(loop_hashes))))
+
+    def test_empty(self):
+        nose.tools.assert_equal(len(GeometryData.weld_hashes(np.zeros((0, 4)), EPSILON)), 0)
+
+    def test_linear_scaling(self):
+        """Benchmark: sixteen times the loops should take nowhere near 256 times as long"""
+        timings = []
+        for n_loops in (20000, 320000):
+            loop_hashes = make_hashes(self.rng, n_loops, n_loops // 6, 0.8 * EPSILON)
+            start = time.perf_counter()
+            GeometryData.weld_hashes(loop_hashes, EPSILON)
+            timings.append(time.perf_counter() - start)
+            print(f"weld_hashes: {len(loop_hashes)} hashes in {timings[-1]:.4f}s")
+        nose.tools.assert_less(timings[1], 64 * timings[0])
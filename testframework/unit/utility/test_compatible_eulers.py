@@ -0,0 +1,80 @@
+"""Unit testing of the batched euler conversions against mathutils"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import mathutils
+import nose
+import numpy as np
+
+from io_scene_niftools.utils import math
+
+
+def mathutils_compatible_eulers(eulers, compatible):
+    """The eulers made compatible one by one with mathutils, which uses Blender's compatible_eul."""
+    results = []
+    for euler, compat in zip(eulers, compatible):
+        b_euler = mathutils.Euler(euler, 'XYZ')
+        b_euler.make_compatible(mathutils.Euler(compat, 'XYZ'))
+        results.append(tuple(b_euler))
+    return np.array(results)
+
+
+class TestCompatibleEulers:
+
+    @classmethod
+    def setup_class(cls):
+        cls.rng = np.random.default_rng(0)
+
+    def test_wrap_band(self):
+        """Deltas between half a turn and 5.1 radians are wrapped, as in Blender since 4.0"""
+        compatible = self.rng.uniform(-1, 1, (200, 3))
+        deltas = self.rng.uniform(np.pi, 5.1, (200, 3)) * self.rng.choice((-1, 1), (200, 3))
+        # keep some of the axes close, so that the single axis flips are covered too
+        deltas[::2, 1:] = self.rng.uniform(-1.5, 1.5, (100, 2))
+        eulers = compatible + deltas
+        expected = mathutils_compatible_eulers(eulers, compatible)
+        nose.tools.assert_true(np.allclose(math.compatible_eulers(eulers, compatible), expected, atol=1e-5))
+
+    def test_matrices_to_eulers(self):
+        """Matrices convert to the same eulers as Matrix.to_euler('XYZ', compat)"""
+        compatible = self.rng.uniform(-6, 6, (200, 3))
+        eulers = compatible + self.rng.uniform(-5.5, 5.5, (200, 3))
+        matrices = math.eulers_to_matrices(eulers)
+        expected = np.array([mathutils.Matrix(matrix.tolist()).to_euler('XYZ', mathutils.Euler(compat, 'XYZ'))
+                             for matrix, compat in zip(matrices, compatible)])
+        nose.tools.assert_true(np.allclose(math.matrices_to_eulers(matrices, compatible), expected, atol=1e-4))
@@ -0,0 +1,158 @@
+"""Unit testing of the LZ4 frame decoder used for Skyrim SE archives, against zlib for speed"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright © 2026 NIF File Format Library and Tools contributors.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the NIF File Format Library and Tools
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import struct
+import time
+import zlib
+
+import nose
+import numpy as np
+
+from io_scene_niftools.utils.lz4_frame import LZ4_FRAME_MAGIC, decompress
+
+# block size of the frames written by compress, as set in their block descriptor
+BLOCK_SIZE = 64 * 1024
+
+
+def write_length(output, length):
+    """Write the bytes that extend a literal or match length beyond its token."""
+    while length >= 255:
+        output.append(255)
+        length -= 255
+    output.append(length)
+
+
+def write_sequence(output, literals, offset=0, match_length=0):
+    """Write a sequence of literals and a match, or literals only for the last sequence of a block."""
+    literal_token = min(len(literals), 15)
+    match_token = min(match_length - 4, 15) if match_length else 0
+    output.append(literal_token << 4 | match_token)
+    if literal_token == 15:
+        write_length(output, len(literals) - 15)
+    output += literals
+    if match_length:
+        output += struct.pack("<H", offset)
+        if match_token == 15:
+            write_length(output, match_length - 19)
+
+
+def compress_block(data):
+    """A greedy LZ4 block compressor, enough to produce valid blocks with overlapping matches."""
+    output = bytearray()
+    positions = {}
+    anchor = pos = 0
+    # the format ends every block with at least 5 literals, and its last match starts 12 bytes before the end
+    match_limit = len(data) - 5
+    while pos < len(data) - 12:
+        key = data[pos:pos + 4]
+        candidate = positions.get(key)
+        positions[key] = pos
+        if candidate is None or pos - candidate > 0xFFFF:
+            pos += 1
+            continue
+        length = 4
+        while pos + length < match_limit and data[candidate + length] == data[pos + length]:
+            length += 1
+        write_sequence(output, data[anchor:pos], pos - candidate, length)
+        pos += length
+        anchor = pos
+    write_sequence(output, data[anchor:])
+    return output
+
+
+def compress(data):
+    """Compress data into an LZ4 frame of independent blocks, without checksums."""
+    output = bytearray(struct.pack("<IBBB", LZ4_FRAME_MAGIC, 0x60, 0x40, 0))
+    for start in range(0, len(data), BLOCK_SIZE):
+        block = compress_block(data[start:start + BLOCK_SIZE])
+        output += struct.pack("<I", len(block)) + block
+    output += struct.pack("<I", 0)
+    return bytes(output)
+
+
+def dds_payload(rng, size):
+    """The mip levels of a BC1 texture of size x size pixels, made of runs of repeated blocks like real textures."""
+    num_blocks = sum(max(1, (size >> mip) // 4) ** 2 for mip in range(size.bit_length()))
+    palette = rng.integers(0, 256, (1024, 8), dtype=np.uint8)
+    runs = np.repeat(rng.integers(0, len(palette), num_blocks), rng.geometric(0.3, num_blocks))
+    return palette[runs[:num_blocks]].tobytes()
+
+
+class TestLZ4Frame:
+
+    @classmethod
+    def setup_class(cls):
+        cls.rng = np.random.default_rng(0)
+
+    def test_overlapping_match(self):
+        """A match longer than its offset repeats the bytes before it"""
+        block = bytearray()
+        write_sequence(block, b"ab", 2, 20)
+        write_sequence(block, b"cdefg")
+        frame = struct.pack("<IBBBI", LZ4_FRAME_MAGIC, 0x60, 0x40, 0, len(block)) + block + struct.pack("<I", 0)
+        nose.tools.assert_equal(decompress(frame), b"ab" * 11 + b"cdefg")
+
+    def test_uncompressed_and_skippable(self):
+        """Blocks stored uncompressed are copied and skippable frames are ignored"""
+        skippable = struct.pack("<II", 0x184D2A50, 3) + b"xyz"
+        frame = struct.pack("<IBBBI", LZ4_FRAME_MAGIC, 0x60, 0x40, 0, 0x80000005) + b"plain" + struct.pack("<I", 0)
+        nose.tools.assert_equal(decompress(skippable + frame + frame, size=10), b"plainplain")
+
+    def test_truncated(self):
+        """Truncated frames and wrong sizes raise ValueError"""
+        frame = compress(bytes(range(256)) * 64)
+        nose.tools.assert_raises(ValueError, decompress, frame[:-20])
+        nose.tools.assert_raises(ValueError, decompress, frame, 100)
+        nose.tools.assert_raises(ValueError, decompress, b"BSA\x00" + frame)
+
+    def test_dds_payload(self):
+        """Benchmark: decompressing a 1024 x 1024 BC1 texture, against zlib on the same data"""
+        data = dds_payload(self.rng, 1024)
+        lz4_data = compress(data)
+        zlib_data = zlib.compress(data)
+
+        start = time.perf_counter()
+        nose.tools.assert_equal(decompress(lz4_data, size=len(data)), data)
+        lz4_time = time.perf_counter() - start
+        start = time.perf_counter()
+        nose.tools.assert_equal(zlib.decompress(zlib_data), data)
+        zlib_time = time.perf_counter() - start
+        print(f"lz4_frame.decompress: {len(data)} bytes from {len(lz4_data)} in {lz4_time:.3f}s "
+              f"({len(data) / lz4_time / 1e6:.1f} MB/s), zlib from {len(zlib_data)} in {zlib_time:.3f}s "
+              f"({len(data) / zlib_time / 1e6:.1f} MB/s)")